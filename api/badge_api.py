@@ -11,6 +11,7 @@ import os
 import logging
 from badge_generator import BadgeGenerator
 from badge_prompts import get_available_styles, get_supported_teams
+from subsystems import Lazy, build_app  # inicialização preguiçosa + app standalone
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -41,28 +42,24 @@ class BadgeGenerationResponse(BaseModel):
     metadata: Dict[str, Any]
     error: Optional[str] = None
 
-# Instância global do gerador (será inicializada no startup)
-badge_generator: Optional[BadgeGenerator] = None
-
-def initialize_badge_generator():
-    """Inicializa o gerador de badges"""
-    global badge_generator
-    
+def initialize_badge_generator() -> BadgeGenerator:
+    """Cria o gerador de badges (chamado no primeiro uso)"""
     api_key = os.getenv('OPENAI_API_KEY')
     if not api_key:
         raise ValueError("OPENAI_API_KEY não configurada")
     
-    badge_generator = BadgeGenerator(api_key)
+    generator = BadgeGenerator(api_key)
     logger.info("✅ BadgeGenerator inicializado")
+    return generator
+
+# Instância global do gerador (criada na primeira requisição que precisar dela)
+badge_generator = Lazy("badges.generator", initialize_badge_generator)
 
 @badge_router.get("/info")
 async def get_badge_info():
     """Informações sobre o sistema de badges"""
-    if not badge_generator:
-        raise HTTPException(status_code=500, detail="BadgeGenerator não inicializado")
-    
     return {
-        "generator_info": badge_generator.get_info(),
+        "generator_info": badge_generator.get().get_info(),
         "available_styles": get_available_styles(),
         "supported_teams": get_supported_teams()
     }
@@ -72,8 +69,7 @@ async def generate_badge(request: BadgeGenerationRequest):
     """
     Gera um badge/logo específico
     """
-    if not badge_generator:
-        raise HTTPException(status_code=500, detail="BadgeGenerator não inicializado")
+    generator = badge_generator.get()
     
     try:
         logger.info(f"🎨 Nova solicitação de badge: {request.team_name} - {request.badge_name}")
@@ -87,7 +83,7 @@ async def generate_badge(request: BadgeGenerationRequest):
             )
         
         # Gerar badge
-        result = badge_generator.generate_badge(
+        result = generator.generate_badge(
             team_name=request.team_name,
             badge_name=request.badge_name,
             badge_number=request.badge_number,
@@ -108,8 +104,7 @@ async def generate_badge_variations(request: BadgeVariationsRequest):
     """
     Gera múltiplas variações de um badge
     """
-    if not badge_generator:
-        raise HTTPException(status_code=500, detail="BadgeGenerator não inicializado")
+    generator = badge_generator.get()
     
     try:
         logger.info(f"🔄 Solicitação de variações: {request.team_name} - {request.badge_name}")
@@ -125,7 +120,7 @@ async def generate_badge_variations(request: BadgeVariationsRequest):
                 )
         
         # Gerar variações
-        result = badge_generator.generate_badge_variations(
+        result = generator.generate_badge_variations(
             team_name=request.team_name,
             badge_name=request.badge_name,
             badge_number=request.badge_number,
@@ -162,10 +157,7 @@ def register_badge_routes(app):
     Args:
         app: Instância do FastAPI
     """
-    # Inicializar o gerador
-    initialize_badge_generator()
-    
-    # Registrar as rotas
+    # Registrar as rotas (o gerador é criado no primeiro uso)
     app.include_router(badge_router)
     
     logger.info("✅ Rotas de badges registradas")
@@ -178,18 +170,11 @@ def create_badge_app():
     Returns:
         FastAPI app configurada apenas para badges
     """
-    from fastapi import FastAPI
-    
-    app = FastAPI(
-        title="Badge Generator API",
+    # Rotas + CORS + métricas Prometheus (GET /metrics) + tracing
+    return build_app(
+        "Badge Generator API", "1.0.0", [badge_router], "badge_api",
         description="API para geração de badges e logos esportivos",
-        version="1.0.0"
     )
-    
-    # Registrar rotas
-    register_badge_routes(app)
-    
-    return app
 
 # Para uso como aplicação standalone
 if __name__ == "__main__":
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Benchmark: geração concorrente bloqueante (OpenAI + requests) vs. camada assíncrona
+Uso (a partir de api/): python benchmarks/bench_async_generation.py --concurrency 20 --delay 0.5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stub_provider import start_stub_provider
+
+
+async def _heartbeat(stop: asyncio.Event, lags: list):
+    """Mede o atraso do event loop (o que /health sentiria durante a carga)"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - start - 0.01)
+
+
+async def _run(label: str, one_generation, concurrency: int):
+    stop = asyncio.Event()
+    lags = []
+    heartbeat = asyncio.create_task(_heartbeat(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(one_generation() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await heartbeat
+    print(f"{label:<10} {concurrency:>4} reqs  {elapsed:7.2f}s  "
+          f"{concurrency / elapsed:7.2f} req/s  max loop lag {max(lags or [0]) * 1000:8.1f} ms")
+
+
+async def main(concurrency: int, delay: float):
+    base_url = start_stub_provider(generation_delay=delay)
+    os.environ["OPENAI_API_KEY"] = "stub-key"
+    os.environ["OPENAI_BASE_URL"] = f"{base_url}/v1"
+
+    import requests
+    from openai import OpenAI
+    import provider_clients
+
+    async def blocking_generation():
+        # Padrão antigo: cliente síncrono dentro de um handler async
+        client = OpenAI(api_key="stub-key", base_url=f"{base_url}/v1")
+        response = client.images.generate(model="dall-e-3", prompt="jersey", size="1024x1024", quality="standard", n=1)
+        requests.get(response.data[0].url, timeout=60).content
+
+    async def async_generation():
+        generation = await provider_clients.generate_dalle3_image(prompt="jersey")
+        await provider_clients.download_image(generation["url"])
+
+    print(f"Stub provider em {base_url} (atraso DALL-E {delay}s)")
+    await _run("before", blocking_generation, concurrency)
+    await _run("after", async_generation, concurrency)
+    await provider_clients.close_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--delay", type=float, default=0.5)
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency, args.delay))
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark: hit ratio e tempo total do cache com vários workers, por backend do cache_backend
+Cada worker é um processo (como os workers do uvicorn/gunicorn) que atende --requests análises
+Vision com chaves de distribuição Zipf (poucas imagens de referência muito populares); um miss
+custa --miss-ms (a chamada Vision) e grava o resultado (~--value-kb KB) no cache.
+memory = LRU por processo (cada worker aquece o seu); sqlite = arquivo WAL do host;
+redis = stub_redis.py local no lugar de um servidor Redis.
+Uso (a partir de api/): python benchmarks/bench_cache_backends.py --workers 4 --requests 400
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cache_backend import CacheNamespace, MemoryBackend, RedisBackend, SQLiteBackend
+from stub_redis import start_stub_redis
+
+
+def _backend(kind: str, target: str):
+    if kind == "sqlite":
+        return SQLiteBackend(target)
+    if kind == "redis":
+        return RedisBackend(target, prefix="bench:")
+    return MemoryBackend()
+
+
+def _worker(kind: str, target: str, seed: int, requests: int, keys: int, miss_ms: float, value_kb: int, results):
+    random.seed(seed)
+    cache = CacheNamespace(_backend(kind, target), "vision_analysis", ttl=3600)
+    weights = [1 / (rank + 1) for rank in range(keys)]
+    value = {"analysis": "x" * value_kb * 1024}
+    lookups = []
+    for key in random.choices(range(keys), weights=weights, k=requests):
+        start = time.perf_counter()
+        if cache.get(f"image-{key}") is None:
+            time.sleep(miss_ms / 1000)  # chamada Vision
+            cache.set(f"image-{key}", value)
+        else:
+            lookups.append(time.perf_counter() - start)
+    results.put((cache.hits, cache.misses, lookups))
+
+
+def run(kind: str, target: str, workers: int, requests: int, keys: int, miss_ms: float, value_kb: int):
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=_worker, args=(kind, target, seed, requests, keys, miss_ms, value_kb, results))
+        for seed in range(workers)
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+    hits = sum(item[0] for item in collected)
+    misses = sum(item[1] for item in collected)
+    lookups = sorted(latency for item in collected for latency in item[2])
+    hit_ms = statistics.median(lookups) * 1000 if lookups else 0.0
+    print(f"{kind:<7} hit ratio {hits / (hits + misses):6.1%}  chamadas Vision {misses:5d}  "
+          f"total {elapsed:6.2f} s  hit p50 {hit_ms:6.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--keys", type=int, default=200)
+    parser.add_argument("--miss-ms", type=float, default=20)
+    parser.add_argument("--value-kb", type=int, default=4)
+    args = parser.parse_args()
+    print(f"{args.workers} workers x {args.requests} análises, {args.keys} imagens (Zipf), miss = {args.miss_ms} ms")
+    sqlite_path = os.path.join(tempfile.mkdtemp(prefix="bench_cache_"), "cache.db")
+    targets = {"memory": "", "sqlite": sqlite_path, "redis": start_stub_redis()}
+    for kind, target in targets.items():
+        run(kind, target, args.workers, args.requests, args.keys, args.miss_ms, args.value_kb)
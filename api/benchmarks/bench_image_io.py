@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark: tempo de CPU por requisição para entregar o PNG baixado do DALL-E
+before = Image.open + image.save(PNG) (round trip pelo PIL)
+after  = image_io.ensure_format (repasse sem cópia quando já é PNG)
+Uso (a partir de api/): python benchmarks/bench_image_io.py --iterations 20 --size 1024
+"""
+import argparse
+import base64
+import os
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image
+
+import image_io
+
+
+def _sample_png(size: int) -> bytes:
+    """PNG com ruído + gradiente, para a compressão não ser trivial (como uma imagem gerada)"""
+    noise = Image.frombytes("RGB", (size, size), os.urandom(size * size * 3))
+    gradient = Image.linear_gradient("L").resize((size, size)).convert("RGB")
+    buffered = BytesIO()
+    Image.blend(noise, gradient, 0.7).save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+def before(image_bytes: bytes) -> str:
+    image = Image.open(BytesIO(image_bytes))
+    buffered = BytesIO()
+    image.save(buffered, format="PNG")
+    return base64.b64encode(buffered.getvalue()).decode()
+
+
+def after(image_bytes: bytes) -> str:
+    return image_io.to_base64(image_io.ensure_format(image_bytes, "PNG"))
+
+
+def _measure(label: str, fn, image_bytes: bytes, iterations: int):
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for _ in range(iterations):
+        fn(image_bytes)
+    cpu = (time.process_time() - cpu_start) / iterations
+    wall = (time.perf_counter() - wall_start) / iterations
+    print(f"{label:<8} {iterations:>4} iters  cpu {cpu * 1000:8.2f} ms/req  wall {wall * 1000:8.2f} ms/req")
+
+
+def main(iterations: int, size: int):
+    image_bytes = _sample_png(size)
+    print(f"PNG de teste: {size}x{size}, {len(image_bytes) / 1024:.0f} KB")
+    _measure("before", before, image_bytes, iterations)
+    _measure("after", after, image_bytes, iterations)
+    _measure("jpeg", lambda data: image_io.ensure_format(data, "JPEG"), image_bytes, iterations)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--size", type=int, default=1024)
+    args = parser.parse_args()
+    main(args.iterations, args.size)
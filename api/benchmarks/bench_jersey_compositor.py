@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark: drop de N camisas (mesmo time, nomes/números diferentes) pelo /generate
+before = render_mode "dalle": uma geração paga por par nome/número (stub com --delay s)
+after  = render_mode "local": uma geração da base em branco + nome/número desenhados com o PIL
+
+--concurrency limita as chamadas simultâneas (como o rate limit do provedor). A seção
+"render" mede só o JerseyCompositor.render sobre uma base 1024² com textura (o encode
+de uma base fotográfica é mais caro que o do PNG liso do stub), em uma thread.
+Uso (a partir de api/): python benchmarks/bench_jersey_compositor.py --jerseys 100 --delay 1.0
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stub_provider import start_stub_provider
+
+NAMES = ("GABIGOL", "ARRASCAETA", "DE LA CRUZ", "PEDRO", "BRUNO HENRIQUE", "LÉO ORTIZ", "PULGAR", "AYRTON LUCAS")
+
+
+async def _drop(http, label: str, render_mode: str, jerseys: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, costs = [], []
+
+    async def one(index: int):
+        body = {
+            "model_id": "flamengo_2024",
+            "player_name": NAMES[index % len(NAMES)],
+            "player_number": str(index % 99 + 1),
+            "response_mode": "url",
+            "render_mode": render_mode,
+        }
+        async with semaphore:
+            start = time.perf_counter()
+            response = await http.post("/generate", json=body)
+            latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+        costs.append(response.json()["cost_usd"])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(jerseys)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<7} {jerseys:>5} camisas  {elapsed:8.2f}s  {jerseys / elapsed:8.1f} camisas/s  "
+          f"p50 {statistics.median(latencies) * 1000:8.1f} ms  custo US$ {sum(costs):7.3f}")
+
+
+def _render_only(renders: int):
+    from PIL import Image, ImageFilter
+    from jersey_compositor import JerseyCompositor, style_from_analysis
+
+    base = Image.effect_noise((1024, 1024), 40).convert("RGB").filter(ImageFilter.GaussianBlur(2))
+    styles = {
+        "reto": style_from_analysis(),
+        "arco+contorno": style_from_analysis({
+            "numberStyle": {"font": "bold serif", "fillPattern": "black", "outline": "white border"},
+            "namePlacement": "arched above the number",
+        }),
+    }
+    for image_format in ("JPEG", "PNG"):
+        compositor = JerseyCompositor(generate_base=None, image_format=image_format)
+        for label, style in styles.items():
+            compositor.render(base, "AQUECIMENTO", "0", style)
+            start = time.perf_counter()
+            for index in range(renders):
+                compositor.render(base, NAMES[index % len(NAMES)], str(index % 99 + 1), style)
+            elapsed = time.perf_counter() - start
+            print(f"render  {image_format:<5} {label:<14} {elapsed / renders * 1000:7.2f} ms/camisa  "
+                  f"{renders / elapsed:8.1f} camisas/s")
+
+
+async def main(jerseys: int, delay: float, concurrency: int, renders: int):
+    base_url = start_stub_provider(generation_delay=delay)
+    state_dir = tempfile.mkdtemp(prefix="bench_compositor_")
+    os.environ.update({
+        "OPENAI_API_KEY": "stub-key",
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+        "LOG_LEVEL": "CRITICAL",
+        "TRACE_EXPORTER": "none",
+        "JOB_DB_PATH": f"{state_dir}/jobs.db",
+        "OUTBOX_DB_PATH": f"{state_dir}/outbox.db",
+        "OUTBOX_FILES_DIR": f"{state_dir}/outbox",
+        "BLOB_STORE_DIR": f"{state_dir}/blobs",
+        "VISION_CACHE_DIR": f"{state_dir}/vision_cache",
+        "JERSEY_BASES_DIR": f"{state_dir}/bases",
+    })
+
+    import httpx
+    import main as api
+
+    print(f"Stub provider em {base_url} (atraso DALL-E {delay}s, {concurrency} chamadas simultâneas)")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://bench", timeout=None) as http:
+        await _drop(http, "before", "dalle", jerseys, concurrency)
+        await _drop(http, "after", "local", jerseys, concurrency)
+    print(api.jersey_compositor.stats())
+    _render_only(renders)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jerseys", type=int, default=100)
+    parser.add_argument("--delay", type=float, default=1.0)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--renders", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.jerseys, args.delay, args.concurrency, args.renders))
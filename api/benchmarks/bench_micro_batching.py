@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Benchmark: imagens/s do pipeline do main_trained.py por tamanho de lote, em CPU
+Usa um StableDiffusionPipeline minúsculo com pesos aleatórios (mesma arquitetura dos
+componentes de teste do diffusers; tokenizer CLIP local, sem download), então os números
+medem o custo fixo por chamada que o micro-batching amortiza, não a qualidade da imagem.
+
+pipeline = TrainedJerseyGenerator.generate_batch direto, lote fixo
+batcher  = --requests pedidos simultâneos pelo MicroBatcher com max_batch_size = lote
+           (lote 1 = o comportamento anterior: uma chamada ao pipeline por pedido)
+Uso (a partir de api/): python benchmarks/bench_micro_batching.py --steps 4 --requests 32
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def _byte_symbols():
+    """Os 256 símbolos de byte do BPE do CLIP/GPT-2 (bytes_to_unicode)"""
+    printable = list(range(ord("!"), ord("~") + 1)) + list(range(ord("¡"), ord("¬") + 1)) + list(range(ord("®"), ord("ÿ") + 1))
+    symbols, extra = {}, 0
+    for byte in range(256):
+        if byte in printable:
+            symbols[byte] = chr(byte)
+        else:
+            symbols[byte] = chr(256 + extra)
+            extra += 1
+    return [symbols[byte] for byte in range(256)]
+
+
+def _tiny_tokenizer(directory: str):
+    """Tokenizer CLIP só com os 256 símbolos de byte (sem merges): um token por caractere"""
+    from transformers import CLIPTokenizer
+
+    symbols = _byte_symbols()
+    vocab = {token: index for index, token in enumerate(symbols + [s + "</w>" for s in symbols])}
+    vocab.update({"<|startoftext|>": len(vocab), "<|endoftext|>": len(vocab) + 1})
+    Path(directory, "vocab.json").write_text(json.dumps(vocab), encoding="utf-8")
+    Path(directory, "merges.txt").write_text("#version: 0.2\n", encoding="utf-8")
+    return CLIPTokenizer(str(Path(directory, "vocab.json")), str(Path(directory, "merges.txt")), model_max_length=77)
+
+
+def tiny_pipeline():
+    import torch
+    from diffusers import AutoencoderKL, DPMSolverMultistepScheduler, StableDiffusionPipeline, UNet2DConditionModel
+    from transformers import CLIPTextConfig, CLIPTextModel
+
+    torch.manual_seed(0)
+    unet = UNet2DConditionModel(
+        block_out_channels=(32, 64), layers_per_block=2, sample_size=32, in_channels=4, out_channels=4,
+        down_block_types=("DownBlock2D", "CrossAttnDownBlock2D"),
+        up_block_types=("CrossAttnUpBlock2D", "UpBlock2D"), cross_attention_dim=32,
+    )
+    vae = AutoencoderKL(
+        block_out_channels=[32, 64], in_channels=3, out_channels=3, latent_channels=4,
+        down_block_types=["DownEncoderBlock2D", "DownEncoderBlock2D"],
+        up_block_types=["UpDecoderBlock2D", "UpDecoderBlock2D"],
+    )
+    text_encoder = CLIPTextModel(CLIPTextConfig(
+        bos_token_id=0, eos_token_id=2, hidden_size=32, intermediate_size=37, layer_norm_eps=1e-05,
+        num_attention_heads=4, num_hidden_layers=5, pad_token_id=1, vocab_size=1000,
+    ))
+    pipe = StableDiffusionPipeline(
+        unet=unet, vae=vae, text_encoder=text_encoder, tokenizer=_tiny_tokenizer(tempfile.mkdtemp()),
+        scheduler=DPMSolverMultistepScheduler(steps_offset=1), safety_checker=None, feature_extractor=None,
+        requires_safety_checker=False,
+    )
+    pipe.set_progress_bar_config(disable=True)
+    return pipe
+
+
+def _items(count: int, steps: int):
+    return [{
+        # Tokenizer caractere a caractere: prompt curto para caber nos 77 tokens
+        "prompt": f"home jersey {index}, stripes",
+        "negative_prompt": "blurry, low quality",
+        "num_inference_steps": steps,
+        "guidance_scale": 7.5,
+        "seed": index,
+    } for index in range(count)]
+
+
+def bench_pipeline(generator, batch_sizes, steps: int, images: int):
+    for batch_size in batch_sizes:
+        items = _items(images, steps)
+        generator.generate_batch(items[:batch_size])  # aquecimento
+        start = time.perf_counter()
+        for offset in range(0, images, batch_size):
+            generator.generate_batch(items[offset:offset + batch_size])
+        elapsed = time.perf_counter() - start
+        print(f"pipeline lote {batch_size:>2}  {images / elapsed:7.2f} imagens/s  {elapsed / images * 1000:8.1f} ms/imagem")
+
+
+async def bench_batcher(main_trained, generator, batch_sizes, steps: int, requests: int, max_wait_ms: float):
+    for batch_size in batch_sizes:
+        batcher = main_trained.create_batcher(generator, max_batch_size=batch_size, max_wait_ms=max_wait_ms)
+        latencies = []
+
+        async def one(item):
+            start = time.perf_counter()
+            await batcher.submit(item)
+            latencies.append(time.perf_counter() - start)
+
+        await one(_items(1, steps)[0])  # aquecimento
+        latencies.clear()
+        batcher.batch_sizes.clear()
+        batcher.items = 0
+        start = time.perf_counter()
+        await asyncio.gather(*(one(item) for item in _items(requests, steps)))
+        elapsed = time.perf_counter() - start
+        stats = batcher.stats()
+        await batcher.stop()
+        print(f"batcher  max {batch_size:>2}  {requests / elapsed:7.2f} imagens/s  lote médio {stats['avg_batch_size']:5.2f}  "
+              f"p50 {statistics.median(latencies) * 1000:8.1f} ms  p95 {sorted(latencies)[int(len(latencies) * 0.95) - 1] * 1000:8.1f} ms")
+
+
+def check_seeds(generator, steps: int):
+    """A mesma seed gera a mesma imagem sozinha ou dentro de um lote"""
+    import numpy as np
+
+    items = _items(4, steps)
+    alone = np.asarray(generator.generate_batch([items[2]])[0], dtype=np.int16)
+    batched = np.asarray(generator.generate_batch(items)[2], dtype=np.int16)
+    print(f"seed 2 sozinha vs. no lote de 4: diferença máxima {int(np.abs(alone - batched).max())} (0-255)")
+
+
+async def main(batch_sizes, steps: int, images: int, requests: int, max_wait_ms: float, image_size: int):
+    import torch
+    import main_trained
+
+    logging.getLogger(main_trained.__name__).setLevel(logging.WARNING)
+    generator = main_trained.TrainedJerseyGenerator(pipe=tiny_pipeline())
+    generator.image_size = image_size
+    print(f"CPU, {torch.get_num_threads()} thread(s) torch, {steps} passos, {image_size}x{image_size}")
+    bench_pipeline(generator, batch_sizes, steps, images)
+    await bench_batcher(main_trained, generator, batch_sizes, steps, requests, max_wait_ms)
+    check_seeds(generator, steps)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-sizes", default="1,2,4,8")
+    parser.add_argument("--steps", type=int, default=4)
+    parser.add_argument("--images", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=50)
+    parser.add_argument("--image-size", type=int, default=64)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.batch_sizes.split(",")]
+    asyncio.run(main(sizes, args.steps, args.images, args.requests, args.max_wait_ms, args.image_size))
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark: busca de referências por nome com milhares de documentos
+before = pymongo síncrono + regex ancorada case-insensitive dentro do handler async
+after  = ReferenceRepository (igualdade com collation case-insensitive indexada, cliente async)
+
+Com um mongod local (--mongo-uri) mostra também o plano (COLLSCAN vs IXSCAN).
+Sem mongod usa mongomock: ele não usa índices nem collation (as buscas usam a caixa
+original dos nomes), então a diferença medida é só a de não bloquear o event loop
+(o repositório roda sobre um adaptador em threads).
+Uso (a partir de api/): python benchmarks/bench_reference_lookup.py --references 5000 --lookups 200
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from reference_store import CASE_INSENSITIVE, ReferenceRepository
+
+BENCH_DB = "bench_reference_lookup"
+
+
+def _documents(count: int):
+    for i in range(count):
+        name = f"Team {i:05d} FC"
+        yield {
+            "teamName": name,
+            "metadata": {"teamBasePrompt": f"{name} home jersey"},
+            "referenceImages": [{"url": f"https://example.com/{i}.png"}],
+        }
+
+
+class _ThreadedCollection:
+    """Expõe um collection síncrono (mongomock) com a interface awaitable usada pelo repositório"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def find_one(self, *args, **kwargs):
+        return await asyncio.to_thread(self.collection.find_one, *args, **kwargs)
+
+
+class _ThreadedDatabase:
+    def __init__(self, db):
+        self.db = db
+
+    def __getitem__(self, name):
+        return _ThreadedCollection(self.db[name])
+
+
+async def _heartbeat(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.005)
+        lags.append(time.perf_counter() - start - 0.005)
+
+
+async def _run(label: str, lookup, names, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(name):
+        async with semaphore:
+            start = time.perf_counter()
+            doc = await lookup(name)
+            latencies.append(time.perf_counter() - start)
+            assert doc is not None, name
+
+    stop = asyncio.Event()
+    lags = []
+    heartbeat = asyncio.create_task(_heartbeat(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(one(name) for name in names))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await heartbeat
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f"{label:<8} {len(names):>5} lookups  {len(names) / elapsed:9.1f} lookups/s  "
+          f"p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  max loop lag {max(lags or [0]) * 1000:7.1f} ms")
+
+
+def _explain(collection, query, **kwargs):
+    plan = collection.find(query, **kwargs).explain()
+    stats = plan.get("executionStats", {})
+    stage = plan["queryPlanner"]["winningPlan"]
+    while "inputStage" in stage:
+        stage = stage["inputStage"]
+    return f"{stage.get('stage')} docsExamined={stats.get('totalDocsExamined')}"
+
+
+async def main(references: int, lookups: int, concurrency: int, mongo_uri: str):
+    names = [f"Team {random.randrange(references):05d} FC" for _ in range(lookups)]
+
+    if mongo_uri:
+        import pymongo
+        sync_db = pymongo.MongoClient(mongo_uri)[BENCH_DB]
+        repo = ReferenceRepository.from_uri(mongo_uri, BENCH_DB)
+        backend = f"mongod ({mongo_uri})"
+        names = [name.upper() for name in names]
+    else:
+        import mongomock
+        sync_db = mongomock.MongoClient()[BENCH_DB]
+        repo = ReferenceRepository(_ThreadedDatabase(sync_db))
+        backend = "mongomock (sem índices)"
+
+    collection = sync_db["team_references"]
+    collection.drop()
+    collection.insert_many(list(_documents(references)))
+    if mongo_uri:
+        await repo.ensure_indexes()
+    print(f"{references} referências em {backend}, concorrência {concurrency}")
+
+    async def before(name):
+        query = name.strip()
+        return collection.find_one({"teamName": {"$regex": f"^{query}$", "$options": "i"}})
+
+    async def after(name):
+        return await repo.find("team_references", name)
+
+    await _run("before", before, names, concurrency)
+    await _run("after", after, names, concurrency)
+
+    if mongo_uri:
+        print("plano before:", _explain(collection, {"teamName": {"$regex": f"^{names[0]}$", "$options": "i"}}))
+        print("plano after: ", _explain(collection, {"teamName": names[0]}, collation=CASE_INSENSITIVE))
+        sync_db.client.drop_database(BENCH_DB)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--references", type=int, default=5000)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--mongo-uri", default="")
+    args = parser.parse_args()
+    asyncio.run(main(args.references, args.lookups, args.concurrency, args.mongo_uri))
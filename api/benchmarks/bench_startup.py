@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark: tempo de startup (import + primeira requisição) com o MongoDB lento para responder
+before = ping síncrono ao Mongo antes de servir (o que o import do main.py fazia)
+after  = lifespan do server.py: Mongo conecta em background, /readyz fica 503 até ele resolver
+
+Cada rodada é um processo novo (import a frio). Sem --mongo-uri o banco é um mongomock cujo
+ping demora --mongo-delay segundos (handshake TLS/SRV de um cluster remoto no cold start).
+Mede, a partir do início do processo: import, startup (lifespan), primeira resposta de
+/teams e, no after, quando o /readyz passou a 200.
+Uso (a partir de api/): python benchmarks/bench_startup.py --runs 5 --mongo-delay 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+API_DIR = Path(__file__).resolve().parent.parent
+STARTED = time.perf_counter()
+
+
+def _ms(since: float = STARTED) -> float:
+    return round((time.perf_counter() - since) * 1000, 1)
+
+
+class _SlowPingClient:
+    """mongomock com um ping que demora --mongo-delay segundos"""
+
+    delay = 0.0
+
+    def __init__(self, uri, **kwargs):
+        import mongomock
+        self._client = mongomock.MongoClient()
+        self.admin = self
+
+    def command(self, name, *args, **kwargs):
+        time.sleep(self.delay)
+        return {"ok": 1.0}
+
+    def __getitem__(self, name):
+        return self._client[name]
+
+    def close(self):
+        self._client.close()
+
+
+class _NoAsyncDatabase:
+    """Sem mongod não há cliente async: índices e change stream falham e ficam de fora"""
+
+    def __getitem__(self, name):
+        raise RuntimeError("mongomock não tem API async")
+
+    async def watch(self, *args, **kwargs):
+        raise RuntimeError("mongomock não tem change streams")
+
+
+async def _child(mode: str, mongo_uri: str, mongo_delay: float):
+    result = {}
+    import httpx
+    import pymongo
+    import main
+    import server
+    result["import_ms"] = _ms()
+
+    factory = None
+    if not mongo_uri:
+        _SlowPingClient.delay = mongo_delay
+        factory = _SlowPingClient
+        main.mongo.client_factory = factory
+        main.ReferenceRepository.from_uri = classmethod(lambda cls, uri, db_name: cls(_NoAsyncDatabase()))
+
+    if mode == "before":
+        # O import antigo: MongoClient(...).admin.command('ping') antes de qualquer rota existir
+        client = (factory or pymongo.MongoClient)(main.MONGO_URI)
+        client.admin.command("ping")
+
+    app = server.app
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as http:
+        async with app.router.lifespan_context(app):
+            result["startup_ms"] = _ms()
+            response = await http.get("/teams")
+            result["first_request_ms"] = _ms()
+            result["first_request_status"] = response.status_code
+            if mode == "after":
+                while (await http.get("/readyz")).status_code != 200:
+                    await asyncio.sleep(0.01)
+                result["ready_ms"] = _ms()
+    print("RESULT " + json.dumps(result), flush=True)
+
+
+def _run(mode: str, mongo_uri: str, mongo_delay: float, state_dir: str) -> dict:
+    env = {
+        **os.environ,
+        "MONGODB_URI": mongo_uri or "mongodb://bench-mongo.invalid:27017",
+        "LOG_LEVEL": "CRITICAL",
+        "TRACE_EXPORTER": "none",
+        # Filas, caches e blobs do processo fora da árvore do repositório
+        "JOB_DB_PATH": f"{state_dir}/jobs.db",
+        "OUTBOX_DB_PATH": f"{state_dir}/outbox.db",
+        "OUTBOX_FILES_DIR": f"{state_dir}/outbox",
+        "BLOB_STORE_DIR": f"{state_dir}/blobs",
+        "VISION_CACHE_DIR": f"{state_dir}/vision_cache",
+    }
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", mode, "--mongo-uri", mongo_uri, "--mongo-delay", str(mongo_delay)],
+        cwd=API_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    line = next(line for line in output.splitlines() if line.startswith("RESULT "))
+    return json.loads(line[len("RESULT "):])
+
+
+def main(runs: int, mongo_uri: str, mongo_delay: float):
+    backend = f"mongod ({mongo_uri})" if mongo_uri else f"mongomock com ping de {mongo_delay}s"
+    print(f"{runs} processos por cenário, banco: {backend}")
+    state_dir = tempfile.mkdtemp(prefix="bench_startup_")
+    for mode in ("before", "after"):
+        results = [_run(mode, mongo_uri, mongo_delay, state_dir) for _ in range(runs)]
+        line = f"{mode:<7}"
+        for key in ("import_ms", "startup_ms", "first_request_ms", "ready_ms"):
+            values = [result[key] for result in results if key in result]
+            line += f"  {key[:-3]} {statistics.median(values):8.1f} ms" if values else f"  {key[:-3]} {'-':>8}   "
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--mongo-uri", default="")
+    parser.add_argument("--mongo-delay", type=float, default=3.0)
+    parser.add_argument("--child", choices=("before", "after"))
+    args = parser.parse_args()
+    if args.child:
+        sys.path.insert(0, str(API_DIR))
+        asyncio.run(_child(args.child, args.mongo_uri, args.mongo_delay))
+    else:
+        main(args.runs, args.mongo_uri, args.mongo_delay)
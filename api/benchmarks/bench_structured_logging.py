@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latência dos requests com print() síncrono vs structured_logging (fila + thread)
+Cada request simulado faz os logs da rota /generate-jersey-from-reference (linhas curtas,
+análise Vision e o prompt final de ~3 KB) intercalados com I/O assíncrono (asyncio.sleep).
+O stdout é um sink lento (vazão e latência por write configuráveis), como um pipe de
+logs do container sob carga: com print() cada write trava o event loop inteiro.
+Uso (a partir de api/): python benchmarks/bench_structured_logging.py --requests 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import structured_logging
+
+PROMPT = ("Photorealistic back view of a professional soccer jersey, deep red with gold trim, "
+          "crest centered on the chest, player name arched above the number. ") * 20
+ANALYSIS = "Primary color deep red; secondary gold; V-neck collar; sponsor area blank; subtle stripes. " * 12
+
+
+class SlowSink(io.TextIOBase):
+    """stdout lento: cada write custa latency + bytes / vazão (bloqueia a thread que escreve)"""
+
+    def __init__(self, mbps: float, latency_us: float):
+        self.bytes_per_second = mbps * 1024 * 1024
+        self.latency = latency_us / 1e6
+        self.written = 0
+
+    def write(self, text: str) -> int:
+        time.sleep(self.latency + len(text) / self.bytes_per_second)
+        self.written += len(text)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def print_logs(team: str):
+    print(f"✅ [DB] Rota /generate-jersey-from-reference chamada para o time: '{team}'")
+    print(f"🔍 [DB] Buscando referência para '{team}' na coleção 'team_references'...")
+    print(f"✅ [VISION] Análise concluída com sucesso:\n{ANALYSIS}")
+    print("\n" + "=" * 80)
+    print("🔵 [DEBUG] PROMPT FINAL ENVIADO PARA O DALL-E 3:")
+    print(PROMPT)
+    print("=" * 80 + "\n")
+    print("🤖 [DALL-E] Iniciando a geração final da imagem...")
+
+
+def structured_logs(logger, team: str):
+    logger.info(f"✅ [DB] Rota /generate-jersey-from-reference chamada para o time: '{team}'")
+    logger.info(f"🔍 [DB] Buscando referência para '{team}' na coleção 'team_references'...")
+    logger.info("✅ [VISION] Análise concluída com sucesso.")
+    structured_logging.log_payload(logger, "📝 [VISION] Análise recebida", ANALYSIS)
+    structured_logging.log_payload(logger, "🔵 [DEBUG] Prompt final enviado para o DALL-E 3", PROMPT)
+    logger.info("🤖 [DALL-E] Iniciando a geração final da imagem...")
+
+
+async def run(log, requests: int, concurrency: int, io_ms: float) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def request(index: int):
+        async with semaphore:
+            start = time.perf_counter()
+            log(f"team_{index}")
+            await asyncio.sleep(io_ms / 1000)  # Mongo + Vision + DALL-E simulados
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(request(i) for i in range(requests)))
+    return latencies
+
+
+def report(name: str, latencies: list, elapsed: float, sink: SlowSink):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:<12} p50 {statistics.median(latencies) * 1000:7.1f} ms  p99 {p99 * 1000:7.1f} ms  "
+          f"total {elapsed:6.2f} s  stdout {sink.written / 1024:8.0f} KB")
+
+
+def main(requests: int, concurrency: int, io_ms: float, mbps: float, latency_us: float, level: str):
+    sink = SlowSink(mbps, latency_us)
+    real_stdout = sys.stdout
+    sys.stdout = sink
+    start = time.perf_counter()
+    try:
+        latencies = asyncio.run(run(print_logs, requests, concurrency, io_ms))
+    finally:
+        sys.stdout = real_stdout
+    report("print()", latencies, time.perf_counter() - start, sink)
+
+    structured_logging.LOG_LEVEL = level
+    sink = SlowSink(mbps, latency_us)
+    structured_logging.setup_logging(stream=sink)
+    logger = structured_logging.get_logger("bench")
+    start = time.perf_counter()
+    latencies = asyncio.run(run(lambda team: structured_logs(logger, team), requests, concurrency, io_ms))
+    elapsed = time.perf_counter() - start
+    structured_logging.shutdown_logging()  # drena a fila (fora da medição de latência)
+    report("structured", latencies, elapsed, sink)
+    print(f"(nível {level}, amostra de payload {structured_logging.LOG_PAYLOAD_SAMPLE_RATE}, "
+          f"sink {mbps} MB/s + {latency_us:.0f} µs por write, I/O simulado {io_ms} ms)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--io-ms", type=float, default=50)
+    parser.add_argument("--sink-mbps", type=float, default=5)
+    parser.add_argument("--write-latency-us", type=float, default=200)
+    parser.add_argument("--level", default="INFO")
+    args = parser.parse_args()
+    main(args.requests, args.concurrency, args.io_ms, args.sink_mbps, args.write_latency_us, args.level.upper())
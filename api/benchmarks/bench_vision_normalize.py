@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bytes e tokens estimados enviados ao Vision por imagem de referência
+before = arquivo original em base64 (como os analisadores enviavam)
+after  = image_io.normalize_for_vision (lado maior limitado, EXIF, JPEG) — 1ª chamada e cache
+Tokens seguem a fórmula de detail "high": 85 + 170 por bloco de 512px após o ajuste
+para caber em 2048x2048 e lado menor 768.
+Uso (a partir de api/): python benchmarks/bench_vision_normalize.py --max-edge 1024
+"""
+import argparse
+import base64
+import math
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import image_io
+
+IMAGE_DIRS = ("stadium_references", "image_references")
+
+
+def vision_tokens(width: int, height: int) -> int:
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def main(max_edge: int, quality: int):
+    root = Path(__file__).resolve().parent.parent
+    paths = [path for folder in IMAGE_DIRS for path in sorted((root / folder).rglob("*"))
+             if path.suffix.lower() in (".jpg", ".jpeg", ".png", ".webp")]
+    if not paths:
+        print("Nenhuma imagem de referência encontrada.")
+        return
+
+    totals = {"before_bytes": 0, "after_bytes": 0, "before_tokens": 0, "after_tokens": 0, "cold": 0.0, "warm": 0.0}
+    print(f"{len(paths)} imagens, max_edge {max_edge}, qualidade {quality}")
+    for path in paths:
+        data = path.read_bytes()
+        start = time.perf_counter()
+        normalized = image_io.normalize_for_vision(data, max_edge, quality)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        image_io.normalize_for_vision(data, max_edge, quality)
+        warm = time.perf_counter() - start
+
+        before_tokens = vision_tokens(*image_io.image_size(data))
+        after_tokens = vision_tokens(*image_io.image_size(normalized))
+        before_bytes = len(base64.b64encode(data))
+        after_bytes = len(base64.b64encode(normalized))
+        print(f"{path.parent.name + '/' + path.name:<60} {before_bytes / 1024:8.0f} KB → {after_bytes / 1024:6.0f} KB  "
+              f"tokens {before_tokens:5d} → {after_tokens:5d}  cold {cold * 1000:6.1f} ms  cache {warm * 1000:5.2f} ms")
+        totals["before_bytes"] += before_bytes
+        totals["after_bytes"] += after_bytes
+        totals["before_tokens"] += before_tokens
+        totals["after_tokens"] += after_tokens
+        totals["cold"] += cold
+        totals["warm"] += warm
+
+    count = len(paths)
+    print(f"\ntotal base64 {totals['before_bytes'] / 1048576:.1f} MB → {totals['after_bytes'] / 1048576:.1f} MB  "
+          f"tokens {totals['before_tokens']} → {totals['after_tokens']}  "
+          f"média cold {totals['cold'] / count * 1000:.1f} ms  cache {totals['warm'] / count * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-edge", type=int, default=image_io.VISION_MAX_EDGE)
+    parser.add_argument("--quality", type=int, default=image_io.VISION_JPEG_QUALITY)
+    args = parser.parse_args()
+    main(args.max_edge, args.quality)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Provedor local simulado (OpenAI Images + CDN) para benchmarks
+Responde /v1/images/generations após um atraso configurável e serve um PNG fixo.
+"""
+import asyncio
+import base64
+import io
+import socket
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Response
+from PIL import Image
+
+
+def _make_png(size: int = 1024) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (size, size), (200, 30, 30)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def create_stub_app(generation_delay: float = 0.5, png_size: int = 1024) -> FastAPI:
+    """Cria o app FastAPI que imita o DALL-E 3 e o download da imagem"""
+    app = FastAPI(title="Stub Provider")
+    png_bytes = _make_png(png_size)
+    state = {"base_url": ""}
+
+    @app.post("/v1/images/generations")
+    async def images_generations(body: dict):
+        await asyncio.sleep(generation_delay)
+        item = {"revised_prompt": body.get("prompt", "")[:50]}
+        if body.get("response_format") == "b64_json":
+            item["b64_json"] = base64.b64encode(png_bytes).decode()
+        else:
+            item["url"] = f"{state['base_url']}/images/stub.png"
+        return {"created": int(time.time()), "data": [item]}
+
+    @app.get("/images/stub.png")
+    async def image():
+        return Response(content=png_bytes, media_type="image/png")
+
+    app.state.stub = state
+    return app
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stub_provider(generation_delay: float = 0.5, png_size: int = 1024) -> str:
+    """Sobe o provedor simulado em uma thread e retorna a URL base"""
+    port = _free_port()
+    app = create_stub_app(generation_delay, png_size)
+    base_url = f"http://127.0.0.1:{port}"
+    app.state.stub["base_url"] = base_url
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return base_url
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Servidor local que fala o protocolo Redis (RESP) para benchmarks e testes do cache_backend
+Implementa só o que o RedisBackend usa: PING, AUTH, SELECT, GET, SET (PX/EX), DEL, SCAN,
+DBSIZE e FLUSHDB, com expiração preguiçosa. Uso isolado: python benchmarks/stub_redis.py --port 6390
+"""
+import argparse
+import fnmatch
+import socketserver
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+class _Store:
+    def __init__(self):
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.lock = threading.Lock()
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self.data[key]
+            return None
+        return entry[0]
+
+
+def _encode(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, bool):
+        return b"+OK\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(_encode(item) for item in value)
+    raise TypeError(type(value))
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        store: _Store = self.server.store
+        while True:
+            try:
+                args = self._read_command()
+            except ConnectionError:
+                return
+            if args is None:
+                return
+            try:
+                with store.lock:
+                    reply = self._execute(store, [args[0].upper()] + args[1:])
+            except Exception as e:
+                reply = b"-ERR " + str(e).encode() + b"\r\n"
+            self.wfile.write(reply)
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            raise ConnectionError("Só comandos em formato RESP")
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def _execute(self, store: _Store, args) -> bytes:
+        command = args[0]
+        if command == b"PING":
+            return b"+PONG\r\n"
+        if command in (b"AUTH", b"SELECT"):
+            return _encode(True)
+        if command == b"GET":
+            return _encode(store.get(args[1]))
+        if command == b"SET":
+            expires_at = None
+            options = [arg.upper() for arg in args[3:]]
+            if b"PX" in options:
+                expires_at = time.monotonic() + int(args[3 + options.index(b"PX") + 1]) / 1000
+            elif b"EX" in options:
+                expires_at = time.monotonic() + int(args[3 + options.index(b"EX") + 1])
+            store.data[args[1]] = (args[2], expires_at)
+            return _encode(True)
+        if command == b"DEL":
+            return _encode(sum(1 for key in args[1:] if store.data.pop(key, None) is not None))
+        if command == b"SCAN":
+            options = [arg.upper() for arg in args]
+            pattern = args[options.index(b"MATCH") + 1].decode() if b"MATCH" in options else "*"
+            keys = [key for key in list(store.data) if store.get(key) is not None
+                    and fnmatch.fnmatchcase(key.decode(), pattern)]
+            return _encode([b"0", keys])
+        if command == b"DBSIZE":
+            return _encode(len(store.data))
+        if command == b"FLUSHDB":
+            store.data.clear()
+            return _encode(True)
+        return b"-ERR unknown command '" + command + b"'\r\n"
+
+
+class StubRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port: int = 0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.store = _Store()
+
+
+def start_stub_redis(port: int = 0) -> str:
+    """Sobe o servidor em uma thread e retorna a URL (redis://127.0.0.1:porta/0)"""
+    server = StubRedisServer(port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"redis://127.0.0.1:{server.server_address[1]}/0"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+    server = StubRedisServer(args.port)
+    print(f"Stub Redis em redis://127.0.0.1:{args.port}/0")
+    server.serve_forever()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Blob store local para imagens geradas
+Arquivos endereçados pelo hash do conteúdo e servidos em /blobs/{key} com
+suporte a Range e ETag — as respostas da API podem devolver só a URL em vez de
+1–3 MB de base64 no JSON. Em código async use aput() (o disco é acessado em thread);
+a resposta completa sai por FileResponse, em streaming.
+As URLs são absolutas (o frontend roda em outra origem): BLOB_PUBLIC_BASE_URL ou, sem ele,
+a URL base da requisição em andamento (BlobBaseURLMiddleware). O cache HTTP de um blob
+dura só o que falta até o prune (BLOB_STORE_TTL desde a última gravação).
+"""
+import asyncio
+import contextvars
+import hashlib
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+
+from runtime_paths import data_path
+from structured_logging import get_logger
+
+logger = get_logger("blob_store")
+
+BLOB_STORE_DIR = Path(os.getenv("BLOB_STORE_DIR", data_path("generated_blobs")))
+BLOB_STORE_TTL = int(os.getenv("BLOB_STORE_TTL", str(24 * 3600)))
+BLOB_PUBLIC_BASE_URL = os.getenv("BLOB_PUBLIC_BASE_URL", "").rstrip("/")
+PRUNE_EVERY_PUTS = 100
+
+CONTENT_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "webp": "image/webp",
+}
+EXTENSIONS = {content_type: ext for ext, content_type in CONTENT_TYPES.items()}
+_KEY_PATTERN = re.compile(r"^[0-9a-f]{64}\.(png|jpg|webp)$")
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# URL base (esquema://host[:porta][root_path]) da requisição em andamento
+_request_base_url: contextvars.ContextVar[str] = contextvars.ContextVar("blob_request_base_url", default="")
+
+
+def request_base_url() -> str:
+    return _request_base_url.get()
+
+
+@contextmanager
+def use_base_url(base_url: str):
+    """URLs de blob montadas neste contexto usam base_url (ex.: job rodando fora da requisição que o criou)"""
+    token = _request_base_url.set(base_url.rstrip("/"))
+    try:
+        yield
+    finally:
+        _request_base_url.reset(token)
+
+
+class LocalBlobStore:
+    """Armazena bytes em disco com chave = sha256 + extensão"""
+
+    def __init__(self, root: Path = BLOB_STORE_DIR, ttl_seconds: int = BLOB_STORE_TTL,
+                 public_base_url: str = BLOB_PUBLIC_BASE_URL):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self.public_base_url = public_base_url
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._puts = 0
+
+    def put(self, data: bytes, content_type: str = "image/png") -> str:
+        key = f"{hashlib.sha256(data).hexdigest()}.{EXTENSIONS.get(content_type, 'png')}"
+        path = self.root / key
+        try:
+            # Blob repetido: renova o mtime para o prune não apagar um blob que acabou de ser referenciado
+            os.utime(path)
+        except FileNotFoundError:
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(data)
+            tmp_path.replace(path)
+        self._puts += 1
+        if self._puts % PRUNE_EVERY_PUTS == 0:
+            self.prune()
+        return key
+
+    async def aput(self, data: bytes, content_type: str = "image/png") -> str:
+        return await asyncio.to_thread(self.put, data, content_type)
+
+    def path_for(self, key: str) -> Optional[Path]:
+        if not _KEY_PATTERN.match(key):
+            return None
+        path = self.root / key
+        return path if path.exists() else None
+
+    def url_for(self, key: str) -> str:
+        return f"{self.public_base_url or request_base_url()}/blobs/{key}"
+
+    def max_age(self, mtime: float) -> int:
+        """Segundos até o prune poder remover o blob"""
+        return max(0, int(mtime + self.ttl_seconds - time.time()))
+
+    def prune(self) -> int:
+        """Remove blobs mais antigos que o TTL"""
+        cutoff = time.time() - self.ttl_seconds
+        removed = 0
+        for path in self.root.iterdir():
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                continue
+        if removed:
+            logger.info(f"🧹 [BLOBS] {removed} blobs expirados removidos.")
+        return removed
+
+
+blob_store = LocalBlobStore()
+
+blob_router = APIRouter(tags=["blobs"])
+
+
+class BlobBaseURLMiddleware:
+    """Guarda a URL base de cada requisição para url_for devolver URLs absolutas"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with use_base_url(str(Request(scope).base_url)):
+            await self.app(scope, receive, send)
+
+
+@blob_router.get("/blobs/{key}")
+async def get_blob(key: str, request: Request):
+    """Serve um blob com Range (206), ETag/If-None-Match (304) e cache até o prune"""
+    path = blob_store.path_for(key)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Blob not found")
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Blob not found")
+
+    etag = f'"{key.split(".")[0]}"'
+    headers = {
+        "ETag": etag,
+        # O conteúdo de uma chave nunca muda, mas o arquivo some no prune: o cache não passa do TTL
+        "Cache-Control": f"public, max-age={blob_store.max_age(stat.st_mtime)}",
+        "Accept-Ranges": "bytes",
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    media_type = CONTENT_TYPES[key.rsplit(".", 1)[1]]
+    size = stat.st_size
+    range_header = request.headers.get("range")
+    if range_header:
+        match = _RANGE_PATTERN.match(range_header.strip())
+        if not match or match.groups() == ("", ""):
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        start_text, end_text = match.groups()
+        if start_text:
+            start = int(start_text)
+            end = min(int(end_text), size - 1) if end_text else size - 1
+        else:
+            # Sufixo: últimos N bytes
+            start = max(0, size - int(end_text))
+            end = size - 1
+        if start > end or start >= size:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        chunk = await asyncio.to_thread(_read_range, path, start, end - start + 1)
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return Response(content=chunk, status_code=206, media_type=media_type, headers=headers)
+
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat)
+
+
+def _read_range(path: Path, start: int, length: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read(length)
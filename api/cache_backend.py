@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+"""
+Camada de cache plugável, compartilhável entre workers e nós
+CACHE_BACKEND escolhe onde os caches das APIs guardam as entradas:
+- memory: LRU no próprio processo (padrão; cada worker tem o seu)
+- sqlite: arquivo SQLite em WAL (CACHE_SQLITE_PATH), compartilhado pelos workers do mesmo host
+- redis: qualquer servidor que fale o protocolo Redis (CACHE_REDIS_URL), compartilhado entre nós
+Cada cache usa um namespace (cache_namespace("vision_analysis", ttl, max_entries)), as entradas
+têm TTL e o backend despeja por tamanho: LRU por namespace (max_entries, padrão CACHE_MAX_ENTRIES)
+e CACHE_MAX_BYTES no total no memory e no sqlite; a maxmemory-policy do servidor no redis. Falha do backend vira miss (o cache nunca derruba
+uma requisição).
+Em código async use aget/aset/aget_bytes/aset_bytes/adelete: no sqlite e no redis a chamada
+(I/O sob lock) roda em thread; no memory continua direta.
+"""
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from runtime_paths import data_path
+from structured_logging import get_logger
+
+logger = get_logger("cache_backend")
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")  # memory | sqlite | redis
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", str(data_path("api_cache.db")))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "chz:")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+CACHE_SOCKET_TIMEOUT = float(os.getenv("CACHE_SOCKET_TIMEOUT", "0.5"))
+CACHE_RETRY_SECONDS = float(os.getenv("CACHE_RETRY_SECONDS", "5"))  # pausa após falha de conexão (redis)
+
+# O sqlite só atualiza o "último acesso" (LRU) de uma entrada a cada TOUCH segundos,
+# para uma leitura não virar escrita disputada entre os workers
+SQLITE_TOUCH_SECONDS = 30
+SQLITE_EVICT_EVERY = 64  # expirados e limite de bytes a cada N gravações (o de entradas é a cada uma)
+
+
+class CacheBackend(ABC):
+    """Interface dos backends: valores são bytes, chaves são (namespace, key)"""
+
+    name = "base"
+    blocking = True  # faz I/O (disco/rede): as variantes async de CacheNamespace usam uma thread
+
+    def __init__(self):
+        self.limits: Dict[str, int] = {}
+
+    def limit(self, namespace: str, max_entries: int):
+        """Máximo de entradas do namespace (backends sem despejo próprio ignoram)"""
+        self.limits[namespace] = max_entries
+
+    def max_entries_for(self, namespace: str) -> int:
+        return self.limits.get(namespace, CACHE_MAX_ENTRIES)
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: bytes, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str):
+        ...
+
+    @abstractmethod
+    def clear(self, namespace: str):
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+    def close(self):
+        pass
+
+
+# --- memory ---
+class MemoryBackend(CacheBackend):
+    """LRU em processo por namespace, com limite de entradas por namespace e de bytes no total"""
+
+    name = "memory"
+    blocking = False
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self._namespaces: Dict[str, "OrderedDict[str, Tuple[bytes, Optional[float]]]"] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        with self._lock:
+            entries = self._namespaces.get(namespace)
+            entry = entries.get(key) if entries is not None else None
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                self._remove(namespace, key)
+                return None
+            entries.move_to_end(key)
+            return value
+
+    def set(self, namespace: str, key: str, value: bytes, ttl: Optional[float] = None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._remove(namespace, key)
+            entries = self._namespaces.setdefault(namespace, OrderedDict())
+            entries[key] = (value, expires_at)
+            self._bytes += len(value)
+            max_entries = self.max_entries_for(namespace)
+            while len(entries) > max_entries:
+                self._remove(namespace, next(iter(entries)))
+                self.evictions += 1
+            # Acima do limite de bytes despeja primeiro do namespace que está crescendo
+            for victim in [namespace] + [name for name in self._namespaces if name != namespace]:
+                victims = self._namespaces[victim]
+                while victims and self._bytes > self.max_bytes:
+                    self._remove(victim, next(iter(victims)))
+                    self.evictions += 1
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            self._remove(namespace, key)
+
+    def clear(self, namespace: str):
+        with self._lock:
+            for key in list(self._namespaces.get(namespace, ())):
+                self._remove(namespace, key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": self.name, "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "evictions": self.evictions,
+                    "entries": {name: len(entries) for name, entries in self._namespaces.items()}}
+
+    def _remove(self, namespace: str, key: str):
+        entry = self._namespaces.get(namespace, {}).pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[0])
+
+
+# --- sqlite ---
+class SQLiteBackend(CacheBackend):
+    """Arquivo SQLite (WAL) compartilhado pelos workers do host; despejo por último acesso"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str = CACHE_SQLITE_PATH, max_bytes: int = CACHE_MAX_BYTES):
+        super().__init__()
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._sets = 0
+        self.evictions = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Uma conexão por processo (a aberta antes de um fork do gunicorn não é reaproveitada)
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache(namespace, accessed_at)")
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value, expires_at, accessed_at FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at, accessed_at = row
+            if expires_at is not None and expires_at <= now:
+                conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key))
+                return None
+            if now - accessed_at > SQLITE_TOUCH_SECONDS:
+                conn.execute("UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?", (now, namespace, key))
+            return value
+
+    def set(self, namespace: str, key: str, value: bytes, ttl: Optional[float] = None):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, value, len(value), now + ttl if ttl else None, now),
+            )
+            self._evict_namespace(conn, namespace)
+            self._sets += 1
+            if self._sets % SQLITE_EVICT_EVERY == 0 or len(value) > self.max_bytes // SQLITE_EVICT_EVERY:
+                self._evict(conn, now)
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            self._connection().execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def clear(self, namespace: str):
+        with self._lock:
+            self._connection().execute("DELETE FROM cache WHERE namespace = ?", (namespace,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT namespace, COUNT(*), COALESCE(SUM(size), 0) FROM cache GROUP BY namespace"
+            ).fetchall()
+        return {"backend": self.name, "path": self.path, "bytes": sum(row[2] for row in rows),
+                "max_bytes": self.max_bytes, "evictions": self.evictions,
+                "entries": {namespace: count for namespace, count, _ in rows}}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Remove expirados e, acima dos limites, as entradas acessadas há mais tempo"""
+        conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        for (namespace,) in conn.execute("SELECT DISTINCT namespace FROM cache").fetchall():
+            self._evict_namespace(conn, namespace)
+        (size,) = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()
+        excess, removed = size - self.max_bytes, []
+        if excess > 0:
+            for namespace, key, entry_size in conn.execute("SELECT namespace, key, size FROM cache ORDER BY accessed_at"):
+                if excess <= 0:
+                    break
+                removed.append((namespace, key))
+                excess -= entry_size
+        conn.executemany("DELETE FROM cache WHERE namespace = ? AND key = ?", removed)
+        self.evictions += len(removed)
+
+    def _evict_namespace(self, conn: sqlite3.Connection, namespace: str):
+        max_entries = self.max_entries_for(namespace)
+        (count,) = conn.execute("SELECT COUNT(*) FROM cache WHERE namespace = ?", (namespace,)).fetchone()
+        if count > max_entries:
+            conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND key IN "
+                "(SELECT key FROM cache WHERE namespace = ? ORDER BY accessed_at LIMIT ?)",
+                (namespace, namespace, count - max_entries),
+            )
+            self.evictions += count - max_entries
+
+
+# --- redis (protocolo RESP) ---
+class RedisProtocolError(Exception):
+    pass
+
+
+class RedisBackend(CacheBackend):
+    """Cliente RESP mínimo (GET/SET PX/DEL/SCAN) para Redis, Valkey, KeyDB ou um servidor de teste"""
+
+    name = "redis"
+
+    def __init__(self, url: str = CACHE_REDIS_URL, prefix: str = CACHE_KEY_PREFIX,
+                 timeout: float = CACHE_SOCKET_TIMEOUT):
+        super().__init__()
+        parsed = urlparse(url)
+        self.url = url
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.prefix = prefix
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sock: Optional[socket.socket] = None
+        self._file = None
+        self._pid: Optional[int] = None
+        self._down_until = 0.0
+
+    def _key(self, namespace: str, key: str) -> bytes:
+        return f"{self.prefix}{namespace}:{key}".encode("utf-8")
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        return self._command(b"GET", self._key(namespace, key))
+
+    def set(self, namespace: str, key: str, value: bytes, ttl: Optional[float] = None):
+        if ttl:
+            self._command(b"SET", self._key(namespace, key), value, b"PX", str(max(1, int(ttl * 1000))).encode())
+        else:
+            self._command(b"SET", self._key(namespace, key), value)
+
+    def delete(self, namespace: str, key: str):
+        self._command(b"DEL", self._key(namespace, key))
+
+    def clear(self, namespace: str):
+        pattern = f"{self.prefix}{namespace}:*".encode("utf-8")
+        cursor = b"0"
+        while True:
+            cursor, keys = self._command(b"SCAN", cursor, b"MATCH", pattern, b"COUNT", b"500")
+            if keys:
+                self._command(b"DEL", *keys)
+            if cursor == b"0":
+                break
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "server": f"{self.host}:{self.port}/{self.db}", "prefix": self.prefix}
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+    # --- Conexão ---
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile("rb")
+        self._pid = os.getpid()
+        if self.password:
+            self._send(b"AUTH", self.password.encode("utf-8"))
+        if self.db:
+            self._send(b"SELECT", str(self.db).encode())
+
+    def _disconnect(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock, self._file = None, None
+
+    def _command(self, *args: bytes):
+        with self._lock:
+            if time.monotonic() < self._down_until:
+                raise ConnectionError(f"Servidor {self.host}:{self.port} indisponível (nova tentativa em breve)")
+            try:
+                if self._sock is None or self._pid != os.getpid():
+                    self._connect()
+                return self._send(*args)
+            except OSError:
+                # Sem servidor: as próximas chamadas viram miss na hora, sem esperar o timeout
+                self._disconnect()
+                self._down_until = time.monotonic() + CACHE_RETRY_SECONDS
+                raise
+            except RedisProtocolError:
+                # Conexão em estado desconhecido no meio de um comando: o próximo reconecta
+                self._disconnect()
+                raise
+
+    def _send(self, *args: bytes):
+        payload = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            payload.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        self._sock.sendall(b"".join(payload))
+        return self._read()
+
+    def _read(self):
+        line = self._file.readline()
+        if not line.endswith(b"\r\n"):
+            raise RedisProtocolError("Conexão fechada pelo servidor")
+        kind, data = line[:1], line[1:-2]
+        if kind == b"+":
+            return data
+        if kind == b"-":
+            raise RedisProtocolError(data.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(data)
+        if kind == b"$":
+            length = int(data)
+            if length < 0:
+                return None
+            value = self._file.read(length + 2)
+            return value[:-2]
+        if kind == b"*":
+            length = int(data)
+            return None if length < 0 else [self._read() for _ in range(length)]
+        raise RedisProtocolError(f"Resposta inválida: {line!r}")
+
+
+# --- Namespaces ---
+class CacheNamespace:
+    """Visão de um backend com namespace, TTL padrão, JSON e contadores de hit/miss"""
+
+    def __init__(self, backend: CacheBackend, namespace: str, ttl: Optional[float] = None):
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        try:
+            value = self.backend.get(self.namespace, key)
+        except Exception as e:
+            self._error("ler", e)
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set_bytes(self, key: str, value: bytes, ttl: Optional[float] = None):
+        try:
+            self.backend.set(self.namespace, key, value, ttl if ttl is not None else self.ttl)
+        except Exception as e:
+            self._error("gravar", e)
+
+    def get(self, key: str) -> Any:
+        value = self.get_bytes(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.set_bytes(key, json.dumps(value, default=str, ensure_ascii=False).encode("utf-8"), ttl)
+
+    def delete(self, key: str):
+        try:
+            self.backend.delete(self.namespace, key)
+        except Exception as e:
+            self._error("remover", e)
+
+    # --- Variantes async (não bloqueiam o event loop) ---
+    async def aget_bytes(self, key: str) -> Optional[bytes]:
+        return await self._offload(self.get_bytes, key)
+
+    async def aset_bytes(self, key: str, value: bytes, ttl: Optional[float] = None):
+        await self._offload(self.set_bytes, key, value, ttl)
+
+    async def aget(self, key: str) -> Any:
+        return await self._offload(self.get, key)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None):
+        await self._offload(self.set, key, value, ttl)
+
+    async def adelete(self, key: str):
+        await self._offload(self.delete, key)
+
+    async def _offload(self, func, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    def clear(self):
+        try:
+            self.backend.clear(self.namespace)
+        except Exception as e:
+            self._error("limpar", e)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "backend": self.backend.name,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def _error(self, action: str, error: Exception):
+        self.errors += 1
+        if self.errors == 1 or self.errors % 100 == 0:
+            logger.warning(f"⚠️ [CACHE] Falha ao {action} '{self.namespace}' no backend {self.backend.name} "
+                           f"({self.errors} falhas): {error}")
+
+
+def create_cache_backend(kind: str = CACHE_BACKEND) -> CacheBackend:
+    """Escolhe o backend conforme CACHE_BACKEND"""
+    if kind == "sqlite":
+        logger.info(f"✅ [CACHE] Usando SQLite compartilhado em '{CACHE_SQLITE_PATH}'.")
+        return SQLiteBackend()
+    if kind == "redis":
+        logger.info(f"✅ [CACHE] Usando servidor Redis em '{urlparse(CACHE_REDIS_URL).hostname}'.")
+        return RedisBackend()
+    if kind != "memory":
+        logger.warning(f"⚠️ [CACHE] CACHE_BACKEND='{kind}' desconhecido. Usando memória.")
+    return MemoryBackend()
+
+
+_backend: Optional[CacheBackend] = None
+_namespaces: Dict[str, CacheNamespace] = {}
+_namespaces_lock = threading.Lock()
+
+
+def get_cache_backend() -> CacheBackend:
+    global _backend
+    with _namespaces_lock:
+        if _backend is None:
+            _backend = create_cache_backend()
+        return _backend
+
+
+def cache_namespace(name: str, ttl: Optional[float] = None, max_entries: Optional[int] = None) -> CacheNamespace:
+    """O namespace `name` no backend do processo (a mesma instância a cada chamada)"""
+    backend = get_cache_backend()
+    with _namespaces_lock:
+        if max_entries is not None:
+            backend.limit(name, max_entries)
+        if name not in _namespaces:
+            _namespaces[name] = CacheNamespace(backend, name, ttl)
+        return _namespaces[name]
+
+
+def cache_stats() -> Dict[str, Any]:
+    return {
+        "backend": get_cache_backend().stats(),
+        "namespaces": {name: namespace.stats() for name, namespace in list(_namespaces.items())},
+    }
@@ -1,8 +1,14 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-import httpx
+from typing import Literal, Optional
 import os
 from dotenv import load_dotenv
+from provider_clients import provider_request, generate_dalle3_image, download_image
+from image_io import ensure_format, to_base64
+from provider_router import provider_router, IMAGE_ROUTING_MODE
+from structured_logging import get_logger
+
+logger = get_logger("generate_image")
 
 load_dotenv()
 
@@ -21,6 +27,7 @@ class GenerateImageRequest(BaseModel):
     size: str = "1024x1024"
     quality: str = "standard"  # standard ou hd
     use_openai_direct: bool = False  # True para usar OpenAI direto, False para OpenRouter
+    routing: Optional[Literal["manual", "auto"]] = None  # "auto" = provedor mais rápido + hedge (padrão: IMAGE_ROUTING_MODE)
 
 class GenerateImageResponse(BaseModel):
     success: bool
@@ -29,6 +36,7 @@ class GenerateImageResponse(BaseModel):
     error: str = None
     cost_estimate: float = None
     model_used: str = None
+    provider_used: str = None
 
 @router.post("/generate-image", response_model=GenerateImageResponse)
 async def generate_image(request: GenerateImageRequest):
@@ -37,22 +45,38 @@ async def generate_image(request: GenerateImageRequest):
     Suporta tanto OpenRouter quanto OpenAI direto
     """
     try:
-        print(f"🎨 [IMAGE GENERATION] Starting with model: {request.model}")
-        print(f"🎨 [IMAGE GENERATION] Prompt length: {len(request.prompt)} chars")
-        print(f"🎨 [IMAGE GENERATION] Size: {request.size}, Quality: {request.quality}")
-        print(f"🎨 [IMAGE GENERATION] Use OpenAI direct: {request.use_openai_direct}")
+        logger.info(f"🎨 [IMAGE GENERATION] Starting with model: {request.model}")
+        logger.info(f"🎨 [IMAGE GENERATION] Prompt length: {len(request.prompt)} chars")
+        logger.info(f"🎨 [IMAGE GENERATION] Size: {request.size}, Quality: {request.quality}")
+        logger.info(f"🎨 [IMAGE GENERATION] Use OpenAI direct: {request.use_openai_direct}")
         
-        if request.use_openai_direct:
+        if (request.routing or IMAGE_ROUTING_MODE) == "auto":
+            # Provedor mais rápido e saudável, com hedge/failover para o outro
+            return await _generate_with_routing(request)
+        elif request.use_openai_direct:
             # Usar OpenAI diretamente
             return await _generate_with_openai_direct(request)
         else:
             # Usar OpenRouter
             return await _generate_with_openrouter(request)
             
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ [IMAGE GENERATION] Error: {str(e)}")
+        logger.error(f"❌ [IMAGE GENERATION] Error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao gerar imagem: {str(e)}")
 
+async def _generate_with_routing(request: GenerateImageRequest) -> GenerateImageResponse:
+    """Roteia entre OpenRouter e OpenAI direto (o direto só atende modelos DALL-E)"""
+    candidates = {}
+    if OPENROUTER_API_KEY:
+        candidates["openrouter"] = lambda: _generate_with_openrouter(request)
+    if OPENAI_API_KEY and "dall-e-3" in request.model.lower():
+        candidates["openai"] = lambda: _generate_with_openai_direct(request)
+    provider, response = await provider_router.run("image", candidates)
+    response.provider_used = provider
+    return response
+
 async def _generate_with_openrouter(request: GenerateImageRequest) -> GenerateImageResponse:
     """Gera imagem via OpenRouter"""
     if not OPENROUTER_API_KEY:
@@ -76,84 +100,74 @@ async def _generate_with_openrouter(request: GenerateImageRequest) -> GenerateIm
     if "dall-e-3" in request.model.lower():
         body["quality"] = request.quality
 
-    print(f"🌐 [OPENROUTER] Sending request to OpenRouter...")
-    print(f"🌐 [OPENROUTER] Model: {request.model}")
-    print(f"🌐 [OPENROUTER] Prompt preview: {request.prompt[:200]}...")
+    logger.info(f"🌐 [OPENROUTER] Sending request to OpenRouter...")
+    logger.info(f"🌐 [OPENROUTER] Model: {request.model}")
+    logger.info(f"🌐 [OPENROUTER] Prompt preview: {request.prompt[:200]}...")
 
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        response = await client.post(
-            "https://openrouter.ai/api/v1/images/generations",
-            json=body,
-            headers=headers
-        )
+    response = await provider_request(
+        "openrouter", "POST",
+        "https://openrouter.ai/api/v1/images/generations",
+        idempotent=False,
+        images=1,
+        json=body,
+        headers=headers
+    )
+    
+    logger.info(f"🌐 [OPENROUTER] Response status: {response.status_code}")
+    
+    if response.status_code == 200:
+        data = response.json()
+        image_url = data["data"][0]["url"]
         
-        print(f"🌐 [OPENROUTER] Response status: {response.status_code}")
+        logger.info(f"✅ [OPENROUTER] Image generated successfully")
         
-        if response.status_code == 200:
-            data = response.json()
-            image_url = data["data"][0]["url"]
-            
-            print(f"✅ [OPENROUTER] Image generated successfully")
-            
-            return GenerateImageResponse(
-                success=True,
-                image_url=image_url,
-                model_used=request.model,
-                cost_estimate=0.08 if request.quality == "hd" else 0.04
-            )
-        else:
-            error_text = response.text
-            print(f"❌ [OPENROUTER] Error {response.status_code}: {error_text}")
-            raise HTTPException(status_code=response.status_code, detail=f"OpenRouter error: {error_text}")
+        return GenerateImageResponse(
+            success=True,
+            image_url=image_url,
+            model_used=request.model,
+            provider_used="openrouter",
+            cost_estimate=0.08 if request.quality == "hd" else 0.04
+        )
+    else:
+        error_text = response.text
+        logger.error(f"❌ [OPENROUTER] Error {response.status_code}: {error_text}")
+        raise HTTPException(status_code=response.status_code, detail=f"OpenRouter error: {error_text}")
 
 async def _generate_with_openai_direct(request: GenerateImageRequest) -> GenerateImageResponse:
     """Gera imagem via OpenAI diretamente"""
     if not OPENAI_API_KEY:
         raise HTTPException(status_code=500, detail="OPENAI_API_KEY não configurada")
     
-    from openai import OpenAI
-    import requests
-    import base64
-    from io import BytesIO
-    from PIL import Image
-    
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    
-    print(f"🤖 [OPENAI DIRECT] Generating with DALL-E 3...")
+    logger.info(f"🤖 [OPENAI DIRECT] Generating with DALL-E 3...")
     
     try:
-        generation_response = client.images.generate(
-            model="dall-e-3",
+        generation = await generate_dalle3_image(
             prompt=request.prompt,
             size=request.size,
-            quality=request.quality,
-            n=1
+            quality=request.quality
         )
         
-        image_url = generation_response.data[0].url
+        image_url = generation["url"]
         
         # Baixar e converter para base64 se necessário
-        img_response = requests.get(image_url, timeout=60)
-        if img_response.status_code == 200:
-            image = Image.open(BytesIO(img_response.content))
-            buffered = BytesIO()
-            image.save(buffered, format="PNG")
-            image_base64 = base64.b64encode(buffered.getvalue()).decode()
-            
-            print(f"✅ [OPENAI DIRECT] Image generated and converted to base64")
-            
-            return GenerateImageResponse(
-                success=True,
-                image_url=image_url,
-                image_base64=image_base64,
-                model_used="dall-e-3",
-                cost_estimate=0.08 if request.quality == "hd" else 0.04
-            )
-        else:
-            raise Exception(f"Erro ao baixar imagem: {img_response.status_code}")
+        image_bytes = ensure_format(await download_image(image_url), "PNG")
+        image_base64 = to_base64(image_bytes)
+        
+        logger.info(f"✅ [OPENAI DIRECT] Image generated and converted to base64")
+        
+        return GenerateImageResponse(
+            success=True,
+            image_url=image_url,
+            image_base64=image_base64,
+            model_used="dall-e-3",
+            provider_used="openai",
+            cost_estimate=0.08 if request.quality == "hd" else 0.04
+        )
             
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ [OPENAI DIRECT] Error: {str(e)}")
+        logger.error(f"❌ [OPENAI DIRECT] Error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"OpenAI error: {str(e)}")
 
 @router.get("/models")
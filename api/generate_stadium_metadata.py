@@ -11,8 +11,7 @@ from pathlib import Path
 from dotenv import load_dotenv
 import requests
 import base64
-from PIL import Image
-import io
+from image_io import normalize_for_vision
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -36,22 +35,10 @@ class StadiumMetadataGenerator:
         return [Path(img) for img in images]
     
     def encode_image(self, image_path):
-        """Codifica imagem para base64"""
+        """Codifica imagem para base64 (reduzida para economizar tokens)"""
         try:
-            with Image.open(image_path) as img:
-                # Redimensionar se muito grande (para economizar tokens)
-                if img.width > 1024 or img.height > 1024:
-                    img.thumbnail((1024, 1024), Image.Lanczos)
-                
-                # Converter para RGB se necessário
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # Salvar em buffer
-                buffer = io.BytesIO()
-                img.save(buffer, format='JPEG', quality=85)
-                
-                return base64.b64encode(buffer.getvalue()).decode('utf-8')
+            with open(image_path, 'rb') as f:
+                return base64.b64encode(normalize_for_vision(f.read())).decode('utf-8')
         except Exception as e:
             print(f"Erro ao processar {image_path}: {e}")
             return None
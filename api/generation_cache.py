@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Cache de resultados de geração (opt-in) para pedidos repetidos
+Prévia, retry e clique duplo no /generate montam exatamente o mesmo prompt: a chave é
+sha256(modelo, tamanho, qualidade, prompt final). O índice chave → blob fica no namespace
+"generated_images" de cache_backend e os bytes no blob store local (a entrada expira junto
+com o blob).
+GENERATION_CACHE=on liga para todos; por requisição, cache="use" liga e cache="bypass"
+ignora a leitura (gera de novo e substitui a entrada).
+"""
+import asyncio
+import hashlib
+import os
+from typing import Any, Dict, Optional
+
+from blob_store import BLOB_STORE_TTL, LocalBlobStore
+from cache_backend import cache_namespace
+from structured_logging import get_logger
+
+logger = get_logger("generation_cache")
+
+GENERATION_CACHE = os.getenv("GENERATION_CACHE", "off").lower() in ("on", "true", "1")
+GENERATION_CACHE_TTL = int(os.getenv("GENERATION_CACHE_TTL", str(BLOB_STORE_TTL)))
+GENERATION_CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "2000"))
+
+
+def generation_cache_key(prompt: str, model: str, size: str, quality: str) -> str:
+    raw = f"{model}\n{size}\n{quality}\n{prompt}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class GeneratedImageCache:
+    """Índice (prompt, modelo, tamanho, qualidade) → blob"""
+
+    def __init__(self, blob_store: LocalBlobStore, enabled: bool = GENERATION_CACHE,
+                 ttl_seconds: int = GENERATION_CACHE_TTL):
+        self.blob_store = blob_store
+        self.enabled = enabled
+        self.ttl_seconds = min(ttl_seconds, blob_store.ttl_seconds)
+        self.index = cache_namespace("generated_images", self.ttl_seconds, GENERATION_CACHE_MAX_ENTRIES)
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def reads(self, mode: Optional[str]) -> bool:
+        """Se a requisição consulta o cache (cache="bypass" nunca consulta)"""
+        if mode == "bypass":
+            self.bypassed += 1
+            return False
+        return mode == "use" or self.enabled
+
+    def writes(self, mode: Optional[str]) -> bool:
+        return mode in ("use", "bypass") or self.enabled
+
+    async def get(self, prompt: str, model: str, size: str, quality: str) -> Optional[bytes]:
+        key = generation_cache_key(prompt, model, size, quality)
+        entry = await self.index.aget(key)
+        if entry is not None:
+            path = self.blob_store.path_for(entry["blob"])
+            if path is not None:
+                self.hits += 1
+                return await asyncio.to_thread(path.read_bytes)
+            await self.index.adelete(key)  # blob já removido pelo prune
+        self.misses += 1
+        return None
+
+    async def put(self, prompt: str, model: str, size: str, quality: str, image_bytes: bytes) -> str:
+        blob_key = await self.blob_store.aput(image_bytes)
+        await self.index.aset(generation_cache_key(prompt, model, size, quality), {"blob": blob_key})
+        return blob_key
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Fila de jobs de geração assíncrona
+O submit devolve um job id imediatamente; um pool limitado de workers executa o pipeline
+(vision → prompt → DALL-E → download → upload → DB). O cliente consulta /jobs/{id}
+ou recebe um webhook. Jobs são persistidos (SQLite por padrão, MongoDB opcional)
+e jobs pendentes são retomados quando o worker reinicia. As gravações no store rodam em
+thread (pymongo/SQLite síncronos), fora do event loop.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import tracing
+from blob_store import request_base_url, use_base_url
+from runtime_paths import data_path
+from structured_logging import get_logger
+
+logger = get_logger("generation_jobs")
+
+JOB_BACKEND = os.getenv("JOB_BACKEND", "sqlite")  # sqlite | mongo
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", str(data_path("generation_jobs.db")))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+WEBHOOK_RETRIES = 3
+
+# Status possíveis de um job
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+UNFINISHED = (QUEUED, RUNNING)
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+# Job em execução na task atual (para report_stage)
+_current_job: contextvars.ContextVar[Optional["JobContext"]] = contextvars.ContextVar("current_job", default=None)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# --- BACKENDS DE PERSISTÊNCIA ---
+class SQLiteJobStore:
+    """Persistência local dos jobs em um arquivo SQLite"""
+
+    def __init__(self, path: str = JOB_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+        self._conn.commit()
+
+    def save(self, job: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, data, status, created_at) VALUES (?, ?, ?, ?)",
+                (job["id"], json.dumps(job, default=str), job["status"], job["created_at"]),
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_unfinished(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM jobs WHERE status IN (?, ?) ORDER BY created_at", UNFINISHED
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self._conn.commit()
+
+
+class MongoJobStore:
+    """Persistência dos jobs em uma coleção MongoDB"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        try:
+            self.collection.create_index("status")
+        except Exception as e:
+            logger.warning(f"⚠️ [JOBS] Falha ao criar índice: {e}")
+
+    def save(self, job: Dict[str, Any]):
+        self.collection.replace_one({"_id": job["id"]}, {**job, "_id": job["id"]}, upsert=True)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        doc = self.collection.find_one({"_id": job_id})
+        if doc:
+            doc.pop("_id", None)
+        return doc
+
+    def list_unfinished(self) -> List[Dict[str, Any]]:
+        docs = self.collection.find({"status": {"$in": list(UNFINISHED)}}).sort("created_at", 1)
+        return [{k: v for k, v in doc.items() if k != "_id"} for doc in docs]
+
+    def delete(self, job_id: str):
+        self.collection.delete_one({"_id": job_id})
+
+
+def create_job_store(db=None):
+    """Escolhe o backend conforme JOB_BACKEND (mongo exige conexão ativa)"""
+    if JOB_BACKEND == "mongo":
+        if db is not None:
+            logger.info("✅ [JOBS] Usando MongoDB para persistir jobs.")
+            return MongoJobStore(db["generation_jobs"])
+        logger.warning("⚠️ [JOBS] JOB_BACKEND=mongo mas o banco não está disponível. Usando SQLite.")
+    return SQLiteJobStore(JOB_DB_PATH)
+
+
+# --- EXECUÇÃO ---
+class JobContext:
+    def __init__(self, queue: "JobQueue", job: Dict[str, Any]):
+        self.queue = queue
+        self.job = job
+
+
+def report_stage(stage: str):
+    """Registra a etapa atual do pipeline no job em execução (no-op fora de um job)"""
+    context = _current_job.get()
+    if context is None:
+        return
+    job = context.job
+    job["stage"] = stage
+    job["stages"].append({"stage": stage, "at": _now()})
+    job["updated_at"] = _now()
+    context.queue.save_later(job)
+
+
+class JobQueue:
+    """Fila com pool limitado de workers asyncio"""
+
+    def __init__(self, store, handlers: Dict[str, JobHandler], workers: int = JOB_WORKERS,
+                 max_attempts: int = JOB_MAX_ATTEMPTS, http_client_factory: Optional[Callable] = None):
+        self.store = store
+        self.handlers = handlers
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.http_client_factory = http_client_factory
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._previous_store = None
+        self._running: Dict[str, Dict[str, Any]] = {}
+        self._save_locks: Dict[str, asyncio.Lock] = {}
+        self._background_saves = set()
+
+    async def start(self):
+        """Inicia os workers e retoma jobs que ficaram pendentes"""
+        self._queue = asyncio.Queue()
+        resumed = 0
+        for job in await asyncio.to_thread(self.store.list_unfinished):
+            if job["attempts"] >= self.max_attempts:
+                job["status"] = FAILED
+                job["error"] = f"Job interrompido após {job['attempts']} tentativas"
+                job["updated_at"] = _now()
+                await asyncio.to_thread(self.store.save, job)
+                continue
+            job["status"] = QUEUED
+            await asyncio.to_thread(self.store.save, job)
+            self._queue.put_nowait(job["id"])
+            resumed += 1
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"✅ [JOBS] {self.workers} workers iniciados ({resumed} jobs retomados).")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def use_store(self, store):
+        """Troca o backend com os workers rodando (SQLite provisório → Mongo) levando os jobs pendentes"""
+        previous, self.store = self.store, store
+        # Jobs do store anterior seguem consultáveis enquanto (e depois que) são copiados
+        self._previous_store = previous
+        unfinished = await asyncio.to_thread(previous.list_unfinished)
+        for job in unfinished:
+            running = self._running.get(job["id"])
+            if running is not None:
+                # Em execução: grava o estado atual pela fila ordenada do job (a linha do store anterior está defasada)
+                await self.save_later(running)
+            else:
+                await asyncio.to_thread(store.save, job)
+            # Sem a cópia no store anterior o próximo boot não roda o job de novo
+            await asyncio.to_thread(previous.delete, job["id"])
+        logger.info(f"✅ [JOBS] Backend trocado ({len(unfinished)} jobs pendentes migrados).")
+
+    async def submit(self, kind: str, payload: Dict[str, Any], webhook_url: Optional[str] = None) -> Dict[str, Any]:
+        if kind not in self.handlers:
+            raise ValueError(f"Tipo de job desconhecido: '{kind}'. Tipos: {sorted(self.handlers)}")
+        if self._queue is None:
+            raise RuntimeError("Fila de jobs não iniciada")
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "payload": payload,
+            "webhook_url": webhook_url,
+            "status": QUEUED,
+            "stage": None,
+            "stages": [],
+            "attempts": 0,
+            "result": None,
+            "error": None,
+            "traceparent": tracing.current_traceparent(),
+            # URLs de blob do resultado usam o host da requisição que submeteu o job
+            "base_url": request_base_url(),
+            "created_at": _now(),
+            "updated_at": _now(),
+        }
+        await asyncio.to_thread(self.store.save, job)
+        self._queue.put_nowait(job["id"])
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.store.get(job_id)
+        if job is None and self._previous_store is not None:
+            job = self._previous_store.get(job_id)
+        return job
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def save_later(self, job: Dict[str, Any]) -> asyncio.Task:
+        """Grava um retrato do job em thread; as gravações do mesmo job saem na ordem em que foram pedidas"""
+        snapshot = {**job, "stages": list(job["stages"])}
+        lock = self._save_locks.setdefault(job["id"], asyncio.Lock())
+        task = asyncio.create_task(self._write(snapshot, lock))
+        self._background_saves.add(task)
+        task.add_done_callback(self._background_saves.discard)
+        return task
+
+    async def _write(self, job: Dict[str, Any], lock: asyncio.Lock):
+        async with lock:
+            try:
+                await asyncio.to_thread(self.store.save, job)
+            except Exception as e:
+                logger.error(f"❌ [JOBS] Falha ao gravar o job {job['id']}: {e}")
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                job = await asyncio.to_thread(self.get, job_id)
+                if job and job["status"] in UNFINISHED:
+                    await self._run(job)
+            except Exception as e:
+                logger.error(f"❌ [JOBS] Worker {worker_id} falhou no job {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Dict[str, Any]):
+        job["status"] = RUNNING
+        job["attempts"] += 1
+        job["started_at"] = _now()
+        job["updated_at"] = _now()
+        self.save_later(job)
+
+        self._running[job["id"]] = job
+        token = _current_job.set(JobContext(self, job))
+        start = time.time()
+        try:
+            # O job continua o trace da requisição que o submeteu
+            async with tracing.span(f"job {job['kind']}", traceparent=job.get("traceparent"), job_id=job["id"]):
+                with use_base_url(job.get("base_url") or ""):
+                    job["result"] = await self.handlers[job["kind"]](job["payload"])
+            job["status"] = SUCCEEDED
+            job["error"] = None
+        except Exception as e:
+            error = getattr(e, "detail", None) or str(e)
+            logger.error(f"❌ [JOBS] Job {job['id']} ({job['kind']}) falhou: {error}")
+            job["status"] = FAILED
+            job["error"] = error
+        finally:
+            _current_job.reset(token)
+            self._running.pop(job["id"], None)
+
+        job["duration_seconds"] = round(time.time() - start, 3)
+        job["finished_at"] = _now()
+        job["updated_at"] = _now()
+        # Espera esta (e as etapas anteriores, pela ordem do lock) antes de avisar o webhook
+        await self.save_later(job)
+        self._save_locks.pop(job["id"], None)
+
+        if job.get("webhook_url"):
+            await self._send_webhook(job)
+
+    async def _send_webhook(self, job: Dict[str, Any]):
+        if self.http_client_factory is None:
+            return
+        client = self.http_client_factory()
+        for attempt in range(1, WEBHOOK_RETRIES + 1):
+            try:
+                response = await client.post(job["webhook_url"], json=job, timeout=15)
+                if response.status_code < 400:
+                    logger.info(f"✅ [JOBS] Webhook entregue para o job {job['id']}")
+                    return
+                logger.warning(f"⚠️ [JOBS] Webhook respondeu {response.status_code} (tentativa {attempt})")
+            except Exception as e:
+                logger.warning(f"⚠️ [JOBS] Falha no webhook (tentativa {attempt}): {e}")
+            if attempt < WEBHOOK_RETRIES:
+                await asyncio.sleep(2 ** attempt)
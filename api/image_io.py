@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Utilitário de I/O de imagens
+Os bytes baixados do provedor já vêm no formato pedido (PNG) — nesse caso são
+repassados sem cópia. O PIL só decodifica/recodifica quando o formato ou o
+tamanho pedido é diferente do original.
+Também concentra a normalização das imagens enviadas aos modelos Vision.
+"""
+import base64
+import binascii
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from structured_logging import get_logger
+
+logger = get_logger("image_io")
+
+VISION_MAX_EDGE = int(os.getenv("VISION_MAX_EDGE", "1024"))
+VISION_JPEG_QUALITY = int(os.getenv("VISION_JPEG_QUALITY", "85"))
+VISION_NORMALIZE_CACHE_ENTRIES = int(os.getenv("VISION_NORMALIZE_CACHE_ENTRIES", "128"))
+_EXIF_ORIENTATION = 0x0112
+
+# Assinaturas (magic bytes) dos formatos que a API recebe dos provedores
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+)
+
+CONTENT_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp", "GIF": "image/gif"}
+
+
+def sniff_format(data: bytes) -> Optional[str]:
+    """Detecta o formato pelos primeiros bytes, sem decodificar a imagem"""
+    for signature, image_format in _SIGNATURES:
+        if data.startswith(signature):
+            return image_format
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+
+def image_size(data: bytes) -> Tuple[int, int]:
+    """Lê apenas o cabeçalho para obter (largura, altura)"""
+    with Image.open(BytesIO(data)) as image:
+        return image.size
+
+
+def ensure_format(data: bytes, image_format: str = "PNG", size: Optional[Tuple[int, int]] = None,
+                  quality: int = 90) -> bytes:
+    """
+    Retorna a imagem no formato/tamanho pedido.
+    Se os bytes já estão no formato (e tamanho) certos, devolve o mesmo objeto.
+    """
+    image_format = image_format.upper()
+    if sniff_format(data) == image_format and (size is None or image_size(data) == tuple(size)):
+        return data
+
+    with Image.open(BytesIO(data)) as image:
+        if size is not None and image.size != tuple(size):
+            image = image.resize(tuple(size), Image.LANCZOS)
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        buffered = BytesIO()
+        save_kwargs = {"quality": quality} if image_format in ("JPEG", "WEBP") else {}
+        image.save(buffered, format=image_format, **save_kwargs)
+    return buffered.getvalue()
+
+
+def to_base64(data: bytes) -> str:
+    return base64.b64encode(data).decode("utf-8")
+
+
+# --- Normalização para Vision ---
+_normalized: "OrderedDict[str, bytes]" = OrderedDict()
+_normalized_lock = threading.Lock()
+
+
+def normalize_for_vision(data: bytes, max_edge: int = VISION_MAX_EDGE, quality: int = VISION_JPEG_QUALITY) -> bytes:
+    """
+    Prepara uma imagem para o modelo Vision: decode em modo draft (JPEG), lado maior
+    limitado a max_edge, orientação EXIF aplicada e JPEG com a qualidade alvo.
+    Resultados ficam em um LRU indexado pelo hash do conteúdo.
+    """
+    key = f"{hashlib.sha256(data).hexdigest()}:{max_edge}:{quality}"
+    with _normalized_lock:
+        cached = _normalized.get(key)
+        if cached is not None:
+            _normalized.move_to_end(key)
+            return cached
+
+    with Image.open(BytesIO(data)) as source:
+        orientation = source.getexif().get(_EXIF_ORIENTATION, 1)
+        if source.format == "JPEG" and max(source.size) <= max_edge and orientation == 1:
+            normalized = data
+        else:
+            # Só JPEG suporta draft: decodifica já reduzido por um fator de 2^n
+            source.draft("RGB", (max_edge, max_edge))
+            image = ImageOps.exif_transpose(source)
+            if image.mode in ("RGBA", "LA", "P"):
+                image = image.convert("RGBA")
+                background = Image.new("RGB", image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel("A"))
+                image = background
+            elif image.mode != "RGB":
+                image = image.convert("RGB")
+            image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            buffered = BytesIO()
+            image.save(buffered, format="JPEG", quality=quality)
+            normalized = buffered.getvalue()
+
+    with _normalized_lock:
+        _normalized[key] = normalized
+        while len(_normalized) > VISION_NORMALIZE_CACHE_ENTRIES:
+            _normalized.popitem(last=False)
+    return normalized
+
+
+def normalize_base64_for_vision(image_base64: str, max_edge: int = VISION_MAX_EDGE,
+                                quality: int = VISION_JPEG_QUALITY) -> Tuple[str, str]:
+    """
+    Aceita base64 puro ou data URI e devolve (base64 JPEG normalizado, "image/jpeg").
+    Entradas que não normalizam passam intactas, com o content type detectado nos bytes.
+    """
+    raw = image_base64.split(",", 1)[1] if image_base64.startswith("data:") else image_base64
+    data = b""
+    try:
+        data = base64.b64decode(raw, validate=False)
+        return to_base64(normalize_for_vision(data, max_edge, quality)), CONTENT_TYPES["JPEG"]
+    except (binascii.Error, OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning(f"⚠️ [IMAGE IO] Imagem não normalizada para Vision: {e}")
+        return raw, CONTENT_TYPES.get(sniff_format(data), CONTENT_TYPES["JPEG"])
+
+
+def vision_data_uri(image_base64: str) -> str:
+    encoded, content_type = normalize_base64_for_vision(image_base64)
+    return f"data:{content_type};base64,{encoded}"
@@ -3,8 +3,7 @@
 API Unificada - Jerseys + Stadiums para Render Deploy
 Combina as funcionalidades de geração de jerseys e estádios em uma única API
 """
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from openai import OpenAI
 import requests
@@ -15,6 +14,11 @@ import os
 from dotenv import load_dotenv
 from typing import Optional, Dict, Any, List
 from pathlib import Path
+from image_io import vision_data_uri  # normalização das imagens enviadas ao Vision
+from subsystems import Lazy, build_app  # router + inicialização preguiçosa
+from structured_logging import get_logger, log_payload
+
+logger = get_logger("jersey_api_dalle3")
 
 load_dotenv()
 
@@ -220,8 +224,8 @@ class UnifiedGenerator:
             PLAYER_NUMBER=request.player_number
         )
         
-        print(f"INFO: Gerando {team_name} com prompt otimizado")
-        print(f"INFO: Prompt: {final_prompt[:100]}...")
+        logger.info(f"INFO: Gerando {team_name} com prompt otimizado")
+        log_payload(logger, "INFO: Prompt", final_prompt)
         
         return self._generate_dalle3_image(final_prompt, request.quality)
 
@@ -260,7 +264,7 @@ class UnifiedGenerator:
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_base64}"
+                                "url": vision_data_uri(image_base64)
                             }
                         }
                     ]
@@ -271,7 +275,7 @@ class UnifiedGenerator:
         }
         
         try:
-            print(f"🔍 Analyzing stadium with GPT-4 Vision...")
+            logger.info(f"🔍 Analyzing stadium with GPT-4 Vision...")
             
             response = requests.post(
                 f"{self.openrouter_base_url}/chat/completions",
@@ -283,14 +287,14 @@ class UnifiedGenerator:
             if response.status_code == 200:
                 data = response.json()
                 enhanced_prompt = data['choices'][0]['message']['content']
-                print("✅ Stadium analysis completed")
+                logger.info("✅ Stadium analysis completed")
                 return enhanced_prompt.strip()
             else:
-                print(f"❌ OpenRouter error: {response.status_code}")
+                logger.error(f"❌ OpenRouter error: {response.status_code}")
                 return base_prompt  # Fallback para prompt base
                 
         except Exception as e:
-            print(f"❌ Vision analysis error: {str(e)}")
+            logger.error(f"❌ Vision analysis error: {str(e)}")
             return base_prompt  # Fallback para prompt base
 
     def generate_stadium(self, request: ImageGenerationRequest) -> str:
@@ -303,13 +307,13 @@ class UnifiedGenerator:
         
         # Se tem imagem de referência, usa GPT-4 Vision para analisar e melhorar o prompt
         if request.reference_image_base64:
-            print(f"🔍 Stadium generation with reference image analysis...")
+            logger.info(f"🔍 Stadium generation with reference image analysis...")
             final_prompt = self.analyze_stadium_with_vision(request.reference_image_base64, base_prompt)
         else:
-            print(f"🏟️ Stadium generation with text prompt only...")
+            logger.info(f"🏟️ Stadium generation with text prompt only...")
             final_prompt = base_prompt
         
-        print(f"INFO: Final prompt: {final_prompt[:150]}...")
+        log_payload(logger, "INFO: Final prompt", final_prompt)
         
         return self._generate_dalle3_image(final_prompt, request.quality)
 
@@ -335,28 +339,12 @@ class UnifiedGenerator:
         else:
             raise Exception(f"Erro ao baixar imagem do DALL-E 3: {img_response.status_code}")
 
-# --- CONFIGURAÇÃO DA API FASTAPI ---
-app = FastAPI(title="Unified Generator API - Jerseys + Stadiums", version="4.0.0")
-
-# Lista de domínios permitidos
-origins = [
-    "http://localhost",
-    "http://localhost:3000",
-    "https://jersey-generator-ai2-git-master-jeffnight15s-projects.vercel.app",
-    "https://jersey-generator-ai2.vercel.app"
-]
+router = APIRouter()
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"]
-)
+# Criado no primeiro uso (clientes e chaves só quando o subsistema é chamado)
+unified_generator = Lazy("jersey_dalle3.generator", UnifiedGenerator)
 
-generator = UnifiedGenerator()
-
-@app.get("/")
+@router.get("/")
 async def root():
     return {
         "status": "online", 
@@ -369,10 +357,11 @@ async def root():
         }
     }
 
-@app.post("/generate", response_model=GenerationResponse)
+@router.post("/generate", response_model=GenerationResponse)
 async def generate_image_endpoint(request: ImageGenerationRequest):
     try:
-        print(f"📦 Request: {request}")
+        generator = unified_generator.get()
+        log_payload(logger, "📦 Request", request.dict())
         
         if request.type == "stadium":
             # Validação para estádio
@@ -383,7 +372,7 @@ async def generate_image_endpoint(request: ImageGenerationRequest):
                 )
             
             # Geração de estádio
-            print("🏟️ Generating stadium...")
+            logger.info("🏟️ Generating stadium...")
             image_base64 = generator.generate_stadium(request)
             cost = 0.04 if request.quality == "standard" else 0.08
         else:
@@ -395,7 +384,7 @@ async def generate_image_endpoint(request: ImageGenerationRequest):
                 )
             
             # Geração de jersey (padrão)
-            print("👕 Generating jersey...")
+            logger.info("👕 Generating jersey...")
             image_base64 = generator.generate_jersey(request)
             cost = 0.045
         
@@ -405,20 +394,20 @@ async def generate_image_endpoint(request: ImageGenerationRequest):
             cost_usd=cost
         )
     except Exception as e:
-        print(f"ERROR: {e}")
+        logger.error(f"ERROR: {e}")
         return GenerationResponse(
             success=False,
             error=str(e)
         )
 
 # --- Health Check Endpoint ---
-@app.get("/health")
+@router.get("/health")
 async def health_check():
     """Endpoint to check if the API is running."""
     return {"status": "ok"}
 
 # --- Get Available Teams Endpoint ---
-@app.get("/teams")
+@router.get("/teams")
 async def get_available_teams():
     """
     Scans the image_references directory for subdirectories (teams) and returns a list of available team names.
@@ -435,6 +424,9 @@ async def get_available_teams():
     
     return sorted(teams)
 
+# Aplicação standalone (legado); no processo único o router é montado pelo server.py
+app = build_app("Unified Generator API - Jerseys + Stadiums", "4.0.0", [router], "jersey_api_dalle3")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Composição local de nome e número sobre uma base de camisa em branco
+Cada par nome/número de um mesmo time custava uma geração completa no DALL-E. No modo
+"local" a API gera (ou carrega) uma vez a base de costas sem texto por time/estilo e
+desenha nome e número com o PIL: fonte, cor, contorno e curvatura vêm do `numberStyle`
+e do `namePlacement` da análise Vision (ou da cor das letras no prompt do time).
+Bases ficam em JERSEY_BASES_DIR como <chave>.png — um arquivo colocado lá à mão
+(ex.: uma base aprovada pelo time de design) é usado no lugar da geração.
+"""
+import asyncio
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+
+from runtime_paths import data_path
+from single_flight import single_flight
+from structured_logging import get_logger
+
+logger = get_logger("jersey_compositor")
+
+JERSEY_RENDER_MODE = os.getenv("JERSEY_RENDER_MODE", "dalle").lower()  # dalle | local
+JERSEY_BASES_DIR = Path(os.getenv("JERSEY_BASES_DIR", data_path("jersey_bases")))
+JERSEY_BASE_CACHE_ENTRIES = int(os.getenv("JERSEY_BASE_CACHE_ENTRIES", "32"))
+JERSEY_FONT_PATH = os.getenv("JERSEY_FONT_PATH", "")
+JERSEY_SERIF_FONT_PATH = os.getenv("JERSEY_SERIF_FONT_PATH", "")
+# O encode domina o render: PNG de uma base fotográfica 1024² leva ~100 ms, JPEG ~5 ms
+JERSEY_RENDER_FORMAT = os.getenv("JERSEY_RENDER_FORMAT", "JPEG").upper()  # JPEG | PNG
+JERSEY_JPEG_QUALITY = int(os.getenv("JERSEY_JPEG_QUALITY", "92"))
+JERSEY_PNG_COMPRESS_LEVEL = int(os.getenv("JERSEY_PNG_COMPRESS_LEVEL", "1"))
+
+_SANS_FONTS = (
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf",
+    "/usr/share/fonts/TTF/DejaVuSans-Bold.ttf",
+    "/Library/Fonts/Arial Bold.ttf",
+    "C:/Windows/Fonts/arialbd.ttf",
+)
+_SERIF_FONTS = (
+    "/usr/share/fonts/truetype/dejavu/DejaVuSerif-Bold.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSerif-Bold.ttf",
+    "/usr/share/fonts/TTF/DejaVuSerif-Bold.ttf",
+    "/Library/Fonts/Times New Roman Bold.ttf",
+    "C:/Windows/Fonts/timesbd.ttf",
+)
+
+# Posições como fração da imagem, para a camisa centralizada de costas dos prompts
+LAYOUT = {
+    "name_y": 0.30,
+    "name_height": 0.055,
+    "number_y": 0.50,
+    "number_height": 0.24,
+    "max_width": 0.50,
+    "name_gap": 0.035,
+}
+
+BLANK_BACK_INSTRUCTION = (
+    "The back of the jersey is completely blank: no player name, no number, no letters, "
+    "no text and no logos, leaving clean space for lettering."
+)
+
+_HEX_COLOR = re.compile(r"#[0-9a-fA-F]{6}\b|#[0-9a-fA-F]{3}\b")
+_PLACEHOLDERS = ("{PLAYER_NAME}", "{PLAYER_NUMBER}")
+_LETTERING_WORDS = re.compile(
+    r"\{player_(?:name|number)\}|\b(?:name|number|numbers|lettering|letters|font|nome|n[úu]mero|letras|fonte)\b"
+)
+# A análise Vision da rota por referência vem em português
+_PT_COLORS = {
+    "branco": "white", "branca": "white", "preto": "black", "preta": "black",
+    "vermelho": "red", "vermelha": "red", "azul": "blue", "verde": "green",
+    "amarelo": "yellow", "amarela": "yellow", "dourado": "gold", "dourada": "gold",
+    "prata": "silver", "cinza": "gray", "laranja": "orange", "roxo": "purple", "vinho": "maroon",
+}
+
+
+# --- Prompts e estilo ---
+def blank_prompt(prompt_template: str) -> str:
+    """Prompt do time sem as frases de nome/número, pedindo as costas em branco"""
+    sentences = re.split(r"(?<=\.)\s+", prompt_template.strip())
+    kept = [sentence for sentence in sentences if not any(p in sentence for p in _PLACEHOLDERS)]
+    return " ".join(kept + [BLANK_BACK_INSTRUCTION])
+
+
+def find_color(text: Any) -> Optional[Tuple[int, int, int]]:
+    """Primeira cor (hex ou nome CSS) citada no texto"""
+    if not isinstance(text, str):
+        return None
+    match = _HEX_COLOR.search(text)
+    if match:
+        return ImageColor.getrgb(match.group(0))
+    for word in re.findall(r"[a-z]+", text.lower()):
+        word = _PT_COLORS.get(word, word)
+        if word in ImageColor.colormap:
+            return ImageColor.getrgb(word)
+    return None
+
+
+def lettering_color(prompt_template: str, default: str = "white") -> Tuple[int, int, int]:
+    """Cor das letras descrita no prompt do time (ex.: 'in bold white uppercase letters')"""
+    for sentence in re.split(r"(?<=\.)\s+", prompt_template):
+        if "{PLAYER_NAME}" in sentence or "{PLAYER_NUMBER}" in sentence:
+            color = find_color(sentence.split("}", 1)[-1])
+            if color:
+                return color
+    return ImageColor.getrgb(default)
+
+
+def analysis_lettering_color(text: str, default: str = "white") -> Tuple[int, int, int]:
+    """
+    Cor das letras num texto livre (prompt do time + análise Vision): a cor citada depois de
+    nome/número/letras; sem ela, o contraste da primeira cor da camisa (camisa branca → letras pretas).
+    """
+    for sentence in re.split(r"(?<=\.)\s+|\n+", text):
+        match = _LETTERING_WORDS.search(sentence.lower())
+        if match:
+            color = find_color(sentence[match.end():])
+            if color:
+                return color
+    jersey_color = find_color(text)
+    return _contrast(jersey_color) if jersey_color else ImageColor.getrgb(default)
+
+
+def _contrast(color: Tuple[int, int, int]) -> Tuple[int, int, int]:
+    luminance = 0.299 * color[0] + 0.587 * color[1] + 0.114 * color[2]
+    return (0, 0, 0) if luminance > 140 else (255, 255, 255)
+
+
+def style_from_analysis(analysis: Optional[Dict[str, Any]] = None,
+                        default_fill: Tuple[int, int, int] = (255, 255, 255)) -> Dict[str, Any]:
+    """
+    Converte numberStyle/namePlacement da análise Vision em parâmetros de render.
+    Campos ausentes ou ilegíveis caem no padrão: letras sólidas, sem contorno, nome reto acima do número.
+    """
+    analysis = analysis or {}
+    number_style = analysis.get("numberStyle") if isinstance(analysis.get("numberStyle"), dict) else {}
+    placement = str(analysis.get("namePlacement") or "").lower()
+
+    fill = find_color(number_style.get("fillPattern")) or find_color(number_style.get("color")) or default_fill
+    outline_text = str(number_style.get("outline") or "").lower()
+    if not outline_text or re.search(r"\b(no|none|without)\b", outline_text):
+        outline = None
+    else:
+        # "contrasting border", "team border": sem cor explícita, usa o contraste da cor do número
+        outline = find_color(outline_text) or _contrast(fill)
+    font_text = str(number_style.get("font") or "").lower()
+
+    return {
+        "font": "serif" if "serif" in font_text and "sans" not in font_text else "sans",
+        "fill": fill,
+        "name_fill": find_color(placement) or fill,
+        "outline": outline,
+        "name_position": "below" if "below" in placement else "above",
+        "curvature": 0.35 if re.search(r"\b(arch|arched|curved|curve)\b", placement) else 0.0,
+    }
+
+
+def base_key(*parts: str) -> str:
+    """Nome de arquivo da base: partes legíveis + hash curto quando alguma parte é longa (ex.: prompt)"""
+    readable = [re.sub(r"[^a-z0-9]+", "-", part.lower()).strip("-") for part in parts]
+    if any(len(part) > 32 for part in readable):
+        digest = hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:16]
+        readable = [part for part in readable if len(part) <= 32] + [digest]
+    return "_".join(part for part in readable if part)
+
+
+# --- Fontes ---
+def _font_path(family: str) -> Optional[str]:
+    configured = JERSEY_SERIF_FONT_PATH if family == "serif" else JERSEY_FONT_PATH
+    candidates = ((configured,) if configured else ()) + (_SERIF_FONTS if family == "serif" else _SANS_FONTS)
+    return next((path for path in candidates if Path(path).is_file()), None)
+
+
+@lru_cache(maxsize=256)
+def _font(family: str, size: int) -> ImageFont.FreeTypeFont:
+    path = _font_path(family) or (_font_path("sans") if family == "serif" else None)
+    if path:
+        return ImageFont.truetype(path, size)
+    # Sem fontes no sistema: a fonte embutida do Pillow (>= 10.1) também escala
+    return ImageFont.load_default(size)
+
+
+def _fit_font(family: str, text: str, height: int, max_width: int) -> ImageFont.FreeTypeFont:
+    """Maior fonte cujo texto cabe em height x max_width"""
+    size = max(8, height)
+    font = _font(family, size)
+    left, top, right, bottom = font.getbbox(text)
+    scale = min(height / max(1, bottom - top), max_width / max(1, right - left))
+    if abs(scale - 1) > 0.02:
+        font = _font(family, max(8, int(size * scale)))
+    return font
+
+
+# --- Render ---
+class JerseyCompositor:
+    """Bases em branco por chave (memória decodificada → disco → geração) e render de nome/número"""
+
+    def __init__(self, generate_base: Callable[[str, str], Awaitable[bytes]], root: Path = JERSEY_BASES_DIR,
+                 max_bases: int = JERSEY_BASE_CACHE_ENTRIES, image_format: str = JERSEY_RENDER_FORMAT):
+        self.generate_base = generate_base
+        self.root = root
+        self.max_bases = max_bases
+        self.image_format = image_format
+        self._bases: "OrderedDict[str, Image.Image]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_loads = 0
+        self.misses = 0
+        self.renders = 0
+        self.render_seconds = 0.0
+
+    async def compose(self, key: str, prompt: str, quality: str, name: str, number: str,
+                      style: Optional[Dict[str, Any]] = None) -> Tuple[bytes, bool]:
+        """Imagem (JERSEY_RENDER_FORMAT) com nome e número sobre a base da chave; retorna (bytes, se a base foi gerada agora)"""
+        base, generated = await self.base(key, prompt, quality)
+        return await asyncio.to_thread(self.render, base, name, number, style), generated
+
+    async def base(self, key: str, prompt: str, quality: str) -> Tuple[Image.Image, bool]:
+        with self._lock:
+            image = self._bases.get(key)
+            if image is not None:
+                self._bases.move_to_end(key)
+                self.hits += 1
+                return image, False
+
+        path = self.root / f"{key}.png"
+        image = await asyncio.to_thread(self._load, path)
+        if image is not None:
+            self.disk_loads += 1
+            self._remember(key, image)
+            return image, False
+
+        # Vários pedidos do mesmo time num drop novo esperam a mesma geração da base;
+        # só o que disparou a geração a conta como miss (e como custo)
+        started = []
+
+        async def generate() -> Image.Image:
+            started.append(True)
+            self.misses += 1
+            return await self._generate(key, path, prompt, quality)
+
+        image = await single_flight.do("jersey_base", key, generate)
+        if not started:
+            self.hits += 1
+        return image, bool(started)
+
+    def render(self, base: Image.Image, name: str, number: str, style: Optional[Dict[str, Any]] = None) -> bytes:
+        started = time.perf_counter()
+        style = {**style_from_analysis(), **(style or {})}
+        image = base.copy()
+        width, height = image.size
+        draw = ImageDraw.Draw(image)
+        max_width = int(width * LAYOUT["max_width"])
+        outline = style["outline"]
+
+        number_font = _fit_font(style["font"], number, int(height * LAYOUT["number_height"]), max_width)
+        number_y = int(height * LAYOUT["number_y"])
+        stroke = max(2, number_font.size // 28) if outline else 0
+        draw.text((width // 2, number_y), number, font=number_font, fill=style["fill"], anchor="mm",
+                  stroke_width=stroke, stroke_fill=outline)
+
+        name = name.upper()
+        if name:
+            name_font = _fit_font(style["font"], name, int(height * LAYOUT["name_height"]), max_width)
+            number_half = number_font.getbbox(number, anchor="mm")[3]
+            gap = int(height * LAYOUT["name_gap"]) + name_font.size // 2
+            name_y = number_y + number_half + gap if style["name_position"] == "below" else int(height * LAYOUT["name_y"])
+            name_stroke = max(1, name_font.size // 24) if outline else 0
+            if style["curvature"] > 0:
+                self._draw_arched(image, name, name_font, (width // 2, name_y), width * (1.2 - style["curvature"]),
+                                  style["name_fill"], outline, name_stroke)
+            else:
+                draw.text((width // 2, name_y), name, font=name_font, fill=style["name_fill"], anchor="mm",
+                          stroke_width=name_stroke, stroke_fill=outline)
+
+        buffered = BytesIO()
+        if self.image_format == "PNG":
+            image.save(buffered, format="PNG", compress_level=JERSEY_PNG_COMPRESS_LEVEL)
+        else:
+            image.save(buffered, format="JPEG", quality=JERSEY_JPEG_QUALITY)
+        self.renders += 1
+        self.render_seconds += time.perf_counter() - started
+        return buffered.getvalue()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.disk_loads + self.misses
+        return {
+            "bases_in_memory": len(self._bases),
+            "bases_dir": str(self.root),
+            "hits": self.hits + self.disk_loads,
+            "disk_loads": self.disk_loads,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.disk_loads) / total, 4) if total else 0.0,
+            "renders": self.renders,
+            "avg_render_ms": round(self.render_seconds / self.renders * 1000, 2) if self.renders else 0.0,
+        }
+
+    # --- Internos ---
+    @staticmethod
+    def _draw_arched(image: Image.Image, text: str, font, center: Tuple[int, int], radius: float,
+                     fill, outline, stroke: int):
+        """Nome em arco: cada letra girada sobre um círculo cujo topo passa por center"""
+        advances = [font.getlength(char) for char in text]
+        angle = -sum(advances) / (2 * radius)
+        size = int(font.size * 1.25) + 2 * stroke
+        for char, advance in zip(text, advances):
+            theta = angle + advance / (2 * radius)
+            angle += advance / radius
+            if not char.strip():
+                continue
+            tile = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+            ImageDraw.Draw(tile).text((size // 2, size // 2), char, font=font, fill=fill, anchor="mm",
+                                      stroke_width=stroke, stroke_fill=outline)
+            tile = tile.rotate(-math.degrees(theta), resample=Image.BILINEAR, expand=True)
+            x = center[0] + radius * math.sin(theta)
+            y = center[1] + radius * (1 - math.cos(theta))
+            image.paste(tile, (int(x - tile.width / 2), int(y - tile.height / 2)), tile)
+
+    @staticmethod
+    def _decode(data: bytes) -> Image.Image:
+        with Image.open(BytesIO(data)) as source:
+            image = source.convert("RGB")
+        image.load()
+        return image
+
+    @classmethod
+    def _load(cls, path: Path) -> Optional[Image.Image]:
+        """Base gravada em disco (ou colocada à mão), decodificada; None se não existe"""
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        return cls._decode(data)
+
+    def _store(self, path: Path, data: bytes):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+
+    def _remember(self, key: str, image: Image.Image):
+        with self._lock:
+            self._bases[key] = image
+            self._bases.move_to_end(key)
+            while len(self._bases) > self.max_bases:
+                self._bases.popitem(last=False)
+
+    async def _generate(self, key: str, path: Path, prompt: str, quality: str) -> Image.Image:
+        logger.info(f"🎨 [COMPOSITOR] Gerando base em branco '{key}'")
+        data = await self.generate_base(prompt, quality)
+        image = await asyncio.to_thread(self._decode, data)
+        try:
+            await asyncio.to_thread(self._store, path, data)
+        except OSError as e:
+            logger.warning(f"⚠️ [COMPOSITOR] Base '{key}' não gravada em disco: {e}")
+        self._remember(key, image)
+        logger.info(f"✅ [COMPOSITOR] Base '{key}' pronta.")
+        return image
@@ -3,23 +3,20 @@
 API Unificada - Jerseys + Stadiums
 Combina as funcionalidades de geração de jerseys e estádios em uma única API
 """
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from openai import OpenAI, AsyncOpenAI # Importar o cliente Async
-import requests
 import base64
-from io import BytesIO
-from PIL import Image
 import os
 from dotenv import load_dotenv
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple, Literal
 from pathlib import Path
 import json
-import pymongo # Adicionar import
 from datetime import datetime # Adicionar import
 import io # Para manipulação de bytes da imagem
 import time # Adicionar import para medir tempo de análise
+import asyncio
+from contextlib import asynccontextmanager
 import cloudinary
 import cloudinary.uploader
 import cloudinary.api
@@ -27,34 +24,90 @@ from bson import ObjectId
 
 # Importar sistema de prompts premium para stadiums
 from stadium_base_prompts import build_enhanced_stadium_prompt, STADIUM_NFT_BASE_PROMPT
+from stadium_reference_store import stadium_reference_store
 
 # Importar router de geração de imagens
 from generate_image import router as generate_image_router
 
+# Clientes assíncronos compartilhados (DALL-E 3 + downloads)
+from provider_clients import (
+    DALLE_MODEL, generate_dalle3_image, download_image, get_http_client, get_openai_client, get_openrouter_client,
+    init_registry, get_registry, close_clients, ImageRateLimiter, provider_request,
+)
+
+# Rate limit por chave, retries com jitter e circuit breaker dos provedores
+from provider_gateway import provider_gateway, ProviderUnavailable
+
+# Hedge/failover entre OpenRouter e OpenAI direto por latência e taxa de erro
+from provider_router import provider_router, VISION_ROUTING_MODE
+
+# Cache de análises Vision (imagens de referência)
+from vision_cache import VisionAnalysisCache, analysis_cache_key
+
+# Coalescência de chamadas idênticas em andamento (Vision e geração)
+from single_flight import single_flight, flight_key
+
+# Fila de jobs de geração assíncrona
+from generation_jobs import JOB_BACKEND, JobQueue, create_job_store, report_stage
+
+# Pós-processamento (Cloudinary, Pinata, MongoDB) fora do caminho da resposta
+from post_processing import OUTBOX_BACKEND, PostProcessingPipeline, create_outbox_store
+
+# Blob store local (respostas com URL em vez de base64)
+from blob_store import blob_store, blob_router
+
+# I/O de imagens sem round trip pelo PIL quando o formato já confere
+from image_io import CONTENT_TYPES, ensure_format, sniff_format, to_base64, vision_data_uri
+
+# Acesso async às coleções de referência (chaves normalizadas + índices)
+from reference_store import ReferenceRepository
+
+# Catálogo em cache das listagens (/stadiums, /badges, /teams) com ETag
+from reference_catalog import ReferenceCatalog
+
+# Backend de cache plugável (memória, SQLite do host ou Redis) compartilhado entre workers
+from cache_backend import cache_stats
+
+# Cache opt-in de imagens geradas (mesmo prompt/modelo/tamanho/qualidade → mesma imagem)
+from generation_cache import GeneratedImageCache, generation_cache_key
+
+# Modo "local": base em branco por time/estilo + nome e número desenhados com o PIL
+from jersey_compositor import (
+    BLANK_BACK_INSTRUCTION, JERSEY_RENDER_MODE, JerseyCompositor,
+    analysis_lettering_color, base_key, blank_prompt, lettering_color, style_from_analysis,
+)
+
+# Conexão com o MongoDB em background (tentativas limitadas) + readiness
+from mongo_connection import MongoConnection
+
 # Importar nova função de composição vision-enhanced
 from vision_prompts.base_prompts import compose_vision_enhanced_prompt
 from vision_prompts.base_prompts import compose_stadium_vision_prompt
 
+# Métricas Prometheus (/metrics): rotas, etapas do pipeline, caches e custo
+from prometheus_metrics import register_cache, stage
+# Montagem das aplicações (CORS, métricas, tracing) e inicialização preguiçosa
+from subsystems import Lazy, build_app, register_readiness
+# Logging estruturado (fila + thread de escrita, JSON com trace_id)
+from structured_logging import get_logger, log_payload
+
+logger = get_logger("main")
+
 load_dotenv()
 
 # --- Conexão MongoDB ---
 DB_NAME = "chz-app-db" # Nome do banco de dados principal
 MONGO_URI = os.getenv("MONGODB_URI") # CORRIGIDO para o nome da sua variável
+# Preenchidos por on_mongo_ready() quando a conexão em background resolve (None até lá ou sem banco)
 db_client = None
 db = None
 
-try:
-    if not MONGO_URI:
-        print("⚠️ MONGODB_URI não encontrada no .env. As operações de banco de dados estarão desativadas.")
-    else:
-        print("⚙️ Conectando ao MongoDB...")
-        db_client = pymongo.MongoClient(MONGO_URI)
-        db_client.admin.command('ping')
-        db = db_client[DB_NAME]
-        print(f"✅ Conexão com o MongoDB estabelecida com sucesso ao banco '{DB_NAME}'.")
-except Exception as e:
-    print(f"❌ Falha na conexão com o MongoDB: {e}")
-    db = None
+# Buscas por referência (times, estádios, emblemas) via cliente async
+reference_repo: Optional[ReferenceRepository] = None
+
+# --- Cache de análises Vision ---
+# Em disco até o MongoDB conectar; depois na coleção 'vision_analysis_cache'
+vision_cache = VisionAnalysisCache()
 
 
 # --- Função de composição de prompt para BADGES/EMBLEMS ---
@@ -94,11 +147,18 @@ The most important requirement is to create a clean, professional, and visually
 
 
 # --- FUNÇÃO PARA GERAR PROMPTS DALLE-3 OTIMIZADOS ---
-def generate_dalle_prompt_from_analysis(analysis_result: dict, player_name: str, player_number: str) -> str:
+def generate_dalle_prompt_from_analysis(analysis_result: dict, player_name: str, player_number: str,
+                                        blank_back: bool = False) -> str:
     """
     Gera prompt otimizado para DALL-E 3 baseado na análise Vision JSON estruturada
     Formato otimizado seguindo as melhores práticas para geração fiel
+    blank_back=True pede as costas sem nome/número (base do modo local de composição)
     """
+    if blank_back:
+        player_info = BLANK_BACK_INSTRUCTION
+    else:
+        player_info = f"Use the following player info:\n- Name: **{player_name.upper()}**\n- Number: **{player_number}**"
+
     try:
         # Extrai dados da análise com fallbacks seguros
         colors = analysis_result.get("dominantColors", ["white", "black"])
@@ -160,19 +220,17 @@ Create a photorealistic image of a {sport} jersey viewed from the {view}, with t
 - Texture: {texture}
 - Logos: {logos}
 
-Use the following player info:
-- Name: **{player_name.upper()}**
-- Number: **{player_number}**
+{player_info}
 
 Render the jersey in high quality, centered, from {view} view, on a plain white background. No mannequins, no brand names, no additional items.
 """.strip()
         
-        print(f"✅ [DALLE PROMPT] Generated optimized prompt: {len(optimized_prompt)} chars")
-        print(f"🎨 [DALLE PROMPT] Style details: {sport} {view}, colors: {colors_text}")
+        logger.info(f"✅ [DALLE PROMPT] Generated optimized prompt: {len(optimized_prompt)} chars")
+        logger.info(f"🎨 [DALLE PROMPT] Style details: {sport} {view}, colors: {colors_text}")
         return optimized_prompt
         
     except Exception as e:
-        print(f"⚠️ [DALLE PROMPT] Error generating optimized prompt: {e}")
+        logger.warning(f"⚠️ [DALLE PROMPT] Error generating optimized prompt: {e}")
         # Fallback para prompt simples
         return f"""
 Create a photorealistic image of a soccer jersey viewed from the back, with the following characteristics:
@@ -187,9 +245,7 @@ Create a photorealistic image of a soccer jersey viewed from the back, with the
 - Texture: smooth fabric
 - Logos: none
 
-Use the following player info:
-- Name: **{player_name.upper()}**
-- Number: **{player_number}**
+{player_info}
 
 Render the jersey in high quality, centered, from back view, on a plain white background. No mannequins, no brand names, no additional items.
 """.strip()
@@ -289,12 +345,12 @@ Technical requirements:
 The final image must show an authentic {sport} jersey that matches the analyzed design with the specified player name and number clearly visible.
 """.strip()
         
-        print(f"✅ [TEXT PROMPT] Generated optimized prompt: {len(base_prompt)} chars")
-        print(f"🎨 [TEXT PROMPT] Analysis length: {len(analysis_text)} chars")
+        logger.info(f"✅ [TEXT PROMPT] Generated optimized prompt: {len(base_prompt)} chars")
+        logger.info(f"🎨 [TEXT PROMPT] Analysis length: {len(analysis_text)} chars")
         return base_prompt
         
     except Exception as e:
-        print(f"⚠️ [TEXT PROMPT] Error generating prompt: {e}")
+        logger.warning(f"⚠️ [TEXT PROMPT] Error generating prompt: {e}")
         # Fallback para prompt simples
         return f"""
 Create a photorealistic image of a {sport} jersey viewed from the {view}, with the following characteristics:
@@ -321,7 +377,26 @@ The jersey must show the player customization prominently and authentically.
 # Configurações
 OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-STADIUM_REFERENCES_PATH = Path("stadium_references")
+# Modo padrão das respostas de imagem: "url" (só a URL do blob) ou "base64" (inline, legado)
+IMAGE_RESPONSE_MODE = os.getenv("IMAGE_RESPONSE_MODE", "base64")
+
+ResponseMode = Optional[Literal["url", "base64"]]
+# None segue JERSEY_RENDER_MODE; "local" compõe nome/número sobre a base do time em vez de gerar tudo no DALL-E
+RenderMode = Optional[Literal["dalle", "local"]]
+
+async def build_image_payload(image_bytes: bytes, response_mode: ResponseMode = None) -> Dict[str, Optional[str]]:
+    """Modo "url": salva no blob store (em thread) e devolve a URL; modo "base64": só o base64, sem gravar blob"""
+    if (response_mode or IMAGE_RESPONSE_MODE) == "base64":
+        return {"image_url": None, "image_base64": to_base64(image_bytes)}
+    content_type = CONTENT_TYPES.get(sniff_format(image_bytes), "image/png")
+    return {"image_url": blob_store.url_for(await blob_store.aput(image_bytes, content_type)), "image_base64": None}
+
+async def build_stadium_image_fields(image_b64: str, response_mode: ResponseMode = None) -> Dict[str, Optional[str]]:
+    """Mesmo que build_image_payload, com os nomes de campo do StadiumResponse"""
+    if (response_mode or IMAGE_RESPONSE_MODE) == "base64":
+        return {"generated_image_url": None, "generated_image_base64": image_b64}
+    payload = await build_image_payload(base64.b64decode(image_b64), response_mode)
+    return {"generated_image_url": payload["image_url"], "generated_image_base64": payload["image_base64"]}
 
 # --- Configuração do Cloudinary ---
 try:
@@ -331,9 +406,9 @@ try:
         api_secret=os.getenv("CLOUDINARY_API_SECRET"),
         secure=True,
     )
-    print("✅ Cloudinary configurado com sucesso.")
+    logger.info("✅ Cloudinary configurado com sucesso.")
 except Exception as e:
-    print(f"⚠️ Alerta: Configuração do Cloudinary falhou. Uploads estarão desabilitados. Erro: {e}")
+    logger.warning(f"⚠️ Alerta: Configuração do Cloudinary falhou. Uploads estarão desabilitados. Erro: {e}")
 
 # --- MODELOS DE DADOS PARA JERSEYS ---
 class ImageGenerationRequest(BaseModel):
@@ -341,6 +416,10 @@ class ImageGenerationRequest(BaseModel):
     player_name: str
     player_number: str
     quality: str = "standard"
+    response_mode: ResponseMode = None
+    # None segue GENERATION_CACHE; "use" consulta o cache de resultados, "bypass" gera de novo
+    cache: Optional[Literal["use", "bypass"]] = None
+    render_mode: RenderMode = None
 
 class VisionEnhancedGenerationRequest(BaseModel):
     player_name: str
@@ -348,6 +427,8 @@ class VisionEnhancedGenerationRequest(BaseModel):
     quality: str = "standard"
     generation_mode: str = "vision_enhanced"
     vision_analysis: Optional[Dict[str, Any]] = None
+    response_mode: ResponseMode = None
+    render_mode: RenderMode = None
 
 class GenerateFromReferenceRequest(BaseModel):
     teamName: str
@@ -356,13 +437,17 @@ class GenerateFromReferenceRequest(BaseModel):
     quality: str = "standard"
     sport: str = "soccer"
     view: str = "back"
+    response_mode: ResponseMode = None
+    render_mode: RenderMode = None
 
 # RESPOSTA DA GERAÇÃO POR REFERÊNCIA - CORRIGIDO
 class ReferenceGenerationResponse(BaseModel):
     success: bool
     image_base64: Optional[str] = None # CORRIGIDO: Deve ser image_base64
+    image_url: Optional[str] = None  # URL do blob store (/blobs/{key})
     prompt: Optional[str] = None
     error: Optional[str] = None
+    asset_id: Optional[str] = None  # Consultar o pós-processamento em /assets/{asset_id}
 
 class CompleteVisionFlowRequest(BaseModel):
     image_base64: str
@@ -372,12 +457,15 @@ class CompleteVisionFlowRequest(BaseModel):
     view: str = "back"
     model: str = "openai/gpt-4o-mini"
     quality: str = "standard"
+    response_mode: ResponseMode = None
 
 class GenerationResponse(BaseModel):
     success: bool
     image_base64: Optional[str] = None
+    image_url: Optional[str] = None
     cost_usd: Optional[float] = None
     error: Optional[str] = None
+    cache_hit: Optional[bool] = None
 
 # --- MODELOS DE DADOS PARA STADIUMS ---
 class StadiumReferenceRequest(BaseModel):
@@ -391,6 +479,7 @@ class StadiumReferenceRequest(BaseModel):
     quality: str = "standard"
     custom_prompt: Optional[str] = None
     custom_reference_base64: Optional[str] = None
+    response_mode: ResponseMode = None
 
 class CustomStadiumRequest(BaseModel):
     prompt: str
@@ -400,6 +489,7 @@ class CustomStadiumRequest(BaseModel):
     atmosphere: str = "packed"
     time_of_day: str = "day"
     quality: str = "standard"
+    response_mode: ResponseMode = None
 
 class StadiumInfo(BaseModel):
     id: str
@@ -410,6 +500,7 @@ class StadiumResponse(BaseModel):
     success: bool
     analysis: Optional[Dict[str, Any]] = None
     generated_image_base64: Optional[str] = None
+    generated_image_url: Optional[str] = None
     reference_used: Optional[str] = None
     reference_source: Optional[str] = None
     error: Optional[str] = None
@@ -453,11 +544,12 @@ class BadgeInfo(BaseModel):
 
 # --- GERADOR DE JERSEYS ---
 class JerseyGenerator:
+    image_size = "1024x1024"
+
     def __init__(self):
         self.api_key = os.getenv('OPENAI_API_KEY')
         if not self.api_key:
             raise Exception("OPENAI_API_KEY não encontrada")
-        self.client = OpenAI(api_key=self.api_key)
         self.setup_team_prompts()
 
     def setup_team_prompts(self):
@@ -478,100 +570,75 @@ class JerseyGenerator:
         """Extrai o nome do time do model_id"""
         return model_id.split('_')[0].lower()
 
-    def generate_image(self, request: ImageGenerationRequest) -> str:
-        """Gera uma camisa usando prompt otimizado específico do time."""
-        
+    def _team_prompt(self, request: ImageGenerationRequest) -> str:
         team_name = self._get_team_name_from_model_id(request.model_id)
         
         if team_name not in self.team_prompts:
             raise ValueError(f"Time '{team_name}' não tem prompt configurado")
-        
-        prompt_template = self.team_prompts[team_name]
-        final_prompt = prompt_template.format(
+        return self.team_prompts[team_name]
+
+    def build_prompt(self, request: ImageGenerationRequest) -> str:
+        """Prompt final do time com nome e número (também é a chave do cache de resultados)"""
+        prompt_template = self._team_prompt(request)
+        return prompt_template.format(
             PLAYER_NAME=request.player_name.upper(),
             PLAYER_NUMBER=request.player_number
         )
+
+    async def generate_image(self, request: ImageGenerationRequest, final_prompt: Optional[str] = None) -> bytes:
+        """Gera uma camisa usando prompt otimizado específico do time."""
+        final_prompt = final_prompt or self.build_prompt(request)
         
-        print(f"INFO: Gerando {team_name} com prompt otimizado")
+        logger.info(f"INFO: Gerando {self._get_team_name_from_model_id(request.model_id)} com prompt otimizado")
         
-        generation_response = self.client.images.generate(
-            model="dall-e-3",
+        generation = await generate_dalle3_image(
             prompt=final_prompt,
-            size="1024x1024",
-            quality=request.quality,
-            n=1
+            size=self.image_size,
+            quality=request.quality
         )
         
-        image_url = generation_response.data[0].url
-        img_response = requests.get(image_url, timeout=60)
-        
-        if img_response.status_code == 200:
-            image = Image.open(BytesIO(img_response.content))
-            buffered = BytesIO()
-            image.save(buffered, format="PNG")
-            return base64.b64encode(buffered.getvalue()).decode()
-        else:
-            raise Exception(f"Erro ao baixar imagem do DALL-E 3: {img_response.status_code}")
+        image_bytes = await download_image(generation["url"])
+        return ensure_format(image_bytes, "PNG")
+
+    async def compose_locally(self, request: ImageGenerationRequest) -> Tuple[bytes, bool]:
+        """Nome e número sobre a base em branco do time; retorna (bytes, se a base foi gerada agora)"""
+        prompt_template = self._team_prompt(request)
+        team_name = self._get_team_name_from_model_id(request.model_id)
+        return await jersey_compositor.compose(
+            base_key(team_name, request.quality),
+            blank_prompt(prompt_template),
+            request.quality,
+            request.player_name,
+            request.player_number,
+            style_from_analysis(default_fill=lettering_color(prompt_template)),
+        )
 
 # --- GERADOR DE STADIUMS ---
 class StadiumReferenceGenerator:
     def __init__(self):
-        self.openai_client = OpenAI(api_key=OPENAI_API_KEY)
         self.openrouter_url = "https://openrouter.ai/api/v1/chat/completions"
         self.openrouter_headers = {
             "Authorization": f"Bearer {OPENROUTER_API_KEY}",
             "Content-Type": "application/json"
         }
-        print("✅ Stadium Reference Generator initialized")
+        stadium_reference_store.start_watcher()
+        logger.info("✅ Stadium Reference Generator initialized")
     
     def get_available_stadiums(self) -> List[StadiumInfo]:
-        """Lista estádios disponíveis"""
-        stadiums = []
-        
-        if not STADIUM_REFERENCES_PATH.exists():
-            return stadiums
-        
-        for stadium_dir in STADIUM_REFERENCES_PATH.iterdir():
-            if stadium_dir.is_dir():
-                image_files = []
-                for ext in ['*.jpg', '*.jpeg', '*.png', '*.webp']:
-                    image_files.extend(stadium_dir.glob(ext))
-                
-                stadium_name = stadium_dir.name.replace('_', ' ').title()
-                
-                stadiums.append(StadiumInfo(
-                    id=stadium_dir.name,
-                    name=stadium_name,
-                    available_references=[f.name for f in image_files]
-                ))
-        
-        return stadiums
+        """Lista estádios disponíveis (manifesto indexado, sem glob por chamada)"""
+        return [
+            StadiumInfo(id=stadium["id"], name=stadium["name"], available_references=stadium["available_references"])
+            for stadium in stadium_reference_store.stadiums()
+        ]
     
     def load_reference_image(self, stadium_id: str, reference_type: str) -> Optional[str]:
-        """Carrega imagem de referência"""
-        stadium_path = STADIUM_REFERENCES_PATH / stadium_id
-        
-        if not stadium_path.exists():
-            return None
-        
-        for ext in ['jpg', 'jpeg', 'png', 'webp']:
-            files = list(stadium_path.glob(f"*.{ext}"))
-            if files:
-                image_file = files[0]
-                try:
-                    with open(image_file, 'rb') as f:
-                        image_data = f.read()
-                        return base64.b64encode(image_data).decode('utf-8')
-                except Exception as e:
-                    print(f"❌ Error loading {image_file}: {e}")
-                    continue
-        
-        return None
+        """Carrega a imagem de referência do tipo pedido, reduzida e pronta para Vision (base64 JPEG)"""
+        return stadium_reference_store.vision_base64(stadium_id, reference_type)
     
-    def analyze_reference_image(self, image_base64: str, stadium_name: str) -> Dict[str, Any]:
+    async def analyze_reference_image(self, image_base64: str, stadium_name: str) -> Dict[str, Any]:
         """Analisa imagem de referência"""
         try:
-            print(f"🔍 Analyzing {stadium_name}...")
+            logger.info(f"🔍 Analyzing {stadium_name}...")
             
             prompt = f"""Analyze this {stadium_name} stadium image for premium NFT artwork generation. Focus on:
 
@@ -587,6 +654,8 @@ AESTHETIC QUALITIES:
 - Proportions and scale relationships
 
 Provide a detailed architectural description for NFT generation."""
+            # Decodificar/redimensionar/recodificar é CPU: fora do event loop
+            image_uri = await asyncio.to_thread(vision_data_uri, image_base64)
             
             payload = {
                 "model": "openai/gpt-4o-mini",
@@ -598,7 +667,7 @@ Provide a detailed architectural description for NFT generation."""
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_base64}"
+                                    "url": image_uri
                                 }
                             }
                         ]
@@ -606,12 +675,15 @@ Provide a detailed architectural description for NFT generation."""
                 ]
             }
             
-            response = requests.post(
-                self.openrouter_url,
-                headers=self.openrouter_headers,
-                json=payload,
-                timeout=30
-            )
+            async with stage("vision_analysis"):
+                response = await provider_request(
+                    "openrouter", "POST",
+                    self.openrouter_url,
+                    idempotent=True,
+                    headers=self.openrouter_headers,
+                    json=payload,
+                    timeout=30
+                )
             
             if response.status_code != 200:
                 raise Exception(f"OpenRouter error: {response.status_code}")
@@ -625,31 +697,31 @@ Provide a detailed architectural description for NFT generation."""
                 "analysis_type": "premium_nft_focused"
             }
             
+        except ProviderUnavailable:
+            raise
         except Exception as e:
-            print(f"❌ Analysis error: {e}")
+            logger.error(f"❌ Analysis error: {e}")
             return {
                 "error": str(e),
                 "stadium_name": stadium_name
             }
     
-    def generate_stadium_dalle3(self, prompt: str, quality: str = "standard") -> Dict[str, Any]:
+    async def generate_stadium_dalle3(self, prompt: str, quality: str = "standard") -> Dict[str, Any]:
         """Gera estádio usando DALL-E 3"""
         try:
-            print(f"🎨 Generating stadium with DALL-E 3...")
+            logger.info(f"🎨 Generating stadium with DALL-E 3...")
             
             size = "1024x1024" if quality == "standard" else "1024x1792"
             dalle_quality = "standard" if quality == "standard" else "hd"
             
-            response = self.openai_client.images.generate(
-                model="dall-e-3",
+            generation = await generate_dalle3_image(
                 prompt=prompt,
-                n=1,
                 size=size,
                 quality=dalle_quality,
                 response_format="b64_json"
             )
             
-            image_b64 = response.data[0].b64_json
+            image_b64 = generation["b64_json"]
             cost = 0.04 if quality == "standard" else 0.08
             
             return {
@@ -658,14 +730,16 @@ Provide a detailed architectural description for NFT generation."""
                 "cost": cost
             }
             
+        except ProviderUnavailable:
+            raise
         except Exception as e:
-            print(f"❌ Generation error: {e}")
+            logger.error(f"❌ Generation error: {e}")
             return {
                 "success": False,
                 "error": str(e)
             }
     
-    def generate_from_reference(self, request: StadiumReferenceRequest) -> StadiumResponse:
+    async def generate_from_reference(self, request: StadiumReferenceRequest) -> StadiumResponse:
         """Gera estádio baseado em referência"""
         try:
             total_cost = 0
@@ -673,11 +747,11 @@ Provide a detailed architectural description for NFT generation."""
             reference_used = f"{request.stadium_id}_{request.reference_type}"
             
             # Carregar imagem de referência
-            image_base64 = self.load_reference_image(request.stadium_id, request.reference_type)
+            image_base64 = await asyncio.to_thread(self.load_reference_image, request.stadium_id, request.reference_type)
             
             if image_base64:
                 # Analisar referência
-                analysis = self.analyze_reference_image(image_base64, request.stadium_id)
+                analysis = await self.analyze_reference_image(image_base64, request.stadium_id)
                 total_cost += 0.01
                 
                 # Construir prompt baseado na análise
@@ -687,17 +761,18 @@ Provide a detailed architectural description for NFT generation."""
                     base_prompt = f"A modern stadium similar to {request.stadium_id}"
                 
                 # Usar sistema de prompts premium
-                enhanced_prompt = build_enhanced_stadium_prompt(
-                    architectural_analysis=base_prompt,
-                    style=request.generation_style,
-                    perspective=request.perspective,
-                    atmosphere=request.atmosphere,
-                    time_of_day=request.time_of_day,
-                    weather=request.weather
-                )
+                with stage("prompt_composition"):
+                    enhanced_prompt = build_enhanced_stadium_prompt(
+                        architectural_analysis=base_prompt,
+                        style=request.generation_style,
+                        perspective=request.perspective,
+                        atmosphere=request.atmosphere,
+                        time_of_day=request.time_of_day,
+                        weather=request.weather
+                    )
                 
                 # Gerar imagem
-                generation_result = self.generate_stadium_dalle3(enhanced_prompt, request.quality)
+                generation_result = await self.generate_stadium_dalle3(enhanced_prompt, request.quality)
                 
                 if generation_result["success"]:
                     total_cost += generation_result["cost"]
@@ -705,7 +780,7 @@ Provide a detailed architectural description for NFT generation."""
                     return StadiumResponse(
                         success=True,
                         analysis=analysis,
-                        generated_image_base64=generation_result["image_base64"],
+                        **await build_stadium_image_fields(generation_result["image_base64"], request.response_mode),
                         reference_used=reference_used,
                         reference_source="local",
                         cost_usd=total_cost,
@@ -720,22 +795,23 @@ Provide a detailed architectural description for NFT generation."""
             # Fallback para prompt customizado
             elif request.custom_prompt or request.custom_reference_base64:
                 if request.custom_reference_base64:
-                    analysis = self.analyze_reference_image(request.custom_reference_base64, "custom")
+                    analysis = await self.analyze_reference_image(request.custom_reference_base64, "custom")
                     total_cost += 0.01
                     base_prompt = analysis.get("architectural_description", request.custom_prompt or "Modern stadium")
                 else:
                     base_prompt = request.custom_prompt or "Modern stadium"
                 
-                enhanced_prompt = build_enhanced_stadium_prompt(
-                    architectural_analysis=base_prompt,
-                    style=request.generation_style,
-                    perspective=request.perspective,
-                    atmosphere=request.atmosphere,
-                    time_of_day=request.time_of_day,
-                    weather=request.weather
-                )
+                with stage("prompt_composition"):
+                    enhanced_prompt = build_enhanced_stadium_prompt(
+                        architectural_analysis=base_prompt,
+                        style=request.generation_style,
+                        perspective=request.perspective,
+                        atmosphere=request.atmosphere,
+                        time_of_day=request.time_of_day,
+                        weather=request.weather
+                    )
                 
-                generation_result = self.generate_stadium_dalle3(enhanced_prompt, request.quality)
+                generation_result = await self.generate_stadium_dalle3(enhanced_prompt, request.quality)
                 
                 if generation_result["success"]:
                     total_cost += generation_result["cost"]
@@ -743,7 +819,7 @@ Provide a detailed architectural description for NFT generation."""
                     return StadiumResponse(
                         success=True,
                         analysis=analysis,
-                        generated_image_base64=generation_result["image_base64"],
+                        **await build_stadium_image_fields(generation_result["image_base64"], request.response_mode),
                         reference_used="custom",
                         reference_source="custom",
                         cost_usd=total_cost,
@@ -761,13 +837,15 @@ Provide a detailed architectural description for NFT generation."""
                     error=f"No reference found for {request.stadium_id} and no custom reference/prompt provided"
                 )
                 
+        except ProviderUnavailable:
+            raise
         except Exception as e:
             return StadiumResponse(
                 success=False,
                 error=str(e)
             )
     
-    def generate_custom(self, request: CustomStadiumRequest) -> StadiumResponse:
+    async def generate_custom(self, request: CustomStadiumRequest) -> StadiumResponse:
         """Gera estádio customizado"""
         try:
             total_cost = 0
@@ -775,23 +853,24 @@ Provide a detailed architectural description for NFT generation."""
             
             # Analisar imagem de referência se fornecida
             if request.reference_image_base64:
-                analysis = self.analyze_reference_image(request.reference_image_base64, "custom")
+                analysis = await self.analyze_reference_image(request.reference_image_base64, "custom")
                 total_cost += 0.01
                 base_prompt = analysis.get("architectural_description", request.prompt)
             else:
                 base_prompt = request.prompt
             
             # Construir prompt aprimorado
-            enhanced_prompt = build_enhanced_stadium_prompt(
-                architectural_analysis=base_prompt,
-                style=request.generation_style,
-                perspective=request.perspective,
-                atmosphere=request.atmosphere,
-                time_of_day=request.time_of_day
-            )
+            with stage("prompt_composition"):
+                enhanced_prompt = build_enhanced_stadium_prompt(
+                    architectural_analysis=base_prompt,
+                    style=request.generation_style,
+                    perspective=request.perspective,
+                    atmosphere=request.atmosphere,
+                    time_of_day=request.time_of_day
+                )
             
             # Gerar imagem
-            generation_result = self.generate_stadium_dalle3(enhanced_prompt, request.quality)
+            generation_result = await self.generate_stadium_dalle3(enhanced_prompt, request.quality)
             
             if generation_result["success"]:
                 total_cost += generation_result["cost"]
@@ -799,7 +878,7 @@ Provide a detailed architectural description for NFT generation."""
                 return StadiumResponse(
                     success=True,
                     analysis=analysis,
-                    generated_image_base64=generation_result["image_base64"],
+                    **await build_stadium_image_fields(generation_result["image_base64"], request.response_mode),
                     reference_used="custom_prompt",
                     reference_source="custom",
                     cost_usd=total_cost,
@@ -811,6 +890,8 @@ Provide a detailed architectural description for NFT generation."""
                     error=generation_result["error"]
                 )
                 
+        except ProviderUnavailable:
+            raise
         except Exception as e:
             return StadiumResponse(
                 success=False,
@@ -823,100 +904,139 @@ class VisionAnalysisSystem:
     Sistema para análise de imagens usando modelos Vision (OpenRouter/OpenAI).
     Modificado para aceitar diretamente URLs de imagem.
     """
-    def __init__(self):
-        # Tenta carregar a chave da API do OpenRouter, com fallback para OpenAI
-        self.api_key = os.getenv("OPENROUTER_API_KEY", os.getenv("OPENAI_API_KEY"))
-        self.api_base = os.getenv("OPENROUTER_API_BASE", "https://openrouter.ai/api/v1")
-        # CORRIGIDO: Usar o cliente AsyncOpenAI para chamadas 'await'
-        self.client = AsyncOpenAI(api_key=self.api_key, base_url=self.api_base)
-        print("✅ Vision Analysis System initialized.")
+    def __init__(self, cache: Optional[VisionAnalysisCache] = None):
+        # Clientes (OpenRouter e OpenAI direto) vêm do registro; a escolha é feita por chamada no provider_router
+        self.cache = cache if cache is not None else vision_cache
+        logger.info("✅ Vision Analysis System initialized.")
 
     async def analyze_image_with_vision(self, image_url: str, prompt: str, model: str = "openai/gpt-4o-mini") -> Dict[str, Any]:
         """
         Analisa uma imagem a partir de uma URL usando um modelo de visão.
         """
-        print(f"👁️  [VISION] Iniciando análise com o modelo '{model}' para a URL: {image_url}")
+        logger.info(f"👁️  [VISION] Iniciando análise com o modelo '{model}' para a URL: {image_url[:120]}")
         try:
-            # Chama o método principal de análise, agora passando a URL
-            return await self._analyze_with_provider(image_url=image_url, prompt=prompt, model=model)
+            cached = await self.cache.get(image_url, prompt, model)
+            if cached is not None:
+                logger.info(f"⚡ [VISION] Análise encontrada no cache.")
+                return {**cached, "cached": True}
+
+            # Análises idênticas em andamento compartilham a mesma chamada ao provedor
+            return await single_flight.do(
+                "vision_analysis",
+                analysis_cache_key(image_url, prompt, model),
+                lambda: self._analyze_and_cache(image_url, prompt, model),
+            )
+        except ProviderUnavailable:
+            raise
         except Exception as e:
-            print(f"❌ [VISION] Erro inesperado na análise da imagem: {e}")
+            logger.error(f"❌ [VISION] Erro inesperado na análise da imagem: {e}")
             return {"success": False, "error": str(e)}
 
+    async def _analyze_and_cache(self, image_url: str, prompt: str, model: str) -> Dict[str, Any]:
+        # Imagens inline (base64/data URI) são normalizadas antes de ir ao provedor;
+        # URLs remotas seguem direto
+        provider_url = image_url if image_url.startswith(("http://", "https://")) else await asyncio.to_thread(vision_data_uri, image_url)
+
+        # Chama o método principal de análise, agora passando a URL
+        result = await self._analyze_with_provider(image_url=provider_url, prompt=prompt, model=model)
+        if result.get("success"):
+            await self.cache.set(image_url, prompt, model, result)
+        return result
+
     async def _analyze_with_provider(self, image_url: str, prompt: str, model: str) -> Dict[str, Any]:
         """
         Lógica central que interage com a API (OpenAI/OpenRouter) usando uma URL de imagem.
+        Em modo "auto" a chamada vai para o provedor mais rápido, com hedge/failover para o outro.
         """
         start_time = time.time()
         try:
-            chat_completion = await self.client.chat.completions.create(
-                model=model,
-                messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                                "image_url": {
-                                    "url": image_url, # Passa a URL diretamente
-                                },
-                            },
-                        ],
-                    }
-                ],
-                max_tokens=500,
-            )
+            async with stage("vision_analysis"):
+                provider, analysis_content = await provider_router.run(
+                    "vision", self._vision_candidates(image_url, prompt, model)
+                )
             
             end_time = time.time()
             duration = end_time - start_time
             
-            analysis_content = chat_completion.choices[0].message.content
-            print(f"✅ [VISION] Análise recebida em {duration:.2f} segundos.")
+            logger.info(f"✅ [VISION] Análise recebida de '{provider}' em {duration:.2f} segundos.")
             
             return {
                 "success": True,
                 "analysis": analysis_content,
                 "model_used": model,
+                "provider_used": provider,
             }
+        except ProviderUnavailable:
+            raise
         except Exception as e:
-            print(f"❌ [VISION] Falha na chamada da API para o modelo '{model}': {e}")
+            logger.error(f"❌ [VISION] Falha na chamada da API para o modelo '{model}': {e}")
             return {"success": False, "error": f"API call failed: {e}"}
 
-# --- CONFIGURAÇÃO DA API FASTAPI ---
-app = FastAPI(title="Unified API - Jerseys + Stadiums", version="1.0.0")
-
-# CORS
-origins = [
-    "http://localhost",
-    "http://localhost:3000", 
-    "https://localhost:3000",
-    "https://jersey-generator-ai2-git-master-jeffnight15s-projects.vercel.app",
-    "https://jersey-generator-ai2.vercel.app",
-    "https://*.vercel.app",
-    "https://*.netlify.app",
-    "https://*.railway.app",
-    "https://*.render.com"
-]
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"]
-)
+    def _vision_candidates(self, image_url: str, prompt: str, model: str) -> Dict[str, Any]:
+        """OpenRouter sempre; OpenAI direto também (modelos openai/*) quando o roteamento é automático"""
+        candidates = {"openrouter": lambda: self._vision_call("openrouter", image_url, prompt, model)}
+        if VISION_ROUTING_MODE == "auto" and OPENAI_API_KEY and model.startswith("openai/"):
+            if not OPENROUTER_API_KEY:
+                # Sem chave OpenRouter o cliente usaria a chave OpenAI no OpenRouter: vai direto
+                candidates.clear()
+            candidates["openai"] = lambda: self._vision_call("openai", image_url, prompt, model.split("/", 1)[1])
+        return candidates
+
+    async def _vision_call(self, provider: str, image_url: str, prompt: str, model: str) -> str:
+        client = get_openrouter_client() if provider == "openrouter" else get_openai_client()
+        # Análise não tem efeito colateral: pode ser repetida em 5xx/timeout
+        chat_completion = await provider_gateway.call(provider, lambda: client.chat.completions.create(
+            model=model,
+            messages=[
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {
+                        "type": "image_url",
+                            "image_url": {
+                                "url": image_url, # Passa a URL diretamente
+                            },
+                        },
+                    ],
+                }
+            ],
+            max_tokens=500,
+        ), idempotent=True)
+        return chat_completion.choices[0].message.content
+
+# --- ROUTER DO SUBSISTEMA "core" (server.py monta o processo único) ---
+router = APIRouter()
 
-# Inicializar geradores
-jersey_generator = JerseyGenerator()
-stadium_generator = StadiumReferenceGenerator()
+# Geradores criados no primeiro uso (a chave OpenAI e o watcher de estádios só quando chamados)
+jersey_generator = Lazy("core.jersey_generator", JerseyGenerator)
+stadium_generator = Lazy("core.stadium_generator", StadiumReferenceGenerator)
 vision_analysis_system = VisionAnalysisSystem()
 
 # Incluir router de geração de imagens
-app.include_router(generate_image_router, prefix="/api", tags=["image-generation"])
+router.include_router(generate_image_router, prefix="/api", tags=["image-generation"])
+
+# Imagens geradas servidas pelo blob store (Range, ETag, cache imutável)
+router.include_router(blob_router)
+
+generation_cache = GeneratedImageCache(blob_store)
+
+async def generate_jersey_base(prompt: str, quality: str) -> bytes:
+    """Base em branco do modo local: uma geração DALL-E por time/estilo"""
+    generation = await generate_dalle3_image(prompt=prompt, size=JerseyGenerator.image_size, quality=quality)
+    return ensure_format(await download_image(generation["url"]), "PNG")
+
+jersey_compositor = JerseyCompositor(generate_base=generate_jersey_base)
+
+# db ainda é None aqui: SQLite até o Mongo conectar (on_mongo_ready troca se OUTBOX_BACKEND=mongo)
+post_processing = PostProcessingPipeline(
+    store=create_outbox_store(db),
+    get_db=lambda: db,
+    http_client_factory=lambda: get_http_client("pinata"),
+)
 
 # --- ENDPOINTS PRINCIPAIS ---
-@app.get("/")
+@router.get("/")
 async def root():
     return {
         "status": "online", 
@@ -940,85 +1060,116 @@ async def root():
     }
 
 # --- ENDPOINTS DE JERSEYS ---
-@app.post("/generate", response_model=GenerationResponse)
+async def generate_with_result_cache(request: ImageGenerationRequest) -> Tuple[bytes, bool]:
+    """Imagem do /generate pelo cache de resultados quando ligado; retorna (bytes, cache_hit)"""
+    generator = jersey_generator.get()
+    prompt = generator.build_prompt(request)
+    parts = (prompt, DALLE_MODEL, generator.image_size, request.quality)
+
+    if generation_cache.reads(request.cache):
+        cached = await generation_cache.get(*parts)
+        if cached is not None:
+            logger.info("⚡ [GENERATION CACHE] Imagem servida do cache de resultados.")
+            return cached, True
+    if not generation_cache.writes(request.cache):
+        return await generator.generate_image(request, prompt), False
+
+    async def generate_and_store() -> bytes:
+        image_bytes = await generator.generate_image(request, prompt)
+        await generation_cache.put(*parts, image_bytes)
+        return image_bytes
+
+    # Clique duplo: pedidos iguais em andamento esperam a mesma chamada ao DALL-E
+    return await single_flight.do("generate", generation_cache_key(*parts), generate_and_store), False
+
+@router.post("/generate", response_model=GenerationResponse)
 async def generate_jersey_endpoint(request: ImageGenerationRequest):
     try:
-        image_base64 = jersey_generator.generate_image(request)
+        if (request.render_mode or JERSEY_RENDER_MODE) == "local":
+            image_bytes, base_generated = await jersey_generator.get().compose_locally(request)
+            return GenerationResponse(
+                success=True,
+                **await build_image_payload(image_bytes, request.response_mode),
+                cost_usd=0.045 if base_generated else 0.0
+            )
+        image_bytes, cache_hit = await generate_with_result_cache(request)
         return GenerationResponse(
             success=True,
-            image_base64=image_base64,
-            cost_usd=0.045
+            **await build_image_payload(image_bytes, request.response_mode),
+            cost_usd=0.0 if cache_hit else 0.045,
+            cache_hit=cache_hit
         )
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"ERROR: {e}")
+        logger.error(f"ERROR: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/generate-vision-enhanced", response_model=GenerationResponse)
+@router.post("/generate-vision-enhanced", response_model=GenerationResponse)
 async def generate_vision_enhanced_jersey(request: VisionEnhancedGenerationRequest):
     """Endpoint para geração de jersey usando análise Vision otimizada"""
     try:
-        print(f"🎨 [VISION ENHANCED] Starting generation with analysis")
+        logger.info(f"🎨 [VISION ENHANCED] Starting generation with analysis")
         
         if not request.vision_analysis:
             raise HTTPException(status_code=400, detail="vision_analysis é obrigatório para modo vision_enhanced")
         
+        if (request.render_mode or JERSEY_RENDER_MODE) == "local":
+            with stage("prompt_composition"):
+                base_prompt = generate_dalle_prompt_from_analysis(
+                    request.vision_analysis, request.player_name, request.player_number, blank_back=True
+                )
+            image_bytes, base_generated = await jersey_compositor.compose(
+                base_key("vision", base_prompt, request.quality),
+                base_prompt,
+                request.quality,
+                request.player_name,
+                request.player_number,
+                style_from_analysis(request.vision_analysis),
+            )
+            logger.info(f"✅ [VISION ENHANCED] Nome/número compostos localmente (base gerada agora: {base_generated})")
+            return GenerationResponse(
+                success=True,
+                **await build_image_payload(image_bytes, request.response_mode),
+                cost_usd=0.045 if base_generated else 0.0
+            )
+        
         # ✅ Usar nova função otimizada para gerar prompt
-        optimized_prompt = generate_dalle_prompt_from_analysis(
-            request.vision_analysis,
-            request.player_name,
-            request.player_number
-        )
+        with stage("prompt_composition"):
+            optimized_prompt = generate_dalle_prompt_from_analysis(
+                request.vision_analysis,
+                request.player_name,
+                request.player_number
+            )
         
-        print(f"🎨 [VISION ENHANCED] Generated optimized prompt: {len(optimized_prompt)} chars")
-        print(f"🎨 [VISION ENHANCED] Prompt preview: {optimized_prompt[:200]}...")
+        logger.info(f"🎨 [VISION ENHANCED] Generated optimized prompt: {len(optimized_prompt)} chars")
+        log_payload(logger, "🎨 [VISION ENHANCED] Prompt otimizado", optimized_prompt)
         
         # Gerar usando DALL-E 3 com prompt otimizado
-        openai_client = OpenAI(api_key=OPENAI_API_KEY)
-        
-        generation_response = openai_client.images.generate(
-            model="dall-e-3",
+        generation = await generate_dalle3_image(
             prompt=optimized_prompt,
             size="1024x1024",
-            quality=request.quality,
-            n=1
+            quality=request.quality
         )
         
-        image_url = generation_response.data[0].url
-        img_response = requests.get(image_url, timeout=60)
+        image_bytes = ensure_format(await download_image(generation["url"]), "PNG")
         
-        if img_response.status_code == 200:
-            image = Image.open(BytesIO(img_response.content))
-            buffered = BytesIO()
-            image.save(buffered, format="PNG")
-            image_base64 = base64.b64encode(buffered.getvalue()).decode()
-            
-            print(f"✅ [VISION ENHANCED] Generation successful")
-            
-            return GenerationResponse(
-                success=True,
-                image_base64=image_base64,
-                cost_usd=0.045
-            )
-        else:
-            raise Exception(f"Erro ao baixar imagem do DALL-E 3: {img_response.status_code}")
+        logger.info(f"✅ [VISION ENHANCED] Generation successful")
+        
+        return GenerationResponse(
+            success=True,
+            **await build_image_payload(image_bytes, request.response_mode),
+            cost_usd=0.045
+        )
             
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ [VISION ENHANCED] Generation error: {str(e)}")
+        logger.error(f"❌ [VISION ENHANCED] Generation error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/complete-vision-flow", response_model=GenerationResponse)
-async def complete_vision_flow(request: CompleteVisionFlowRequest):
-    """
-    Endpoint completo: Análise Vision + Geração de Prompt + DALL-E 3
-    Faz todo o fluxo em uma única chamada
-    """
-    try:
-        print(f"🔄 [COMPLETE FLOW] Starting complete vision flow")
-        print(f"🔄 [COMPLETE FLOW] Player: {request.player_name} #{request.player_number}")
-        print(f"🔄 [COMPLETE FLOW] Sport: {request.sport}, View: {request.view}")
-        
-        # Usar prompt de análise descritivo e flexível
-        analysis_prompt = f"""
+# Prompt de análise descritivo e flexível usado pelo fluxo completo
+COMPLETE_FLOW_ANALYSIS_PROMPT = """
 Você é um especialista em design de camisas de futebol. Observe a imagem da jersey cuidadosamente e descreva em detalhes todos os elementos visuais e estilísticos presentes na parte de trás da camisa.
 
 Inclua:
@@ -1031,45 +1182,67 @@ Inclua:
 Seja técnico, descritivo e preciso. Não invente, apenas descreva o que está visivelmente presente.
 A resposta deve ser clara e separada por tópicos, sem formato de JSON.
 """
-        print(f"✅ [COMPLETE FLOW] Using flexible descriptive analysis prompt")
-        
-        # ETAPA 1: Análise Vision
-        print(f"🔍 [COMPLETE FLOW] Step 1: Vision Analysis")
-        vision_result = await vision_analysis_system.analyze_image_with_vision(
-            request.image_base64,
-            analysis_prompt,
-            request.model
-        )
-        
-        if not vision_result["success"]:
-            raise Exception(f"Vision analysis failed: {vision_result.get('error')}")
-        
-        analysis_text = vision_result["analysis"]
-        print(f"✅ [COMPLETE FLOW] Analysis completed: {type(analysis_text)}")
-        print(f"📝 [COMPLETE FLOW] Analysis preview: {str(analysis_text)[:200]}...")
-        
-        # A análise agora é texto descritivo, não JSON
-        if not analysis_text or len(str(analysis_text).strip()) < 50:
-            print(f"⚠️ [COMPLETE FLOW] Analysis too short, using fallback")
-            analysis_text = f"Professional {request.sport} jersey with modern design, featuring team colors and standard athletic fit. Clean back view with space for player name and number placement."
-        
-        # ETAPA 2: Geração de Prompt Otimizado usando NOVA COMPOSIÇÃO
-        print(f"🎨 [COMPLETE FLOW] Step 2: Generate optimized prompt using NEW COMPOSITION with sport-specific base prompts")
-        
-        # Validar e limpar dados do jogador
-        player_name_clean = (request.player_name or "").strip()
-        player_number_clean = (request.player_number or "").strip()
-        
-        # Usar valores padrão se vazios
-        if not player_name_clean:
-            player_name_clean = "PLAYER"
-        if not player_number_clean:
-            player_number_clean = "00"
-            
-        print(f"👤 [COMPLETE FLOW] Player data: name='{player_name_clean}', number='{player_number_clean}'")
-        print(f"🏃‍♂️ [COMPLETE FLOW] Using NEW COMPOSITION: sport={request.sport}, view={request.view}")
+
+async def run_complete_vision_flow(request: CompleteVisionFlowRequest):
+    """
+    Executa Análise Vision → Prompt → DALL-E 3 → Download como gerador assíncrono.
+    Emite (etapa, dados) assim que cada etapa termina, com o tempo da etapa e o tempo total em ms.
+    """
+    flow_start = time.perf_counter()
+    stage_start = flow_start
+    timings = {}
+
+    def stage_event(stage: str, **data) -> Tuple[str, Dict[str, Any]]:
+        nonlocal stage_start
+        now = time.perf_counter()
+        timings[stage] = round((now - stage_start) * 1000, 1)
+        stage_start = now
+        return stage, {**data, "stage_ms": timings[stage], "elapsed_ms": round((now - flow_start) * 1000, 1)}
+
+    logger.info(f"🔄 [COMPLETE FLOW] Starting complete vision flow")
+    logger.info(f"🔄 [COMPLETE FLOW] Player: {request.player_name} #{request.player_number}")
+    logger.info(f"🔄 [COMPLETE FLOW] Sport: {request.sport}, View: {request.view}")
+    
+    # ETAPA 1: Análise Vision
+    logger.info(f"🔍 [COMPLETE FLOW] Step 1: Vision Analysis")
+    vision_result = await vision_analysis_system.analyze_image_with_vision(
+        request.image_base64,
+        COMPLETE_FLOW_ANALYSIS_PROMPT,
+        request.model
+    )
+    
+    if not vision_result["success"]:
+        raise Exception(f"Vision analysis failed: {vision_result.get('error')}")
+    
+    analysis_text = vision_result["analysis"]
+    logger.info(f"✅ [COMPLETE FLOW] Analysis completed: {type(analysis_text)}")
+    log_payload(logger, "📝 [COMPLETE FLOW] Análise Vision", analysis_text)
+    
+    # A análise agora é texto descritivo, não JSON
+    if not analysis_text or len(str(analysis_text).strip()) < 50:
+        logger.warning(f"⚠️ [COMPLETE FLOW] Analysis too short, using fallback")
+        analysis_text = f"Professional {request.sport} jersey with modern design, featuring team colors and standard athletic fit. Clean back view with space for player name and number placement."
+    
+    yield stage_event("analysis", analysis=analysis_text)
+    
+    # ETAPA 2: Geração de Prompt Otimizado usando NOVA COMPOSIÇÃO
+    logger.info(f"🎨 [COMPLETE FLOW] Step 2: Generate optimized prompt using NEW COMPOSITION with sport-specific base prompts")
+    
+    # Validar e limpar dados do jogador
+    player_name_clean = (request.player_name or "").strip()
+    player_number_clean = (request.player_number or "").strip()
+    
+    # Usar valores padrão se vazios
+    if not player_name_clean:
+        player_name_clean = "PLAYER"
+    if not player_number_clean:
+        player_number_clean = "00"
         
-        # USAR NOVA FUNÇÃO DE COMPOSIÇÃO COM PROMPTS BASE ESPECÍFICOS
+    logger.info(f"👤 [COMPLETE FLOW] Player data: name='{player_name_clean}', number='{player_number_clean}'")
+    logger.info(f"🏃‍♂️ [COMPLETE FLOW] Using NEW COMPOSITION: sport={request.sport}, view={request.view}")
+    
+    # USAR NOVA FUNÇÃO DE COMPOSIÇÃO COM PROMPTS BASE ESPECÍFICOS
+    with stage("prompt_composition"):
         optimized_prompt = compose_vision_enhanced_prompt(
             sport=request.sport,
             view=request.view,
@@ -1078,52 +1251,88 @@ A resposta deve ser clara e separada por tópicos, sem formato de JSON.
             analysis_text=analysis_text,
             style="classic"
         )
+    
+    logger.info(f"✅ [COMPLETE FLOW] Prompt generated: {len(optimized_prompt)} chars")
+    yield stage_event(
+        "prompt",
+        prompt=optimized_prompt,
+        player_name_used=player_name_clean,
+        player_number_used=player_number_clean
+    )
+    
+    # ETAPA 3: Geração de Imagem
+    logger.info(f"🖼️ [COMPLETE FLOW] Step 3: Generate image with DALL-E 3")
+    generation = await generate_dalle3_image(
+        prompt=optimized_prompt,
+        size="1024x1024",
+        quality=request.quality
+    )
+    
+    image_url = generation["url"]
+    yield stage_event("image_url", image_url=image_url)
+    
+    # ETAPA 4: Download + blob store (o DALL-E já entrega PNG: sem decodificar/recodificar)
+    image_bytes = ensure_format(await download_image(image_url), "PNG")
+    yield stage_event("image", **await build_image_payload(image_bytes, request.response_mode))
+    
+    logger.info(f"✅ [COMPLETE FLOW] Complete flow successful!")
+    yield "complete", {
+        "success": True,
+        "cost_usd": 0.08 if request.quality == "hd" else 0.04,
+        "timings_ms": timings,
+        "elapsed_ms": round((time.perf_counter() - flow_start) * 1000, 1)
+    }
+
+@router.post("/complete-vision-flow", response_model=GenerationResponse)
+async def complete_vision_flow(request: CompleteVisionFlowRequest):
+    """
+    Endpoint completo: Análise Vision + Geração de Prompt + DALL-E 3
+    Faz todo o fluxo em uma única chamada
+    """
+    try:
+        result = {}
+        async for stage, data in run_complete_vision_flow(request):
+            result.update(data)
         
-        print(f"✅ [COMPLETE FLOW] Prompt generated: {len(optimized_prompt)} chars")
-        
-        # ETAPA 3: Geração de Imagem
-        print(f"🖼️ [COMPLETE FLOW] Step 3: Generate image with DALL-E 3")
-        openai_client = OpenAI(api_key=OPENAI_API_KEY)
-        
-        generation_response = openai_client.images.generate(
-            model="dall-e-3",
-            prompt=optimized_prompt,
-            size="1024x1024",
-            quality=request.quality,
-            n=1
-        )
-        
-        image_url = generation_response.data[0].url
-        img_response = requests.get(image_url, timeout=60)
-        
-        if img_response.status_code == 200:
-            image = Image.open(BytesIO(img_response.content))
-            buffered = BytesIO()
-            image.save(buffered, format="PNG")
-            image_base64 = base64.b64encode(buffered.getvalue()).decode()
-            
-            print(f"✅ [COMPLETE FLOW] Complete flow successful!")
-            
-            return {
-                "success": True,
-                "image_url": image_url,
-                "image_base64": image_base64,
-                "analysis": analysis_text,
-                "prompt": optimized_prompt,
-                "cost_usd": 0.08 if request.quality == "hd" else 0.04,
-                "player_name_used": player_name_clean,
-                "player_number_used": player_number_clean
-            }
-        else:
-            raise Exception(f"Erro ao baixar imagem do DALL-E 3: {img_response.status_code}")
+        return {
+            "success": True,
+            "image_url": result["image_url"],
+            "image_base64": result["image_base64"],
+            "analysis": result["analysis"],
+            "prompt": result["prompt"],
+            "cost_usd": result["cost_usd"],
+            "player_name_used": result["player_name_used"],
+            "player_number_used": result["player_number_used"]
+        }
             
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ [COMPLETE FLOW] Complete flow error: {str(e)}")
+        logger.error(f"❌ [COMPLETE FLOW] Complete flow error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/teams")
-async def get_available_teams():
-    """Lista times disponíveis para jerseys"""
+@router.post("/complete-vision-flow/stream")
+async def complete_vision_flow_stream(request: CompleteVisionFlowRequest):
+    """
+    Variante em Server-Sent Events do fluxo completo.
+    Eventos: analysis → prompt → image_url → image → complete (ou error), cada um com stage_ms/elapsed_ms.
+    """
+    async def event_stream():
+        try:
+            async for stage, data in run_complete_vision_flow(request):
+                yield f"event: {stage}\ndata: {json.dumps(data)}\n\n"
+        except Exception as e:
+            logger.error(f"❌ [COMPLETE FLOW] Stream error: {str(e)}")
+            yield f"event: error\ndata: {json.dumps({'success': False, 'error': str(e)})}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def load_teams() -> Any:
+    """Times disponíveis para jerseys (pastas em image_references/)"""
     image_dir = Path("image_references")
     if not image_dir.is_dir():
         return {"error": "Image references directory not found."}
@@ -1136,34 +1345,18 @@ async def get_available_teams():
     
     return sorted(teams)
 
-@app.get("/badges", response_model=List[BadgeInfo])
-async def list_badges_from_db():
-    """Lists available badges for reference generation from MongoDB."""
-    print("\n--- [DEBUG] Rota GET /badges foi chamada ---")
-    if db is None:
-        print("[DEBUG] ERRO: Conexão com o banco de dados é nula.")
-        raise HTTPException(status_code=500, detail="Database connection is not available.")
-    
+def teams_source_version() -> float:
+    """O mtime da pasta muda quando um time é adicionado ou removido"""
+    image_dir = Path("image_references")
+    return image_dir.stat().st_mtime if image_dir.is_dir() else 0.0
+
+async def load_badges() -> List[Dict[str, Any]]:
+    """Emblemas de referência do MongoDB"""
+    logger.info("🔄 [CATALOG] Montando a listagem de emblemas a partir do MongoDB...")
     badges = []
     try:
-        collection_name = "badge_references"
-        print(f"[DEBUG] Acessando a coleção: '{collection_name}'")
-        collection = db[collection_name]
-        
-        count = collection.count_documents({})
-        print(f"[DEBUG] Documentos encontrados na coleção: {count}")
-        
-        if count == 0:
-            print("[DEBUG] Nenhum documento encontrado. Retornando lista vazia.")
-            return []
-            
-        cursor = collection.find({}, {"name": 1, "badgeId": 1, "referenceImages": 1})
-        
-        # Log do primeiro documento para verificar a estrutura
-        first_doc = db[collection_name].find_one({}, {"name": 1, "badgeId": 1, "referenceImages": 1})
-        print(f"[DEBUG] Estrutura do primeiro documento encontrado: {first_doc}")
-
-        for doc in cursor:
+        docs = await reference_repo.list("badge_references", {"name": 1, "badgeId": 1, "referenceImages": 1})
+        for doc in docs:
             preview_image = None
             if doc.get("referenceImages") and len(doc["referenceImages"]) > 0:
                 preview_image = doc["referenceImages"][0].get("url")
@@ -1172,41 +1365,20 @@ async def list_badges_from_db():
                 id=doc.get("badgeId"),
                 name=doc.get("name"),
                 previewImage=preview_image
-            ))
-        print(f"✅ [DB] Sucesso! {len(badges)} emblemas de referência processados.")
+            ).dict())
+        logger.info(f"✅ [DB] Sucesso! {len(badges)} emblemas de referência processados.")
         return badges
     except Exception as e:
-        print(f"❌ [DB] CRÍTICO: Falha ao buscar emblemas no MongoDB: {e}")
+        logger.error(f"❌ [DB] CRÍTICO: Falha ao buscar emblemas no MongoDB: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch badges from database: {e}")
 
-# --- ENDPOINTS DE STADIUMS ---
-@app.get("/stadiums", response_model=List[StadiumInfo])
-async def list_stadiums_from_db():
-    """Lista estádios disponíveis para geração por referência a partir do MongoDB."""
-    print("\n--- [DEBUG] Rota GET /stadiums foi chamada ---")
-    if db is None:
-        print("[DEBUG] ERRO: Conexão com o banco de dados é nula.")
-        raise HTTPException(status_code=500, detail="Database connection is not available.")
-    
+async def load_stadiums() -> List[Dict[str, Any]]:
+    """Estádios de referência do MongoDB"""
+    logger.info("🔄 [CATALOG] Montando a listagem de estádios a partir do MongoDB...")
     stadiums = []
     try:
-        collection_name = "stadium_references"
-        print(f"[DEBUG] Acessando a coleção: '{collection_name}'")
-        collection = db[collection_name]
-
-        count = collection.count_documents({})
-        print(f"[DEBUG] Documentos encontrados na coleção: {count}")
-
-        if count == 0:
-            print("[DEBUG] Nenhum documento encontrado. Retornando lista vazia.")
-            return []
-
-        # Log do primeiro documento para verificar a estrutura
-        first_doc = db[collection_name].find_one({}, {"name": 1, "stadiumId": 1, "referenceImages": 1})
-        print(f"[DEBUG] Estrutura do primeiro documento encontrado: {first_doc}")
-
-        cursor = collection.find({}, {"name": 1, "stadiumId": 1, "referenceImages": 1})
-        for doc in cursor:
+        docs = await reference_repo.list("stadium_references", {"name": 1, "stadiumId": 1, "referenceImages": 1})
+        for doc in docs:
             preview_image = None
             if doc.get("referenceImages") and len(doc["referenceImages"]) > 0:
                 preview_image = doc["referenceImages"][0].get("url")
@@ -1215,37 +1387,78 @@ async def list_stadiums_from_db():
                 id=doc.get("stadiumId"),
                 name=doc.get("name"),
                 previewImage=preview_image
-            ))
-        print(f"✅ [DB] Sucesso! {len(stadiums)} estádios de referência processados.")
+            ).dict())
+        logger.info(f"✅ [DB] Sucesso! {len(stadiums)} estádios de referência processados.")
         return stadiums
     except Exception as e:
-        print(f"❌ [DB] CRÍTICO: Falha ao buscar estádios no MongoDB: {e}")
+        logger.error(f"❌ [DB] CRÍTICO: Falha ao buscar estádios no MongoDB: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch stadiums from database: {e}")
 
-@app.post("/generate-from-reference", response_model=StadiumResponse)
+reference_catalog = ReferenceCatalog()
+reference_catalog.register("teams", load_teams, source_version=teams_source_version)
+reference_catalog.register("badges", load_badges, collection="badge_references")
+reference_catalog.register("stadiums", load_stadiums, collection="stadium_references")
+
+# Hit ratio dos caches em /metrics
+register_cache("vision_analysis", vision_cache.stats)
+register_cache("reference_catalog", reference_catalog.stats)
+register_cache("stadium_reference_encodings", stadium_reference_store.stats)
+register_cache("generated_images", generation_cache.stats)
+register_cache("jersey_bases", jersey_compositor.stats)
+
+@router.get("/teams")
+async def get_available_teams(request: Request):
+    """Lista times disponíveis para jerseys"""
+    return await reference_catalog.response("teams", request)
+
+@router.get("/badges", response_model=List[BadgeInfo])
+async def list_badges_from_db(request: Request):
+    """Lists available badges for reference generation from MongoDB."""
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database connection is not available.")
+    return await reference_catalog.response("badges", request)
+
+# --- ENDPOINTS DE STADIUMS ---
+@router.get("/stadiums", response_model=List[StadiumInfo])
+async def list_stadiums_from_db(request: Request):
+    """Lista estádios disponíveis para geração por referência a partir do MongoDB."""
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database connection is not available.")
+    return await reference_catalog.response("stadiums", request)
+
+@router.get("/catalog/stats")
+async def reference_catalog_stats():
+    """Hits/misses/304 do catálogo de referências"""
+    return reference_catalog.stats()
+
+@router.post("/generate-from-reference", response_model=StadiumResponse)
 async def generate_stadium_from_reference(request: StadiumReferenceRequest):
     """Gera estádio baseado em referência local"""
     try:
-        result = stadium_generator.generate_from_reference(request)
+        result = await stadium_generator.get().generate_from_reference(request)
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/generate-custom", response_model=StadiumResponse)
+@router.post("/generate-custom", response_model=StadiumResponse)
 async def generate_custom_stadium(request: CustomStadiumRequest):
     """Gera estádio customizado"""
     try:
-        result = stadium_generator.generate_custom(request)
+        result = await stadium_generator.get().generate_custom(request)
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # --- VISION ANALYSIS ENDPOINT ---
-@app.post("/analyze-image", response_model=VisionAnalysisResponse)
+@router.post("/analyze-image", response_model=VisionAnalysisResponse)
 async def analyze_image_endpoint(request: VisionAnalysisRequest):
     """Endpoint para análise de imagem - unificado na API principal"""
     try:
-        print(f"🔍 [VISION ANALYSIS] Received request: model={request.model}, prompt_length={len(request.prompt)}")
+        logger.info(f"🔍 [VISION ANALYSIS] Received request: model={request.model}, prompt_length={len(request.prompt)}")
         
         result = await vision_analysis_system.analyze_image_with_vision(
             request.image_base64,
@@ -1254,7 +1467,7 @@ async def analyze_image_endpoint(request: VisionAnalysisRequest):
         )
         
         if result["success"]:
-            print(f"✅ [VISION ANALYSIS] Analysis completed successfully")
+            logger.info(f"✅ [VISION ANALYSIS] Analysis completed successfully")
             return VisionAnalysisResponse(
                 success=True,
                 analysis=result["analysis"],
@@ -1262,76 +1475,131 @@ async def analyze_image_endpoint(request: VisionAnalysisRequest):
                 cost_estimate=result.get("cost_estimate", 0)
             )
         else:
-            print(f"❌ [VISION ANALYSIS] Analysis failed: {result.get('error')}")
+            logger.error(f"❌ [VISION ANALYSIS] Analysis failed: {result.get('error')}")
             return VisionAnalysisResponse(
                 success=False,
                 error=result.get("error", "Vision analysis failed")
             )
             
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ [VISION ANALYSIS] Endpoint error: {str(e)}")
+        logger.error(f"❌ [VISION ANALYSIS] Endpoint error: {str(e)}")
         return VisionAnalysisResponse(
             success=False,
             error=str(e)
         )
 
 # --- HEALTH CHECK ---
-@app.get("/health")
+@router.get("/health")
 async def health_check():
     return {"status": "ok", "timestamp": datetime.now()}
 
-@app.get("/test-connection")
+@router.get("/assets/{asset_id}")
+async def get_asset_post_processing(asset_id: str):
+    """Estado do pós-processamento de um asset gerado (pending, uploaded, pinned, completed, failed)"""
+    entry = post_processing.get(asset_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return {
+        "asset_id": entry["id"],
+        "kind": entry["kind"],
+        "status": entry["status"],
+        "cloudinary_url": entry["cloudinary_url"],
+        "ipfs_url": entry["ipfs_url"],
+        "attempts": entry["attempts"],
+        "error": entry["error"],
+        "created_at": entry["created_at"],
+        "updated_at": entry["updated_at"],
+    }
+
+@router.get("/vision-cache/stats")
+async def vision_cache_stats():
+    """Contadores de hit/miss do cache de análises Vision"""
+    return vision_cache.stats()
+
+@router.get("/single-flight/stats")
+async def single_flight_stats():
+    """Chamadas idênticas em andamento que foram coalescidas (por tipo de chamada)"""
+    return single_flight.stats()
+
+@router.get("/stadium-references/stats")
+async def stadium_reference_stats():
+    """Manifesto local de referências de estádio e cache dos encodings para Vision"""
+    return stadium_reference_store.stats()
+
+@router.get("/cache/stats")
+async def cache_backend_stats():
+    """Backend de cache em uso (CACHE_BACKEND), hits/misses por namespace e o cache de imagens geradas"""
+    return {**cache_stats(), "generated_images": generation_cache.stats(), "jersey_bases": jersey_compositor.stats()}
+
+@router.get("/providers/metrics")
+async def provider_metrics():
+    """Estado dos pools de conexão por provedor (conexões, ociosas, requisições)"""
+    return get_registry().metrics()
+
+@router.get("/providers/gateway")
+async def provider_gateway_diagnostics():
+    """Estado do gateway: circuit breakers, token buckets por chave, retries e 429 recebidos"""
+    return provider_gateway.stats()
+
+@router.get("/providers/routing")
+async def provider_routing_stats():
+    """Latências (p50/p95), taxa de erro e contadores de hedge/failover por provedor"""
+    return provider_router.stats()
+
+@router.get("/test-connection")
 async def test_connection():
     """Endpoint de teste para verificar a conexão do servidor."""
-    print("✅ /test-connection endpoint foi acessado com sucesso!")
+    logger.info("✅ /test-connection endpoint foi acessado com sucesso!")
     return {"message": "Conexão com o servidor Python (main.py) bem-sucedida!"}
 
-@app.post("/generate-jersey-from-reference", response_model=ReferenceGenerationResponse)
-async def generate_jersey_from_reference(request: GenerateFromReferenceRequest):
+async def resolve_jersey_reference(team_name: str) -> str:
     """
-    Gera uma camisa usando uma referência de time do banco de dados.
-    Busca o `teamBasePrompt` e as `referenceImages` do MongoDB.
+    Busca a referência do time no MongoDB e analisa a imagem de referência com Vision.
+    Retorna o texto descritivo final (prompt base do time + análise) usado no molde do prompt.
+    Chamadas simultâneas para o mesmo time compartilham a mesma busca + análise.
     """
-    print(f"✅ [DB] Rota /generate-jersey-from-reference chamada para o time: '{request.teamName}'")
-
-    if db is None:
-        print("❌ [DB] ERRO: Conexão com o banco de dados não disponível.")
-        raise HTTPException(status_code=500, detail="Database connection is not available.")
+    return await single_flight.do(
+        "jersey_reference", flight_key(team_name), lambda: _resolve_jersey_reference(team_name)
+    )
 
-    try:
-        query_name = request.teamName.strip()
-        print(f"🔍 [DB] Buscando referência para '{query_name}' na coleção 'team_references'...")
-        
-        team_reference = db.team_references.find_one({"teamName": {"$regex": f"^{query_name}$", "$options": "i"}})
+async def _resolve_jersey_reference(team_name: str) -> str:
+    query_name = team_name.strip()
+    report_stage("db_lookup")
+    logger.info(f"🔍 [DB] Buscando referência para '{query_name}' na coleção 'team_references'...")
+    
+    team_reference = await reference_repo.find("team_references", query_name)
 
-        if not team_reference:
-            print(f"❌ [DB] ERRO: Time '{query_name}' não foi encontrado na coleção 'team_references' (busca case-insensitive).")
-            raise HTTPException(status_code=404, detail=f"Team '{query_name}' not found in database.")
+    if not team_reference:
+        logger.error(f"❌ [DB] ERRO: Time '{query_name}' não foi encontrado na coleção 'team_references' (busca case-insensitive).")
+        raise HTTPException(status_code=404, detail=f"Team '{query_name}' not found in database.")
 
-        print(f"✅ [DB] Referência encontrada para '{query_name}'.")
-        
-        metadata = team_reference.get("metadata", {})
-        team_base_prompt = metadata.get("teamBasePrompt", "")
-        
-        if not team_base_prompt:
-            print(f"⚠️ [DB] Alerta: `teamBasePrompt` está vazio ou ausente para o time '{query_name}'.")
-
-        # --- INÍCIO DA LÓGICA DA FASE 2 ---
-        reference_images = team_reference.get("referenceImages", [])
-        image_url_to_analyze = None
-        if reference_images and isinstance(reference_images, list) and len(reference_images) > 0:
-            image_url_to_analyze = reference_images[0].get("url")
-        
-        if not image_url_to_analyze:
-            print("❌ [VISION] ERRO: Nenhuma URL de imagem de referência encontrada. Abortando análise Vision.")
-            raise HTTPException(status_code=400, detail="Reference image URL is missing.")
+    logger.info(f"✅ [DB] Referência encontrada para '{query_name}'.")
+    
+    metadata = team_reference.get("metadata", {})
+    team_base_prompt = metadata.get("teamBasePrompt", "")
+    
+    if not team_base_prompt:
+        logger.warning(f"⚠️ [DB] Alerta: `teamBasePrompt` está vazio ou ausente para o time '{query_name}'.")
+
+    # --- INÍCIO DA LÓGICA DA FASE 2 ---
+    reference_images = team_reference.get("referenceImages", [])
+    image_url_to_analyze = None
+    if reference_images and isinstance(reference_images, list) and len(reference_images) > 0:
+        image_url_to_analyze = reference_images[0].get("url")
+    
+    if not image_url_to_analyze:
+        logger.error("❌ [VISION] ERRO: Nenhuma URL de imagem de referência encontrada. Abortando análise Vision.")
+        raise HTTPException(status_code=400, detail="Reference image URL is missing.")
 
-        print(f"🖼️ [VISION] Iniciando análise para a imagem: {image_url_to_analyze}")
-        
-        # 1. Chamar o sistema de análise Vision (agora passando a URL diretamente)
-        vision_analyzer = VisionAnalysisSystem()
-        # CORREÇÃO: Usar prompt de análise detalhado e em português para maior precisão
-        analysis_prompt = """
+    report_stage("vision_analysis")
+    logger.info(f"🖼️ [VISION] Iniciando análise para a imagem: {image_url_to_analyze}")
+    
+    # 1. Chamar o sistema de análise Vision (agora passando a URL diretamente)
+    vision_analyzer = vision_analysis_system
+    # CORREÇÃO: Usar prompt de análise detalhado e em português para maior precisão
+    analysis_prompt = """
 Você é um especialista em design de camisas de futebol. Observe a imagem da jersey cuidadosamente e descreva em detalhes todos os elementos visuais e estilísticos presentes.
 
 Inclua:
@@ -1343,130 +1611,278 @@ Inclua:
 
 Seja extremamente técnico, descritivo e preciso. Não invente detalhes, apenas descreva o que está visivelmente presente na imagem. A resposta deve ser uma descrição técnica para recriação.
 """
-        
-        vision_result = await vision_analyzer.analyze_image_with_vision(
-            image_url=image_url_to_analyze, # Passa a URL
-            prompt=analysis_prompt
-        )
-
-        if not vision_result.get("success"):
-            error_msg = vision_result.get("error", "Unknown vision analysis error.")
-            print(f"❌ [VISION] ERRO na análise: {error_msg}")
-            raise HTTPException(status_code=500, detail=f"Vision analysis failed: {error_msg}")
+    
+    vision_result = await vision_analyzer.analyze_image_with_vision(
+        image_url=image_url_to_analyze, # Passa a URL
+        prompt=analysis_prompt
+    )
 
-        analysis_text = vision_result["analysis"]
-        print(f"✅ [VISION] Análise concluída com sucesso:\n{analysis_text}")
-
-        # ETAPA 2.5: Preparar o texto final para o prompt, combinando o prompt base com a análise
-        final_analysis_text = analysis_text # Começa com a análise da visão
-        if team_base_prompt:
-            print("🔧 [PROMPT] Combinando prompt base do time com a análise da visão...")
-            # Prepara um texto combinado, colocando as regras do time como prioridade
-            final_analysis_text = f"""
+    if not vision_result.get("success"):
+        error_msg = vision_result.get("error", "Unknown vision analysis error.")
+        logger.error(f"❌ [VISION] ERRO na análise: {error_msg}")
+        raise HTTPException(status_code=500, detail=f"Vision analysis failed: {error_msg}")
+
+    analysis_text = vision_result["analysis"]
+    logger.info("✅ [VISION] Análise concluída com sucesso.")
+    log_payload(logger, "📝 [VISION] Análise recebida", analysis_text)
+
+    # ETAPA 2.5: Preparar o texto final para o prompt, combinando o prompt base com a análise
+    final_analysis_text = analysis_text # Começa com a análise da visão
+    if team_base_prompt:
+        logger.info("🔧 [PROMPT] Combinando prompt base do time com a análise da visão...")
+        # Prepara um texto combinado, colocando as regras do time como prioridade
+        final_analysis_text = f"""
 **Primary Design Directive (Must be followed):**
 {team_base_prompt}
 
 **Additional Details from Visual Analysis (Enhancements):**
 {analysis_text}
 """
-            print("✅ [PROMPT] Texto descritivo combinado criado com sucesso.")
-        else:
-            print("⚠️ [PROMPT] Nenhum prompt base encontrado. Usando apenas a análise da visão.")
+        logger.info("✅ [PROMPT] Texto descritivo combinado criado com sucesso.")
+    else:
+        logger.warning("⚠️ [PROMPT] Nenhum prompt base encontrado. Usando apenas a análise da visão.")
+
+    return final_analysis_text
+
+async def render_jersey_from_analysis(request: GenerateFromReferenceRequest, final_analysis_text: str) -> ReferenceGenerationResponse:
+    """
+    Compõe o prompt final, gera com DALL-E 3, baixa a imagem e enfileira o pós-processamento.
+    Compartilhado entre a rota individual e o lote (/batch/generate-jersey-from-reference).
+    No modo local o prompt pede as costas em branco e nome/número são compostos sobre a base do time.
+    """
+    local_render = (request.render_mode or JERSEY_RENDER_MODE) == "local"
 
-        # ETAPA 3: Chamar o molde de prompt padrão com o texto finalizado
-        print("🔧 [PROMPT] Gerando prompt final com o molde padrão e consistente...")
+    # ETAPA 3: Chamar o molde de prompt padrão com o texto finalizado
+    logger.info("🔧 [PROMPT] Gerando prompt final com o molde padrão e consistente...")
+    with stage("prompt_composition"):
         final_prompt = compose_vision_enhanced_prompt(
             analysis_text=final_analysis_text, # Passa o texto já combinado
             player_name=request.player_name,
             player_number=request.player_number,
             sport=request.sport,
             view=request.view,
-            style=request.quality
+            style=request.quality,
+            blank_back_instruction=BLANK_BACK_INSTRUCTION if local_render else None
         )
-        print("✅ [PROMPT] Super-prompt final gerado com sucesso.")
-        # =====================================================================
-        # DEBUG: Imprimir o prompt final para verificação
-        # =====================================================================
-        print("\n" + "="*80)
-        print("🔵 [DEBUG] PROMPT FINAL ENVIADO PARA O DALL-E 3:")
-        print(final_prompt)
-        print("="*80 + "\n")
-        # =====================================================================
-
-        # --- ETAPA FINAL: GERAÇÃO COM DALL-E 3 ---
-        print("🤖 [DALL-E] Iniciando a geração final da imagem...")
-        dalle_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    logger.info("✅ [PROMPT] Super-prompt final gerado com sucesso.")
+    # DEBUG: prompt final enviado ao DALL-E 3 (amostrado, LOG_LEVEL=DEBUG)
+    log_payload(logger, "🔵 [DEBUG] Prompt final enviado para o DALL-E 3", final_prompt)
 
-        try:
-            generation_response = dalle_client.images.generate(
-                model="dall-e-3",
+    # --- ETAPA FINAL: GERAÇÃO COM DALL-E 3 ---
+    report_stage("dalle_generation")
+
+    try:
+        if local_render:
+            # O prompt só depende do time: o lote inteiro compartilha uma base (uma chamada ao DALL-E)
+            image_bytes, base_generated = await jersey_compositor.compose(
+                base_key("reference", request.teamName, final_prompt, request.quality),
+                final_prompt,
+                request.quality,
+                request.player_name or "",
+                request.player_number or "",
+                style_from_analysis(default_fill=analysis_lettering_color(final_analysis_text)),
+            )
+            logger.info(f"✅ [LOCAL] Nome/número compostos sobre a base do time (base gerada agora: {base_generated})")
+        else:
+            logger.info("🤖 [DALL-E] Iniciando a geração final da imagem...")
+            generation = await generate_dalle3_image(
                 prompt=final_prompt,
                 size="1024x1024",
                 quality=request.quality,
-                n=1,
                 response_format="url"
             )
-            
-            generated_image_url = generation_response.data[0].url
-            print(f"✅ [DALL-E] Imagem gerada com sucesso. Baixando para processamento...")
+
+            generated_image_url = generation["url"]
+            logger.info(f"✅ [DALL-E] Imagem gerada com sucesso. Baixando para processamento...")
 
             # Etapa extra para resolver CORS: O backend baixa a imagem e converte
-            image_response = requests.get(generated_image_url)
-            image_response.raise_for_status() # Garante que o download foi bem sucedido
-            
-            image_base64 = base64.b64encode(image_response.content).decode("utf-8")
-            print("✅ [PROCESS] Imagem convertida para base64.")
+            image_bytes = await download_image(generated_image_url)
+        
+        image_payload = await build_image_payload(image_bytes, request.response_mode)
+        logger.info("✅ [PROCESS] Imagem salva no blob store.")
+
+        # --- ETAPA DE UPLOAD E SALVAMENTO NO DB (em background, via outbox) ---
+        report_stage("post_processing")
+        asset_id = await post_processing.enqueue(
+            kind="jersey",
+            image_bytes=image_bytes,
+            collection="jerseys",
+            folder="jerseys_generated",
+            public_id=f"{request.teamName.replace(' ', '_')}_{request.player_name}_{int(time.time())}",
+            document={
+                "name": f"{request.teamName} - {request.player_name} #{request.player_number}",
+                "description": f"AI-generated {request.teamName} jersey for {request.player_name} #{request.player_number}. Style: {request.quality}. Based on Vision analysis.",
+                "teamName": request.teamName,
+                "playerName": request.player_name,
+                "playerNumber": request.player_number,
+                "style": request.quality,
+                "generationType": "vision_reference_local" if local_render else "vision_reference",
+                "promptUsed": final_prompt,
+                # Modelo e tamanho que geraram a imagem (metadado do registro)
+                "modelUsed": "jersey_compositor" if local_render else DALLE_MODEL,
+                "imageSize": "1024x1024",
+                "createdBy": "system_vision_flow"
+            }
+        )
+        logger.info(f"📦 [POST-PROCESS] Upload e salvamento enfileirados (asset {asset_id}).")
 
-            # --- ETAPA DE UPLOAD E SALVAMENTO NO DB ---
-            try:
-                print("📤 [CLOUDINARY] Iniciando upload...")
-                upload_result = cloudinary.uploader.upload(
-                    f"data:image/png;base64,{image_base64}",
-                    folder="jerseys_generated",
-                    public_id=f"{request.teamName.replace(' ', '_')}_{request.player_name}_{int(time.time())}"
-                )
-                cloudinary_url = upload_result.get("secure_url")
-                print(f"✅ [CLOUDINARY] Upload concluído: {cloudinary_url}")
-
-                print("💾 [DB] Salvando a nova camisa na coleção 'jerseys'...")
-                jerseys_collection = db["jerseys"]
-                new_jersey_doc = {
-                    "name": f"{request.teamName} - {request.player_name} #{request.player_number}",
-                    "description": f"AI-generated {request.teamName} jersey for {request.player_name} #{request.player_number}. Style: {request.quality}. Based on Vision analysis.",
-                    "imageUrl": cloudinary_url,
-                    "teamName": request.teamName,
-                    "playerName": request.player_name,
-                    "playerNumber": request.player_number,
-                    "style": request.quality,
-                    "generationType": "vision_reference",
-                    "promptUsed": final_prompt,
-                    "createdAt": datetime.utcnow(),
-                    "createdBy": "system_vision_flow"
-                }
-                jerseys_collection.insert_one(new_jersey_doc)
-                print("✅ [DB] Nova camisa salva com sucesso no MongoDB.")
+        # Retorna a URL do blob (e o base64, se pedido) sem esperar o post-processing
+        return ReferenceGenerationResponse(
+            success=True,
+            **image_payload,
+            prompt=final_prompt,
+            asset_id=asset_id
+        )
 
-            except Exception as post_processing_error:
-                # Opcional: Se o upload ou o salvamento falharem, não quebramos a experiência do usuário.
-                # A imagem ainda é retornada. Apenas registramos o erro no log do servidor.
-                print(f"⚠️ [POST-PROCESS] Alerta: Falha no upload para Cloudinary ou salvamento no DB: {post_processing_error}")
-                print("⚠️ [POST-PROCESS] A imagem gerada ainda será retornada para o usuário.")
+    except HTTPException:
+        raise
+    except Exception as dalle_error:
+        logger.error(f"❌ [DALL-E] Erro durante a geração ou download: {dalle_error}")
+        raise HTTPException(status_code=500, detail=f"DALL-E process failed: {dalle_error}")
 
-            # Retorna a imagem em base64 para o frontend, independentemente do sucesso do post-processing
-            return ReferenceGenerationResponse(
-                success=True,
-                image_base64=image_base64,
-                prompt=final_prompt
-            )
+@router.post("/generate-jersey-from-reference", response_model=ReferenceGenerationResponse)
+async def generate_jersey_from_reference(request: GenerateFromReferenceRequest):
+    """
+    Gera uma camisa usando uma referência de time do banco de dados.
+    Busca o `teamBasePrompt` e as `referenceImages` do MongoDB.
+    """
+    logger.info(f"✅ [DB] Rota /generate-jersey-from-reference chamada para o time: '{request.teamName}'")
+
+    if db is None:
+        logger.error("❌ [DB] ERRO: Conexão com o banco de dados não disponível.")
+        raise HTTPException(status_code=500, detail="Database connection is not available.")
 
-        except Exception as dalle_error:
-            print(f"❌ [DALL-E] Erro durante a geração ou download: {dalle_error}")
-            raise HTTPException(status_code=500, detail=f"DALL-E process failed: {dalle_error}")
+    async def generate() -> ReferenceGenerationResponse:
+        final_analysis_text = await resolve_jersey_reference(request.teamName)
+        return await render_jersey_from_analysis(request, final_analysis_text)
 
+    try:
+        # Requests totalmente idênticos em andamento recebem a mesma imagem gerada
+        return await single_flight.do(
+            "jersey_generation",
+            # Nome do time normalizado; os demais campos entram como vieram (o texto vai para o prompt)
+            flight_key(request.teamName, request.model_dump(exclude={"teamName"})),
+            generate,
+        )
+
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ [CRITICAL] Erro crítico na rota: {e}")
+        logger.error(f"❌ [CRITICAL] Erro crítico na rota: {e}")
         raise HTTPException(status_code=500, detail=f"An internal server error occurred: {e}")
 
+# --- GERAÇÃO EM LOTE (DROPS DE NFT) ---
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_DEFAULT_CONCURRENCY = int(os.getenv("BATCH_DEFAULT_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+DALLE_IMAGES_PER_MINUTE = int(os.getenv("DALLE_IMAGES_PER_MINUTE", "0"))  # 0 = sem limite
+
+class BatchJerseyPlayer(BaseModel):
+    player_name: str
+    player_number: str
+
+class BatchGenerateFromReferenceRequest(BaseModel):
+    teamName: str
+    players: List[BatchJerseyPlayer]
+    quality: str = "standard"
+    sport: str = "soccer"
+    view: str = "back"
+    concurrency: Optional[int] = None
+    images_per_minute: Optional[int] = None
+    include_image_base64: bool = False
+    render_mode: RenderMode = None
+
+@router.post("/batch/generate-jersey-from-reference")
+async def batch_generate_jersey_from_reference(request: BatchGenerateFromReferenceRequest):
+    """
+    Gera várias camisas do mesmo time (uma por jogador) em lote.
+    A referência e a análise Vision são resolvidas uma única vez; as chamadas ao DALL-E 3
+    rodam com concorrência e taxa limitadas. Os resultados são enviados em NDJSON
+    à medida que cada item termina, e falhas individuais não abortam o lote.
+    """
+    logger.info(f"📦 [BATCH] Lote de {len(request.players)} camisas para o time: '{request.teamName}'")
+
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database connection is not available.")
+    if not request.players:
+        raise HTTPException(status_code=400, detail="players não pode ser vazio.")
+    if len(request.players) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Lote excede o máximo de {BATCH_MAX_ITEMS} itens.")
+
+    # Referência + análise Vision uma única vez para o lote inteiro
+    final_analysis_text = await resolve_jersey_reference(request.teamName)
+
+    concurrency = max(1, min(request.concurrency or BATCH_DEFAULT_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    # No modo local só a base do time passa pelo DALL-E: os itens não consomem a taxa
+    local_render = (request.render_mode or JERSEY_RENDER_MODE) == "local"
+    rate_limiter = ImageRateLimiter(0 if local_render else request.images_per_minute or DALLE_IMAGES_PER_MINUTE)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_item(index: int, player: BatchJerseyPlayer) -> Dict[str, Any]:
+        async with semaphore:
+            await rate_limiter.acquire()
+            start_time = time.time()
+            item_request = GenerateFromReferenceRequest(
+                teamName=request.teamName,
+                player_name=player.player_name,
+                player_number=player.player_number,
+                quality=request.quality,
+                sport=request.sport,
+                view=request.view,
+                response_mode="base64" if request.include_image_base64 else "url",
+                render_mode=request.render_mode
+            )
+            event = {
+                "type": "item",
+                "index": index,
+                "player_name": player.player_name,
+                "player_number": player.player_number,
+            }
+            try:
+                result = await render_jersey_from_analysis(item_request, final_analysis_text)
+                event.update({
+                    "success": True,
+                    "asset_id": result.asset_id,
+                    "image_url": result.image_url,
+                    "image_base64": result.image_base64,
+                })
+            except Exception as e:
+                logger.warning(f"⚠️ [BATCH] Falha no item {index} ({player.player_name} #{player.player_number}): {e}")
+                event.update({"success": False, "error": getattr(e, "detail", None) or str(e)})
+            event["duration_seconds"] = round(time.time() - start_time, 3)
+            return event
+
+    async def stream_results():
+        total = len(request.players)
+        yield json.dumps({"type": "start", "teamName": request.teamName, "total": total, "concurrency": concurrency}) + "\n"
+
+        tasks = [asyncio.create_task(run_item(i, player)) for i, player in enumerate(request.players)]
+        succeeded = failed = 0
+        batch_start = time.time()
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                event = await next_done
+                if event["success"]:
+                    succeeded += 1
+                else:
+                    failed += 1
+                yield json.dumps(event) + "\n"
+        finally:
+            # Cliente desconectou: cancela o que ainda não começou
+            for task in tasks:
+                task.cancel()
+
+        logger.info(f"✅ [BATCH] Lote concluído: {succeeded} sucesso(s), {failed} falha(s).")
+        yield json.dumps({
+            "type": "summary",
+            "total": total,
+            "succeeded": succeeded,
+            "failed": failed,
+            "duration_seconds": round(time.time() - batch_start, 3),
+        }) + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
 class StadiumFromReferenceRequest(BaseModel):
     teamName: str
     quality: str = "standard"
@@ -1478,37 +1894,34 @@ class StadiumFromReferenceRequest(BaseModel):
     timeOfDay: Optional[str] = None
     weather: Optional[str] = None
     prompt: Optional[str] = None
+    response_mode: ResponseMode = None
     customPrompt: Optional[str] = None
     analysis: Optional[dict] = None
 
-@app.post("/generate-stadium-from-reference", response_model=ReferenceGenerationResponse)
+@router.post("/generate-stadium-from-reference", response_model=ReferenceGenerationResponse)
 async def generate_stadium_from_reference(request: StadiumFromReferenceRequest):
     """
     Gera um estádio usando uma referência de time do banco de dados.
     Busca o `stadiumBasePrompt` e as `referenceImages` do MongoDB.
     """
-    print(f"✅ [DB] Rota /generate-stadium-from-reference chamada para o estádio: '{request.teamName}'") # Usamos teamName como ID
+    logger.info(f"✅ [DB] Rota /generate-stadium-from-reference chamada para o estádio: '{request.teamName}'") # Usamos teamName como ID
 
     if db is None:
-        print("❌ [DB] ERRO: Conexão com o banco de dados não disponível.")
+        logger.error("❌ [DB] ERRO: Conexão com o banco de dados não disponível.")
         raise HTTPException(status_code=500, detail="Database connection is not available.")
 
     try:
         query_name = request.teamName.strip() # teamName aqui é o ID ou nome do estádio
-        print(f"🔍 [DB] Buscando referência para '{query_name}' na coleção 'stadium_references'...")
+        report_stage("db_lookup")
+        logger.info(f"🔍 [DB] Buscando referência para '{query_name}' na coleção 'stadium_references'...")
         
-        stadium_reference = db.stadium_references.find_one({
-            "$or": [
-                {"stadiumId": {"$regex": f"^{query_name}$", "$options": "i"}},
-                {"teamName": {"$regex": f"^{query_name}$", "$options": "i"}}
-            ]
-        })
+        stadium_reference = await reference_repo.find("stadium_references", query_name)
 
         if not stadium_reference:
-            print(f"❌ [DB] ERRO: Estádio '{query_name}' não foi encontrado na coleção 'stadium_references'.")
+            logger.error(f"❌ [DB] ERRO: Estádio '{query_name}' não foi encontrado na coleção 'stadium_references'.")
             raise HTTPException(status_code=404, detail=f"Stadium '{query_name}' not found in database.")
 
-        print(f"✅ [DB] Referência encontrada para '{query_name}'.")
+        logger.info(f"✅ [DB] Referência encontrada para '{query_name}'.")
         
         metadata = stadium_reference.get("metadata", {})
         stadium_base_prompt = (
@@ -1519,18 +1932,19 @@ async def generate_stadium_from_reference(request: StadiumFromReferenceRequest):
         )
         
         if not stadium_base_prompt:
-            print(f"⚠️ [DB] Alerta: `stadiumBasePrompt` está vazio para '{query_name}'.")
+            logger.warning(f"⚠️ [DB] Alerta: `stadiumBasePrompt` está vazio para '{query_name}'.")
 
         reference_images = stadium_reference.get("referenceImages", [])
         image_url_to_analyze = reference_images[0].get("url") if reference_images else None
         
         if not image_url_to_analyze:
-            print("❌ [VISION] ERRO: Nenhuma URL de imagem de referência encontrada.")
+            logger.error("❌ [VISION] ERRO: Nenhuma URL de imagem de referência encontrada.")
             raise HTTPException(status_code=400, detail="Reference image URL is missing.")
 
-        print(f"🖼️ [VISION] Iniciando análise para a imagem: {image_url_to_analyze}")
+        report_stage("vision_analysis")
+        logger.info(f"🖼️ [VISION] Iniciando análise para a imagem: {image_url_to_analyze}")
         
-        vision_analyzer = VisionAnalysisSystem()
+        vision_analyzer = vision_analysis_system
         analysis_prompt = "Analyze this stadium image. Describe its key architectural features, materials, roof design, shape, and overall atmosphere. Be descriptive and concise for an AI art prompt."
         
         vision_result = await vision_analyzer.analyze_image_with_vision(
@@ -1540,96 +1954,86 @@ async def generate_stadium_from_reference(request: StadiumFromReferenceRequest):
 
         if not vision_result.get("success"):
             error_msg = vision_result.get("error", "Unknown vision analysis error.")
-            print(f"❌ [VISION] ERRO na análise: {error_msg}")
+            logger.error(f"❌ [VISION] ERRO na análise: {error_msg}")
             raise HTTPException(status_code=500, detail=f"Vision analysis failed: {error_msg}")
 
         analysis_text = vision_result["analysis"]
-        print(f"✅ [VISION] Análise concluída com sucesso.")
+        logger.info(f"✅ [VISION] Análise concluída com sucesso.")
 
         final_analysis_text = analysis_text
         if stadium_base_prompt:
             final_analysis_text = f"**Primary Design Directive:**\n{stadium_base_prompt}\n\n**Additional Details from Visual Analysis:**\n{analysis_text}"
         
-        final_prompt = compose_stadium_vision_prompt(
-            analysis_text=final_analysis_text,
-            style=request.quality
-        )
+        with stage("prompt_composition"):
+            final_prompt = compose_stadium_vision_prompt(
+                analysis_text=final_analysis_text,
+                style=request.quality
+            )
 
-        print("🤖 [DALL-E] Iniciando a geração final da imagem do estádio...")
-        dalle_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        report_stage("dalle_generation")
+        logger.info("🤖 [DALL-E] Iniciando a geração final da imagem do estádio...")
 
-        generation_response = dalle_client.images.generate(
-            model="dall-e-3", prompt=final_prompt, size="1024x1024",
-            quality=request.quality, n=1, response_format="url"
+        generation = await generate_dalle3_image(
+            prompt=final_prompt, size="1024x1024",
+            quality=request.quality, response_format="url"
         )
         
-        generated_image_url = generation_response.data[0].url
-        print(f"✅ [DALL-E] Imagem gerada com sucesso. Baixando...")
-
-        image_response = requests.get(generated_image_url)
-        image_response.raise_for_status()
-        image_base64 = base64.b64encode(image_response.content).decode("utf-8")
-        print("✅ [PROCESS] Imagem convertida para base64.")
-
-        try:
-            print("📤 [CLOUDINARY] Iniciando upload...")
-            upload_result = cloudinary.uploader.upload(
-                f"data:image/png;base64,{image_base64}",
-                folder="stadiums_generated",
-                public_id=f"{query_name}_{int(time.time())}"
-            )
-            cloudinary_url = upload_result.get("secure_url")
-            print(f"✅ [CLOUDINARY] Upload concluído: {cloudinary_url}")
-
-            print("💾 [DB] Salvando o novo estádio na coleção 'stadiums'...")
-            stadiums_collection = db["stadiums"]
-            new_stadium_doc = {
+        generated_image_url = generation["url"]
+        logger.info(f"✅ [DALL-E] Imagem gerada com sucesso. Baixando...")
+
+        image_bytes = await download_image(generated_image_url)
+        image_payload = await build_image_payload(image_bytes, request.response_mode)
+        logger.info("✅ [PROCESS] Imagem salva no blob store.")
+
+        report_stage("post_processing")
+        asset_id = await post_processing.enqueue(
+            kind="stadium",
+            image_bytes=image_bytes,
+            collection="stadiums",
+            folder="stadiums_generated",
+            public_id=f"{query_name}_{int(time.time())}",
+            document={
                 "name": stadium_reference.get("name", query_name.replace('_', ' ').title()),
                 "description": f"AI-generated {query_name} stadium. Style: {request.quality}.",
-                "imageUrl": cloudinary_url,
                 "stadiumId": query_name,
                 "style": request.quality,
                 "generationType": "vision_reference",
                 "promptUsed": final_prompt,
-                "createdAt": datetime.utcnow(),
+                "modelUsed": DALLE_MODEL,
+                "imageSize": "1024x1024",
                 "createdBy": "system_vision_flow"
             }
-            stadiums_collection.insert_one(new_stadium_doc)
-            print("✅ [DB] Novo estádio salvo com sucesso.")
-
-        except Exception as post_processing_error:
-            print(f"⚠️ [POST-PROCESS] Alerta: Falha no upload/salvamento: {post_processing_error}")
+        )
+        logger.info(f"📦 [POST-PROCESS] Upload e salvamento enfileirados (asset {asset_id}).")
 
         return ReferenceGenerationResponse(
-            success=True, image_base64=image_base64, prompt=final_prompt
+            success=True, **image_payload, prompt=final_prompt, asset_id=asset_id
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ [CRITICAL] Erro crítico na rota de estádios: {e}")
+        logger.error(f"❌ [CRITICAL] Erro crítico na rota de estádios: {e}")
         raise HTTPException(status_code=500, detail=f"An internal server error occurred: {e}")
 
-@app.post("/generate-badge-from-reference", response_model=ReferenceGenerationResponse)
+@router.post("/generate-badge-from-reference", response_model=ReferenceGenerationResponse)
 async def generate_badge_from_reference(request: GenerateFromReferenceRequest):
     """
     Gera um emblema (badge) usando uma referência do banco de dados.
     """
-    print(f"✅ [DB] Rota /generate-badge-from-reference chamada para o emblema: '{request.teamName}'")
-    # Log completo do payload recebido
-    print(f"[BADGE GENERATION] Payload recebido: {request.dict()}")
+    logger.info(f"✅ [DB] Rota /generate-badge-from-reference chamada para o emblema: '{request.teamName}'")
+    # Payload recebido (amostrado, LOG_LEVEL=DEBUG)
+    log_payload(logger, "[BADGE GENERATION] Payload recebido", request.dict())
     if db is None:
         raise HTTPException(status_code=500, detail="Database connection is not available.")
     try:
         query_name = request.teamName.strip()
-        print(f"🔍 [DB] Buscando referência para '{query_name}' na coleção 'badge_references'...")
-        badge_reference = db.badge_references.find_one({
-            "$or": [
-                {"badgeId": {"$regex": f"^{query_name}$", "$options": "i"}},
-                {"teamName": {"$regex": f"^{query_name}$", "$options": "i"}}
-            ]
-        })
+        report_stage("db_lookup")
+        logger.info(f"🔍 [DB] Buscando referência para '{query_name}' na coleção 'badge_references'...")
+        badge_reference = await reference_repo.find("badge_references", query_name)
         if not badge_reference:
             raise HTTPException(status_code=404, detail=f"Badge '{query_name}' not found in database.")
-        print(f"✅ [DB] Referência encontrada para '{query_name}'.")
+        logger.info(f"✅ [DB] Referência encontrada para '{query_name}'.")
         metadata = badge_reference.get("metadata", {})
         badge_base_prompt = (
             metadata.get("badgeBasePrompt")
@@ -1641,8 +2045,9 @@ async def generate_badge_from_reference(request: GenerateFromReferenceRequest):
         image_url_to_analyze = reference_images[0].get("url") if reference_images else None
         if not image_url_to_analyze:
             raise HTTPException(status_code=400, detail="Reference image URL is missing.")
-        print(f"🖼️ [VISION] Iniciando análise da imagem do emblema...")
-        vision_analyzer = VisionAnalysisSystem()
+        report_stage("vision_analysis")
+        logger.info(f"🖼️ [VISION] Iniciando análise da imagem do emblema...")
+        vision_analyzer = vision_analysis_system
         analysis_prompt = (
             "Analyze this emblem/badge. Describe its shape, main symbols, color palette, and style (e.g., modern, classic, minimalist). "
             "Focus on elements for a graphic design recreation."
@@ -1651,175 +2056,272 @@ async def generate_badge_from_reference(request: GenerateFromReferenceRequest):
         if not vision_result.get("success"):
             raise HTTPException(status_code=500, detail=f"Vision analysis failed: {vision_result.get('error')}")
         analysis_text = vision_result["analysis"]
-        print(f"✅ [VISION] Análise do emblema concluída.")
+        logger.info(f"✅ [VISION] Análise do emblema concluída.")
         final_analysis_text = analysis_text
         if badge_base_prompt:
             final_analysis_text = f"**Primary Design Directive:**\n{badge_base_prompt}\n\n**Additional Details from Visual Analysis:**\n{analysis_text}"
         # Montar prompt final para badge
-        final_prompt = compose_badge_vision_prompt(
-            analysis_text=final_analysis_text,
-            style=request.quality
-        )
-        print("🤖 [DALL-E] Iniciando a geração final do emblema...")
-        dalle_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        generation_response = dalle_client.images.generate(
-            model="dall-e-3", prompt=final_prompt, size="1024x1024",
-            quality=request.quality, n=1, response_format="url"
-        )
-        generated_image_url = generation_response.data[0].url
-        image_response = requests.get(generated_image_url)
-        image_response.raise_for_status()
-        image_base64 = base64.b64encode(image_response.content).decode("utf-8")
-        print("✅ [PROCESS] Imagem do emblema convertida para base64.")
-        try:
-            print("📤 [CLOUDINARY] Iniciando upload do emblema...")
-            upload_result = cloudinary.uploader.upload(
-                f"data:image/png;base64,{image_base64}",
-                folder="badges_generated",
-                public_id=f"{query_name}_{int(time.time())}"
+        with stage("prompt_composition"):
+            final_prompt = compose_badge_vision_prompt(
+                analysis_text=final_analysis_text,
+                style=request.quality
             )
-            cloudinary_url = upload_result.get("secure_url")
-            print(f"✅ [CLOUDINARY] Upload do emblema concluído: {cloudinary_url}")
-
-            # --- UPLOAD PARA PINATA/IPFS ---
-            print("📤 [IPFS] Iniciando upload do emblema para o Pinata...")
-            pinata_api_key = os.getenv("PINATA_API_KEY")
-            pinata_secret_api_key = os.getenv("PINATA_SECRET_API_KEY")
-            ipfs_url = None
-            if pinata_api_key and pinata_secret_api_key:
-                pinata_endpoint = "https://api.pinata.cloud/pinning/pinFileToIPFS"
-                files = {'file': (f"{query_name}_{int(time.time())}.png", base64.b64decode(image_base64), 'image/png')}
-                headers = {
-                    'pinata_api_key': pinata_api_key,
-                    'pinata_secret_api_key': pinata_secret_api_key
-                }
-                response = requests.post(pinata_endpoint, files=files, headers=headers)
-                if response.status_code == 200:
-                    ipfs_hash = response.json()["IpfsHash"]
-                    ipfs_url = f"https://gateway.pinata.cloud/ipfs/{ipfs_hash}"
-                    print(f"✅ [IPFS] Upload do emblema concluído: {ipfs_url}")
-                else:
-                    print(f"⚠️ [IPFS] Falha no upload para o Pinata: {response.text}")
-            else:
-                print("⚠️ [IPFS] PINATA_API_KEY ou PINATA_SECRET_API_KEY não configurados no .env!")
-
-            print("💾 [DB] Salvando o novo emblema na coleção 'badges'...")
-            badges_collection = db["badges"]
-            new_badge_doc = {
+        report_stage("dalle_generation")
+        logger.info("🤖 [DALL-E] Iniciando a geração final do emblema...")
+        generation = await generate_dalle3_image(
+            prompt=final_prompt, size="1024x1024",
+            quality=request.quality, response_format="url"
+        )
+        generated_image_url = generation["url"]
+        image_bytes = await download_image(generated_image_url)
+        image_payload = await build_image_payload(image_bytes, request.response_mode)
+        logger.info("✅ [PROCESS] Imagem do emblema salva no blob store.")
+        report_stage("post_processing")
+        # Cloudinary + Pinata/IPFS + MongoDB em background (imageUrl = IPFS, fallback Cloudinary)
+        asset_id = await post_processing.enqueue(
+            kind="badge",
+            image_bytes=image_bytes,
+            collection="badges",
+            folder="badges_generated",
+            public_id=f"{query_name}_{int(time.time())}",
+            pin_to_ipfs=True,
+            document={
                 "name": badge_reference.get("name", query_name.replace('_', ' ').title()),
                 "description": f"AI-generated {query_name} badge. Style: {request.quality}.",
-                "imageUrl": ipfs_url if ipfs_url else cloudinary_url,  # IPFS principal, fallback Cloudinary
-                "cloudinaryUrl": cloudinary_url,
                 "badgeId": query_name,
                 "style": request.quality,
                 "generationType": "vision_reference",
                 "promptUsed": final_prompt,
-                "createdAt": datetime.utcnow(),
+                "modelUsed": DALLE_MODEL,
+                "imageSize": "1024x1024",
                 "createdBy": "system_vision_flow"
             }
-            badges_collection.insert_one(new_badge_doc)
-            print("✅ [DB] Novo emblema salvo com sucesso.")
-        except Exception as post_processing_error:
-            print(f"⚠️ [POST-PROCESS] Alerta: Falha no upload/salvamento do emblema: {post_processing_error}")
+        )
+        logger.info(f"📦 [POST-PROCESS] Upload do emblema enfileirado (asset {asset_id}).")
         # Log dos campos não utilizados explicitamente
         used_fields = {"teamName", "quality", "sport", "view"}
         received_fields = set(request.dict().keys())
         unused_fields = received_fields - used_fields
         if unused_fields:
-            print(f"[BADGE GENERATION] Campos recebidos mas não utilizados explicitamente: {unused_fields}")
+            logger.debug(f"[BADGE GENERATION] Campos recebidos mas não utilizados explicitamente: {unused_fields}")
         return ReferenceGenerationResponse(
-            success=True, image_base64=image_base64, prompt=final_prompt
+            success=True, **image_payload, prompt=final_prompt, asset_id=asset_id
         )
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ [CRITICAL] Erro crítico na rota de emblemas: {e}")
+        logger.error(f"❌ [CRITICAL] Erro crítico na rota de emblemas: {e}")
         raise HTTPException(status_code=500, detail=f"An internal server error occurred: {e}")
 
+# --- JOBS DE GERAÇÃO ASSÍNCRONA ---
+class JobSubmitRequest(BaseModel):
+    type: str  # jersey | stadium | badge
+    payload: Dict[str, Any]
+    webhook_url: Optional[str] = None
+
+async def _wait_for_db():
+    """Jobs retomados no boot (ou enviados durante a conexão) esperam o Mongo resolver antes de rodar"""
+    await mongo.wait_ready()
+
+# Resultado de job vai para o store de jobs, o /jobs/{id} e o webhook: sempre URL do blob, nunca base64
+JOB_PAYLOAD_OVERRIDES = {"response_mode": "url"}
+
+async def _run_jersey_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    await _wait_for_db()
+    response = await generate_jersey_from_reference(GenerateFromReferenceRequest(**{**payload, **JOB_PAYLOAD_OVERRIDES}))
+    return response.dict()
+
+async def _run_stadium_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    await _wait_for_db()
+    response = await generate_stadium_from_reference(StadiumFromReferenceRequest(**{**payload, **JOB_PAYLOAD_OVERRIDES}))
+    return response.dict()
+
+async def _run_badge_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    await _wait_for_db()
+    response = await generate_badge_from_reference(GenerateFromReferenceRequest(**{**payload, **JOB_PAYLOAD_OVERRIDES}))
+    return response.dict()
+
+JOB_REQUEST_MODELS = {
+    "jersey": GenerateFromReferenceRequest,
+    "stadium": StadiumFromReferenceRequest,
+    "badge": GenerateFromReferenceRequest,
+}
+
+job_queue = JobQueue(
+    store=create_job_store(db),
+    handlers={
+        "jersey": _run_jersey_job,
+        "stadium": _run_stadium_job,
+        "badge": _run_badge_job,
+    },
+    http_client_factory=get_http_client,
+)
+
+# --- STARTUP / SHUTDOWN ---
+async def on_mongo_ready(database):
+    """Roda uma vez quando a conexão resolve: liga ao banco o que depende dele"""
+    global db_client, db, reference_repo
+    if database is not None:
+        db_client, db = mongo.client, database
+        reference_repo = ReferenceRepository.from_uri(MONGO_URI, DB_NAME)
+        await asyncio.to_thread(vision_cache.attach_collection, db["vision_analysis_cache"])
+        reference_catalog.attach_db(reference_repo.db)
+        # Backends mongo: os workers já rodam sobre o SQLite provisório; os pendentes migram
+        if OUTBOX_BACKEND == "mongo":
+            await post_processing.use_store(await asyncio.to_thread(create_outbox_store, db))
+        if JOB_BACKEND == "mongo":
+            await job_queue.use_store(await asyncio.to_thread(create_job_store, db))
+    if reference_repo is not None:
+        # Garante chaves normalizadas e índices nas coleções de referência
+        try:
+            await reference_repo.ensure_indexes()
+        except Exception as e:
+            logger.warning(f"⚠️ [REFERENCES] Falha ao preparar índices: {e}")
+
+mongo = MongoConnection(MONGO_URI, DB_NAME, on_ready=on_mongo_ready)
+register_readiness("mongo", mongo.readiness)
+
+@asynccontextmanager
+async def lifespan(app):
+    """Startup do core sem esperar pelo banco: o Mongo conecta em background e o /readyz espera por ele"""
+    init_registry()
+    await reference_catalog.start()
+    # Workers sobem já no store SQLite provisório: /jobs e o outbox funcionam durante a conexão
+    await post_processing.start()
+    await job_queue.start()
+    mongo.start()
+    try:
+        yield
+    finally:
+        await mongo.stop()
+        await job_queue.stop()
+        await post_processing.stop()
+        await reference_catalog.stop()
+        await close_clients()
+        stadium_reference_store.stop_watcher()
+
+@router.post("/jobs", status_code=202)
+async def submit_generation_job(request: JobSubmitRequest):
+    """Enfileira uma geração por referência e devolve o job id imediatamente"""
+    model = JOB_REQUEST_MODELS.get(request.type)
+    if model is None:
+        raise HTTPException(status_code=400, detail=f"Tipo de job inválido: '{request.type}'. Tipos: {sorted(JOB_REQUEST_MODELS)}")
+    try:
+        payload = model(**request.payload).dict()
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Payload inválido para '{request.type}': {e}")
+
+    try:
+        job = await job_queue.submit(request.type, payload, webhook_url=request.webhook_url)
+    except Exception as e:
+        logger.error(f"❌ [JOBS] Falha ao enfileirar job ({request.type}): {e}")
+        raise HTTPException(status_code=503, detail="Fila de jobs indisponível no momento. Tente novamente.")
+    logger.info(f"📥 [JOBS] Job {job['id']} ({request.type}) enfileirado. Pendentes: {job_queue.pending()}")
+    return {"job_id": job["id"], "status": job["status"], "status_url": f"/jobs/{job['id']}"}
+
+@router.get("/jobs/{job_id}")
+async def get_generation_job(job_id: str):
+    """Consulta o status (e o resultado, quando concluído) de um job"""
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 # --- ADMIN ENDPOINTS ---
-@app.post("/api/admin/stadiums")
+@router.post("/api/admin/stadiums")
 async def create_stadium_reference(stadium: StadiumReference):
     if db is None:
         raise HTTPException(status_code=500, detail="Database connection not available.")
     try:
-        print(f"✅ [ADMIN] Recebida requisição para criar referência de estádio: {stadium.name}")
-        db.stadium_references.insert_one(stadium.dict())
+        logger.info(f"✅ [ADMIN] Recebida requisição para criar referência de estádio: {stadium.name}")
+        await reference_repo.insert("stadium_references", stadium.dict())
+        await reference_catalog.bump("stadiums")
         return {"status": "success", "message": f"Stadium reference '{stadium.name}' created."}
     except Exception as e:
-        print(f"❌ [ADMIN] Erro ao criar referência de estádio: {e}")
+        logger.error(f"❌ [ADMIN] Erro ao criar referência de estádio: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/admin/badges")
+@router.post("/api/admin/badges")
 async def create_badge_reference(badge: BadgeReference):
     if db is None:
         raise HTTPException(status_code=500, detail="Database connection not available.")
     try:
-        print(f"✅ [ADMIN] Recebida requisição para criar referência de emblema: {badge.name}")
-        db.badge_references.insert_one(badge.dict())
+        logger.info(f"✅ [ADMIN] Recebida requisição para criar referência de emblema: {badge.name}")
+        await reference_repo.insert("badge_references", badge.dict())
+        await reference_catalog.bump("badges")
         return {"status": "success", "message": f"Badge reference '{badge.name}' created."}
     except Exception as e:
-        print(f"❌ [ADMIN] Erro ao criar referência de emblema: {e}")
+        logger.error(f"❌ [ADMIN] Erro ao criar referência de emblema: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/admin/stadiums/{stadium_id}")
+@router.get("/api/admin/stadiums/{stadium_id}")
 async def get_stadium_reference(stadium_id: str):
     if db is None:
         raise HTTPException(status_code=500, detail="Database connection not available.")
-    stadium = db.stadium_references.find_one({"stadiumId": stadium_id})
+    stadium = await reference_repo.get("stadium_references", stadium_id)
     if stadium:
         stadium["_id"] = str(stadium["_id"])
         return stadium
     raise HTTPException(status_code=404, detail="Stadium reference not found")
 
-@app.put("/api/admin/stadiums/{stadium_id}")
+@router.put("/api/admin/stadiums/{stadium_id}")
 async def update_stadium_reference(stadium_id: str, stadium: StadiumReference):
     if db is None:
         raise HTTPException(status_code=500, detail="Database connection not available.")
     update_data = stadium.dict(exclude_unset=True, exclude={'id'})
-    result = db.stadium_references.update_one({"stadiumId": stadium_id}, {"$set": update_data})
+    result = await reference_repo.update("stadium_references", stadium_id, update_data)
     if result.matched_count:
+        await reference_catalog.bump("stadiums")
         return {"status": "success", "message": f"Stadium reference '{stadium.name}' updated."}
     raise HTTPException(status_code=404, detail="Stadium reference not found")
 
-@app.delete("/api/admin/stadiums/{stadium_id}")
+@router.delete("/api/admin/stadiums/{stadium_id}")
 async def delete_stadium_reference(stadium_id: str):
     if db is None:
         raise HTTPException(status_code=500, detail="Database connection not available.")
-    result = db.stadium_references.delete_one({"stadiumId": stadium_id})
+    result = await reference_repo.delete("stadium_references", stadium_id)
     if result.deleted_count:
+        await reference_catalog.bump("stadiums")
         return {"status": "success", "message": "Stadium reference deleted."}
     raise HTTPException(status_code=404, detail="Stadium reference not found")
 
-@app.get("/api/admin/badges/{badge_id}")
+@router.get("/api/admin/badges/{badge_id}")
 async def get_badge_reference(badge_id: str):
     if db is None:
         raise HTTPException(status_code=500, detail="Database connection not available.")
-    badge = db.badge_references.find_one({"badgeId": badge_id})
+    badge = await reference_repo.get("badge_references", badge_id)
     if badge:
         badge["_id"] = str(badge["_id"])
         return badge
     raise HTTPException(status_code=404, detail="Badge reference not found")
 
-@app.put("/api/admin/badges/{badge_id}")
+@router.put("/api/admin/badges/{badge_id}")
 async def update_badge_reference(badge_id: str, badge: BadgeReference):
     if db is None:
         raise HTTPException(status_code=500, detail="Database connection not available.")
     update_data = badge.dict(exclude_unset=True, exclude={'id'})
-    result = db.badge_references.update_one({"badgeId": badge_id}, {"$set": update_data})
+    result = await reference_repo.update("badge_references", badge_id, update_data)
     if result.matched_count:
+        await reference_catalog.bump("badges")
         return {"status": "success", "message": f"Badge reference '{badge.name}' updated."}
     raise HTTPException(status_code=404, detail="Badge reference not found")
 
-@app.delete("/api/admin/badges/{badge_id}")
+@router.delete("/api/admin/badges/{badge_id}")
 async def delete_badge_reference(badge_id: str):
     if db is None:
         raise HTTPException(status_code=500, detail="Database connection not available.")
-    result = db.badge_references.delete_one({"badgeId": badge_id})
+    result = await reference_repo.delete("badge_references", badge_id)
     if result.deleted_count:
+        await reference_catalog.bump("badges")
         return {"status": "success", "message": "Badge reference deleted."}
     raise HTTPException(status_code=404, detail="Badge reference not found")
 
+# Aplicação só com o subsistema core (uvicorn main:app); o processo único é o server.py
+app = build_app("Unified API - Jerseys + Stadiums", "1.0.0", [router], "main", lifespans=[lifespan])
+
 # --- PONTO DE ENTRADA DA APLICAÇÃO ---
 if __name__ == "__main__":
     import uvicorn
-    print("🚀 Starting Unified API (Jerseys + Stadiums) on port 8000")
+    logger.info("🚀 Starting Unified API (Jerseys + Stadiums) on port 8000")
     uvicorn.run(app, host="0.0.0.0", port=8000) 
 
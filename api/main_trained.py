@@ -7,6 +7,10 @@ Servidor de geração de jerseys usando modelo fine-tuned
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+import asyncio
+import secrets
+import time
 import torch
 from diffusers import StableDiffusionPipeline, DPMSolverMultistepScheduler
 from peft import PeftModel
@@ -14,6 +18,8 @@ import base64
 from io import BytesIO
 from pathlib import Path
 import logging
+from prometheus_metrics import instrument_app
+from micro_batching import MicroBatcher
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
@@ -30,6 +36,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Métricas Prometheus (latência por rota, em andamento, custo) + GET /metrics
+instrument_app(app, "main_trained")
+
 # Modelos de dados
 class JerseyRequest(BaseModel):
     team_name: str
@@ -39,28 +48,37 @@ class JerseyRequest(BaseModel):
     pattern: str = "solid"  # solid, vertical_stripes, horizontal_stripes
     num_inference_steps: int = 25
     guidance_scale: float = 7.5
+    seed: Optional[int] = None  # None = aleatória (devolvida na resposta)
 
 class CustomPromptRequest(BaseModel):
     prompt: str
     negative_prompt: str = ""
     num_inference_steps: int = 25
     guidance_scale: float = 7.5
+    seed: Optional[int] = None
 
 class ImageResponse(BaseModel):
     image: str  # base64
     prompt_used: str
     generation_time: float
+    seed: Optional[int] = None
 
-# Variável global para o gerador
+# Variáveis globais para o gerador e o micro-batching das chamadas ao pipeline
 generator = None
+batcher = None
+
+DEFAULT_NEGATIVE_PROMPT = "ugly, blurry, low quality, distorted, deformed, text, watermark, signature, logo, brand, amateur"
 
 class TrainedJerseyGenerator:
     """Gerador usando modelo LoRA treinado"""
     
-    def __init__(self, lora_model_path="jersey_lora_model/final_model"):
+    image_size = 512
+
+    def __init__(self, lora_model_path="jersey_lora_model/final_model", pipe=None):
         self.lora_model_path = lora_model_path
-        self.pipe = None
-        self.load_model()
+        self.pipe = pipe
+        if self.pipe is None:
+            self.load_model()
         
     def load_model(self):
         """Carrega modelo com LoRA"""
@@ -103,33 +121,49 @@ class TrainedJerseyGenerator:
             logger.error(f"❌ Erro ao carregar modelo: {e}")
             raise
             
-    def generate_jersey(self, prompt, negative_prompt=None, num_inference_steps=25, guidance_scale=7.5):
-        """Gera jersey baseada no prompt"""
-        
-        if negative_prompt is None:
-            negative_prompt = "ugly, blurry, low quality, distorted, deformed, text, watermark, signature, logo, brand, amateur"
-            
-        logger.info(f"🎨 Gerando jersey: {prompt}")
+    def generate_batch(self, items: List[Dict[str, Any]]):
+        """
+        Gera um lote numa única chamada ao pipeline (lista de prompts, um gerador por seed).
+        Itens do mesmo lote compartilham num_inference_steps e guidance_scale (group_key do batcher).
+        """
+        device = self.pipe.device
+        logger.info(f"🎨 Gerando lote de {len(items)} jersey(s): {[item['prompt'] for item in items]}")
         
         try:
             with torch.autocast("cuda" if torch.cuda.is_available() else "cpu"):
-                image = self.pipe(
-                    prompt=prompt,
-                    negative_prompt=negative_prompt,
-                    num_inference_steps=num_inference_steps,
-                    guidance_scale=guidance_scale,
-                    width=512,
-                    height=512
-                ).images[0]
+                images = self.pipe(
+                    prompt=[item["prompt"] for item in items],
+                    negative_prompt=[item.get("negative_prompt") or DEFAULT_NEGATIVE_PROMPT for item in items],
+                    num_inference_steps=items[0]["num_inference_steps"],
+                    guidance_scale=items[0]["guidance_scale"],
+                    generator=[torch.Generator(device=device).manual_seed(item["seed"]) for item in items],
+                    width=self.image_size,
+                    height=self.image_size
+                ).images
                 
-            return image
+            return images
             
         except Exception as e:
             logger.error(f"❌ Erro na geração: {e}")
             raise
+
+    def generate_jersey(self, prompt, negative_prompt=None, num_inference_steps=25, guidance_scale=7.5, seed=None):
+        """Gera jersey baseada no prompt"""
+        return self.generate_batch([{
+            "prompt": prompt,
+            "negative_prompt": negative_prompt,
+            "num_inference_steps": num_inference_steps,
+            "guidance_scale": guidance_scale,
+            "seed": seed if seed is not None else new_seed(),
+        }])[0]
             
     def generate_team_jersey(self, team_name, jersey_type="home", primary_color="", secondary_color="", pattern="solid", **kwargs):
         """Gera jersey para time específico"""
+        prompt = self.build_team_prompt(team_name, jersey_type, primary_color, secondary_color, pattern)
+        return self.generate_jersey(prompt, **kwargs), prompt
+
+    def build_team_prompt(self, team_name, jersey_type="home", primary_color="", secondary_color="", pattern="solid"):
+        """Constrói o prompt do time (usado pelo endpoint com o micro-batching)"""
         
         # Constrói prompt otimizado
         prompt_parts = [
@@ -160,9 +194,7 @@ class TrainedJerseyGenerator:
             "realistic"
         ])
         
-        prompt = ", ".join(prompt_parts)
-        
-        return self.generate_jersey(prompt, **kwargs), prompt
+        return ", ".join(prompt_parts)
         
     def image_to_base64(self, image):
         """Converte imagem para base64"""
@@ -171,10 +203,35 @@ class TrainedJerseyGenerator:
         img_str = base64.b64encode(buffered.getvalue()).decode()
         return img_str
 
+def new_seed() -> int:
+    return secrets.randbelow(2 ** 31)
+
+def create_batcher(jersey_generator: TrainedJerseyGenerator, **kwargs) -> MicroBatcher:
+    """Lotes só juntam pedidos com os mesmos passos e guidance (parâmetros escalares do pipeline)"""
+    return MicroBatcher(
+        jersey_generator.generate_batch,
+        group_key=lambda item: (item["num_inference_steps"], item["guidance_scale"]),
+        name="trained_pipeline",
+        **kwargs
+    )
+
+async def generate_batched(prompt: str, negative_prompt: Optional[str], num_inference_steps: int,
+                           guidance_scale: float, seed: Optional[int]):
+    """Entra no próximo lote do pipeline e devolve (base64, seed usada) sem bloquear o event loop"""
+    seed = seed if seed is not None else new_seed()
+    image = await batcher.submit({
+        "prompt": prompt,
+        "negative_prompt": negative_prompt,
+        "num_inference_steps": num_inference_steps,
+        "guidance_scale": guidance_scale,
+        "seed": seed,
+    })
+    return await asyncio.to_thread(generator.image_to_base64, image), seed
+
 @app.on_event("startup")
 async def startup_event():
     """Inicializa o gerador na startup"""
-    global generator
+    global generator, batcher
     try:
         generator = TrainedJerseyGenerator()
         logger.info("🚀 Servidor iniciado com modelo treinado!")
@@ -187,6 +244,12 @@ async def startup_event():
         except:
             logger.error("❌ Falha completa na inicialização")
             raise
+    batcher = create_batcher(generator)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if batcher is not None:
+        await batcher.stop()
 
 @app.get("/")
 async def root():
@@ -216,22 +279,20 @@ async def generate_team_jersey(request: JerseyRequest):
         raise HTTPException(status_code=500, detail="Modelo não carregado")
         
     try:
-        import time
         start_time = time.time()
         
-        # Gera jersey
-        image, prompt_used = generator.generate_team_jersey(
+        prompt_used = generator.build_team_prompt(
             team_name=request.team_name,
             jersey_type=request.jersey_type,
             primary_color=request.primary_color,
             secondary_color=request.secondary_color,
-            pattern=request.pattern,
-            num_inference_steps=request.num_inference_steps,
-            guidance_scale=request.guidance_scale
+            pattern=request.pattern
         )
         
-        # Converte para base64
-        image_b64 = generator.image_to_base64(image)
+        # Gera jersey no próximo lote do pipeline
+        image_b64, seed = await generate_batched(
+            prompt_used, None, request.num_inference_steps, request.guidance_scale, request.seed
+        )
         
         generation_time = time.time() - start_time
         
@@ -240,7 +301,8 @@ async def generate_team_jersey(request: JerseyRequest):
         return ImageResponse(
             image=image_b64,
             prompt_used=prompt_used,
-            generation_time=generation_time
+            generation_time=generation_time,
+            seed=seed
         )
         
     except Exception as e:
@@ -255,20 +317,17 @@ async def generate_custom_jersey(request: CustomPromptRequest):
         raise HTTPException(status_code=500, detail="Modelo não carregado")
         
     try:
-        import time
         start_time = time.time()
         
-        # Gera jersey
-        image = generator.generate_jersey(
-            prompt=request.prompt,
-            negative_prompt=request.negative_prompt or None,
-            num_inference_steps=request.num_inference_steps,
-            guidance_scale=request.guidance_scale
+        # Gera jersey no próximo lote do pipeline
+        image_b64, seed = await generate_batched(
+            request.prompt,
+            request.negative_prompt or None,
+            request.num_inference_steps,
+            request.guidance_scale,
+            request.seed
         )
         
-        # Converte para base64
-        image_b64 = generator.image_to_base64(image)
-        
         generation_time = time.time() - start_time
         
         logger.info(f"✅ Jersey personalizada gerada em {generation_time:.2f}s")
@@ -276,7 +335,8 @@ async def generate_custom_jersey(request: CustomPromptRequest):
         return ImageResponse(
             image=image_b64,
             prompt_used=request.prompt,
-            generation_time=generation_time
+            generation_time=generation_time,
+            seed=seed
         )
         
     except Exception as e:
@@ -297,6 +357,11 @@ async def model_info():
         "model_loaded": generator is not None
     }
 
+@app.get("/batching/stats")
+async def batching_stats():
+    """Tamanho dos lotes, fila e tempo ocupado do micro-batching do pipeline"""
+    return batcher.stats() if batcher is not None else {"batches": 0}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
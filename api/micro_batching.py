@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Micro-batching dinâmico para inferência local (ex.: pipeline diffusers do main_trained.py)
+Pedidos compatíveis (mesma group_key — passos, guidance, tamanho) que chegam dentro de uma
+janela curta viram uma única chamada run_batch(itens), que roda numa thread fora do event
+loop; cada chamador recebe o resultado do seu item (ou a exceção do lote).
+Um worker só: enquanto um lote roda, os pedidos novos se acumulam e o próximo lote sai
+cheio sem esperar a janela — o tamanho do lote acompanha a carga.
+"""
+import asyncio
+import os
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from structured_logging import get_logger
+
+logger = get_logger("micro_batching")
+
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "4"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "50"))
+
+
+class MicroBatcher:
+    """Fila por group_key; o worker junta até max_batch_size itens ou até max_wait_ms do mais antigo"""
+
+    def __init__(self, run_batch: Callable[[List[Any]], Sequence[Any]], max_batch_size: int = BATCH_MAX_SIZE,
+                 max_wait_ms: float = BATCH_MAX_WAIT_MS, group_key: Callable[[Any], Hashable] = lambda item: None,
+                 name: str = "batch"):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.group_key = group_key
+        self.name = name
+        self._pending: "OrderedDict[Hashable, List[Tuple[Any, asyncio.Future, float]]]" = OrderedDict()
+        self._arrived: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.batch_sizes: Counter = Counter()
+        self.items = 0
+        self.failed_batches = 0
+        self.busy_seconds = 0.0
+
+    async def submit(self, item: Any) -> Any:
+        """Enfileira o item e aguarda o resultado dele dentro do lote"""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done():
+            self._arrived = asyncio.Event()
+            self._worker = loop.create_task(self._run_worker())
+        future = loop.create_future()
+        self._pending.setdefault(self.group_key(item), []).append((item, future, loop.time()))
+        self._arrived.set()
+        return await future
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        for bucket in self._pending.values():
+            for _, future, _ in bucket:
+                if not future.done():
+                    future.set_exception(RuntimeError("Batcher encerrado"))
+        self._pending.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        batches = sum(self.batch_sizes.values())
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queued": sum(len(bucket) for bucket in self._pending.values()),
+            "batches": batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / batches, 2) if batches else 0.0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            "failed_batches": self.failed_batches,
+            "busy_seconds": round(self.busy_seconds, 3),
+        }
+
+    # --- Internos ---
+    async def _run_worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            while not self._pending:
+                self._arrived.clear()
+                await self._arrived.wait()
+
+            # Grupo com o pedido mais antigo primeiro; espera encher só até o prazo dele
+            key, bucket = next(iter(self._pending.items()))
+            deadline = bucket[0][2] + self.max_wait
+            while len(bucket) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self._arrived.clear()
+                try:
+                    await asyncio.wait_for(self._arrived.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            batch = bucket[:self.max_batch_size]
+            del bucket[:self.max_batch_size]
+            if not bucket:
+                del self._pending[key]
+            # Chamador que desistiu (cliente desconectou) não ocupa lugar no lote
+            batch = [(item, future) for item, future, _ in batch if not future.done()]
+            if batch:
+                await self._execute(batch)
+
+    async def _execute(self, batch: List[Tuple[Any, asyncio.Future]]):
+        started = time.perf_counter()
+        try:
+            results = await asyncio.to_thread(self.run_batch, [item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"Lote de {len(batch)} itens devolveu {len(results)} resultados")
+        except asyncio.CancelledError:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Batcher encerrado"))
+            raise
+        except Exception as e:
+            self.failed_batches += 1
+            logger.error(f"❌ [BATCH {self.name}] Lote de {len(batch)} falhou: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.busy_seconds += time.perf_counter() - started
+            self.batch_sizes[len(batch)] += 1
+            self.items += len(batch)
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Conexão com o MongoDB em background, com tentativas limitadas
+O import e o startup não esperam pelo banco: start() agenda a conexão (ping com backoff
+exponencial, até MONGO_CONNECT_ATTEMPTS tentativas) e on_ready() roda uma única vez quando
+ela resolve, com o banco conectado ou None (sem MONGODB_URI ou tentativas esgotadas).
+readiness() alimenta o /readyz: pronto depois que on_ready() terminou; com MONGO_REQUIRED=true
+só se o banco conectou.
+"""
+import asyncio
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import pymongo
+
+from structured_logging import get_logger
+
+logger = get_logger("mongo_connection")
+
+MONGO_CONNECT_ATTEMPTS = int(os.getenv("MONGO_CONNECT_ATTEMPTS", "5"))
+MONGO_CONNECT_BACKOFF = float(os.getenv("MONGO_CONNECT_BACKOFF", "1.0"))  # segundos, dobra a cada falha
+MONGO_CONNECT_BACKOFF_MAX = float(os.getenv("MONGO_CONNECT_BACKOFF_MAX", "15"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_REQUIRED = os.getenv("MONGO_REQUIRED", "false").lower() == "true"
+
+PENDING = "pending"
+CONNECTING = "connecting"
+CONNECTED = "connected"
+FAILED = "failed"
+DISABLED = "disabled"
+
+
+class MongoConnection:
+    """Cliente pymongo criado e validado fora do caminho do import/startup"""
+
+    def __init__(self, uri: Optional[str], db_name: str,
+                 on_ready: Optional[Callable[[Any], Awaitable[None]]] = None,
+                 attempts: int = MONGO_CONNECT_ATTEMPTS, backoff: float = MONGO_CONNECT_BACKOFF,
+                 required: bool = MONGO_REQUIRED, client_factory: Callable[..., Any] = pymongo.MongoClient):
+        self.uri = uri
+        self.db_name = db_name
+        self.on_ready = on_ready
+        self.attempts = attempts
+        self.backoff = backoff
+        self.required = required
+        self.client_factory = client_factory
+        self.client = None
+        self.db = None
+        self.state = PENDING
+        self.tries = 0
+        self.last_error: Optional[str] = None
+        self.connect_seconds: Optional[float] = None
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Agenda a conexão (retorna na hora)"""
+        if self._task is None:
+            self._ready = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.client is not None:
+            self.client.close()
+
+    async def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._ready.is_set()
+
+    def readiness(self) -> Tuple[bool, Dict[str, Any]]:
+        ready = self._ready.is_set() and (self.state == CONNECTED or not self.required)
+        return ready, {
+            "state": self.state,
+            "attempts": self.tries,
+            "last_error": self.last_error,
+            "connect_seconds": self.connect_seconds,
+            "required": self.required,
+        }
+
+    # --- Internos ---
+    async def _run(self):
+        started = time.perf_counter()
+        if not self.uri:
+            self.state = DISABLED
+            logger.warning("⚠️ MONGODB_URI não encontrada no .env. As operações de banco de dados estarão desativadas.")
+        else:
+            self.state = CONNECTING
+            await self._connect()
+        self.connect_seconds = round(time.perf_counter() - started, 3)
+        if self.on_ready is not None:
+            try:
+                await self.on_ready(self.db)
+            except Exception as e:
+                logger.error(f"❌ [MONGO] Falha ao preparar os dependentes do banco: {e}")
+        self._ready.set()
+
+    async def _connect(self):
+        delay = self.backoff
+        for attempt in range(1, self.attempts + 1):
+            self.tries = attempt
+            logger.info(f"⚙️ Conectando ao MongoDB (tentativa {attempt}/{self.attempts})...")
+            client = self.client_factory(self.uri, serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS)
+            try:
+                await asyncio.to_thread(client.admin.command, "ping")
+            except Exception as e:
+                client.close()
+                self.last_error = str(e)
+                logger.warning(f"⚠️ [MONGO] Tentativa {attempt}/{self.attempts} falhou: {e}")
+                if attempt < self.attempts:
+                    await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+                    delay = min(delay * 2, MONGO_CONNECT_BACKOFF_MAX)
+                continue
+            self.client = client
+            self.db = client[self.db_name]
+            self.state = CONNECTED
+            self.last_error = None
+            logger.info(f"✅ Conexão com o MongoDB estabelecida com sucesso ao banco '{self.db_name}'.")
+            return
+        self.state = FAILED
+        logger.error(f"❌ Falha na conexão com o MongoDB após {self.attempts} tentativas: {self.last_error}")
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Pós-processamento de imagens geradas fora do caminho da resposta
+Upload para o Cloudinary, pin no Pinata/IPFS e insert no MongoDB rodam em background,
+a partir de um outbox durável (SQLite por padrão, MongoDB opcional), com retries.
+O estado de cada asset (pending → uploaded → pinned → completed | failed) pode ser consultado.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import cloudinary.uploader
+
+from provider_clients import CLOUDINARY_TIMEOUT
+from prometheus_metrics import stage
+import tracing
+from runtime_paths import data_path
+from structured_logging import get_logger
+
+logger = get_logger("post_processing")
+
+OUTBOX_BACKEND = os.getenv("OUTBOX_BACKEND", "sqlite")  # sqlite | mongo
+OUTBOX_DB_PATH = os.getenv("OUTBOX_DB_PATH", str(data_path("post_processing_outbox.db")))
+OUTBOX_FILES_DIR = Path(os.getenv("OUTBOX_FILES_DIR", data_path("post_processing_outbox")))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "4"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+PINATA_ENDPOINT = "https://api.pinata.cloud/pinning/pinFileToIPFS"
+
+# Status de um asset no outbox
+PENDING, UPLOADED, PINNED, COMPLETED, FAILED = "pending", "uploaded", "pinned", "completed", "failed"
+ACTIVE = (PENDING, UPLOADED, PINNED)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# --- BACKENDS DE PERSISTÊNCIA ---
+class SQLiteOutboxStore:
+    """Outbox local em um arquivo SQLite"""
+
+    def __init__(self, path: str = OUTBOX_DB_PATH):
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                status TEXT NOT NULL,
+                next_attempt_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at)")
+        self._conn.commit()
+
+    def save(self, entry: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO outbox (id, data, status, next_attempt_at) VALUES (?, ?, ?, ?)",
+                (entry["id"], json.dumps(entry, default=str), entry["status"], entry["next_attempt_at"]),
+            )
+            self._conn.commit()
+
+    def get(self, asset_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM outbox WHERE id = ?", (asset_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_due(self, now: float, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM outbox WHERE status IN (?, ?, ?) AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at LIMIT ?",
+                (*ACTIVE, now, limit),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def delete(self, asset_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM outbox WHERE id = ?", (asset_id,))
+            self._conn.commit()
+
+
+class MongoOutboxStore:
+    """Outbox em uma coleção MongoDB"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        try:
+            self.collection.create_index([("status", 1), ("next_attempt_at", 1)])
+        except Exception as e:
+            logger.warning(f"⚠️ [OUTBOX] Falha ao criar índice: {e}")
+
+    def save(self, entry: Dict[str, Any]):
+        self.collection.replace_one({"_id": entry["id"]}, {**entry, "_id": entry["id"]}, upsert=True)
+
+    def get(self, asset_id: str) -> Optional[Dict[str, Any]]:
+        doc = self.collection.find_one({"_id": asset_id})
+        if doc:
+            doc.pop("_id", None)
+        return doc
+
+    def list_due(self, now: float, limit: int) -> List[Dict[str, Any]]:
+        docs = self.collection.find(
+            {"status": {"$in": list(ACTIVE)}, "next_attempt_at": {"$lte": now}}
+        ).sort("next_attempt_at", 1).limit(limit)
+        return [{k: v for k, v in doc.items() if k != "_id"} for doc in docs]
+
+    def delete(self, asset_id: str):
+        self.collection.delete_one({"_id": asset_id})
+
+
+def create_outbox_store(db=None):
+    """Escolhe o backend conforme OUTBOX_BACKEND (mongo exige conexão ativa)"""
+    if OUTBOX_BACKEND == "mongo":
+        if db is not None:
+            logger.info("✅ [OUTBOX] Usando MongoDB para o outbox de pós-processamento.")
+            return MongoOutboxStore(db["post_processing_outbox"])
+        logger.warning("⚠️ [OUTBOX] OUTBOX_BACKEND=mongo mas o banco não está disponível. Usando SQLite.")
+    return SQLiteOutboxStore(OUTBOX_DB_PATH)
+
+
+# --- PIPELINE ---
+class PostProcessingPipeline:
+    """Processa o outbox: Cloudinary → Pinata (opcional) → MongoDB"""
+
+    def __init__(self, store, get_db: Callable[[], Any], http_client_factory: Callable,
+                 files_dir: Path = OUTBOX_FILES_DIR, max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+                 concurrency: int = OUTBOX_CONCURRENCY):
+        self.store = store
+        self.get_db = get_db
+        self.http_client_factory = http_client_factory
+        self.files_dir = files_dir
+        self.max_attempts = max_attempts
+        self.concurrency = concurrency
+        self.files_dir.mkdir(parents=True, exist_ok=True)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._in_progress = set()
+        self._previous_store = None
+        # Um lote em processamento e a troca de backend não se cruzam
+        self._batch_lock = asyncio.Lock()
+
+    async def enqueue(self, kind: str, image_bytes: bytes, collection: str, folder: str, public_id: str,
+                      document: Dict[str, Any], pin_to_ipfs: bool = False) -> str:
+        """Grava a imagem e a entrada no outbox (em thread, fora do event loop); retorna o asset_id"""
+        asset_id = uuid.uuid4().hex
+        image_path = self.files_dir / f"{asset_id}.png"
+        entry = {
+            "id": asset_id,
+            "kind": kind,
+            "status": PENDING,
+            "image_path": str(image_path),
+            "collection": collection,
+            "folder": folder,
+            "public_id": public_id,
+            "pin_to_ipfs": pin_to_ipfs,
+            "document": document,
+            "cloudinary_url": None,
+            "ipfs_url": None,
+            "attempts": 0,
+            "error": None,
+            "next_attempt_at": 0,
+            "traceparent": tracing.current_traceparent(),
+            "created_at": _now(),
+            "updated_at": _now(),
+        }
+        await asyncio.to_thread(self._persist, image_path, image_bytes, entry)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return asset_id
+
+    def _persist(self, image_path: Path, image_bytes: bytes, entry: Dict[str, Any]):
+        image_path.write_bytes(image_bytes)
+        self.store.save(entry)
+
+    def get(self, asset_id: str) -> Optional[Dict[str, Any]]:
+        entry = self.store.get(asset_id)
+        if entry is None and self._previous_store is not None:
+            entry = self._previous_store.get(asset_id)
+        return entry
+
+    async def use_store(self, store):
+        """Troca o backend com o dispatcher rodando (SQLite provisório → Mongo) levando os assets ativos"""
+        async with self._batch_lock:
+            previous, self.store = self.store, store
+            self._previous_store = previous
+            # list_due sem limite de horário = todos os assets ainda não concluídos
+            active = await asyncio.to_thread(previous.list_due, float("inf"), 1_000_000)
+            for entry in active:
+                await asyncio.to_thread(store.save, entry)
+                # Sem a cópia no store anterior o próximo boot não reprocessa o asset
+                await asyncio.to_thread(previous.delete, entry["id"])
+        if self._wakeup is not None:
+            self._wakeup.set()
+        logger.info(f"✅ [OUTBOX] Backend trocado ({len(active)} assets ativos migrados).")
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._dispatcher())
+        logger.info("✅ [OUTBOX] Pipeline de pós-processamento iniciado.")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _dispatcher(self):
+        failures = 0
+        while True:
+            try:
+                async with self._batch_lock:
+                    due = [
+                        entry for entry in await asyncio.to_thread(self.store.list_due, time.time(), self.concurrency)
+                        if entry["id"] not in self._in_progress
+                    ]
+                    failures = 0
+                    if due:
+                        await asyncio.gather(*(self._process(entry) for entry in due))
+                if due:
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Store fora do ar (ex.: Mongo caiu): o dispatcher não pode morrer junto
+                failures += 1
+                delay = min(OUTBOX_POLL_SECONDS * 2 ** (failures - 1), 300)
+                logger.error(f"❌ [OUTBOX] Falha no dispatcher (tentativa {failures}): {e}. Nova tentativa em {delay:.1f}s.")
+                await asyncio.sleep(delay)
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _process(self, entry: Dict[str, Any]):
+        # Os spans do pós-processamento entram no trace da requisição que gerou o asset
+        async with tracing.span("post_processing", traceparent=entry.get("traceparent"),
+                                asset_id=entry["id"], asset_kind=entry["kind"]):
+            await self._run_steps(entry)
+
+    async def _run_steps(self, entry: Dict[str, Any]):
+        self._in_progress.add(entry["id"])
+        try:
+            image_bytes = await asyncio.to_thread(Path(entry["image_path"]).read_bytes)
+
+            if entry["status"] == PENDING:
+                logger.info(f"📤 [OUTBOX] Upload do asset {entry['id']} para o Cloudinary...")
+                async with stage("cloudinary_upload"):
+                    upload_result = await asyncio.to_thread(
+                        cloudinary.uploader.upload,
+                        image_bytes,
+                        folder=entry["folder"],
+                        public_id=entry["public_id"],
+                        timeout=CLOUDINARY_TIMEOUT,
+                    )
+                entry["cloudinary_url"] = upload_result.get("secure_url")
+                await self._advance(entry, UPLOADED)
+
+            if entry["status"] == UPLOADED:
+                if entry["pin_to_ipfs"]:
+                    async with stage("pinata_pin"):
+                        entry["ipfs_url"] = await self._pin_to_ipfs(entry, image_bytes)
+                await self._advance(entry, PINNED)
+
+            if entry["status"] == PINNED:
+                async with stage("db_insert"):
+                    await asyncio.to_thread(self._insert_document, entry)
+                await self._advance(entry, COMPLETED)
+                await asyncio.to_thread(Path(entry["image_path"]).unlink, missing_ok=True)
+                logger.info(f"✅ [OUTBOX] Asset {entry['id']} concluído ({entry['collection']}).")
+
+        except Exception as e:
+            entry["attempts"] += 1
+            entry["error"] = str(e)
+            if entry["attempts"] >= self.max_attempts:
+                entry["status"] = FAILED
+                logger.error(f"❌ [OUTBOX] Asset {entry['id']} falhou definitivamente: {e}")
+            else:
+                entry["next_attempt_at"] = time.time() + min(300, 2 ** entry["attempts"])
+                logger.warning(f"⚠️ [OUTBOX] Falha no asset {entry['id']} (tentativa {entry['attempts']}): {e}")
+            entry["updated_at"] = _now()
+            try:
+                await asyncio.to_thread(self.store.save, entry)
+            except Exception as save_error:
+                logger.error(f"❌ [OUTBOX] Falha ao registrar erro do asset {entry['id']}: {save_error}")
+        finally:
+            self._in_progress.discard(entry["id"])
+
+    async def _advance(self, entry: Dict[str, Any], status: str):
+        entry["status"] = status
+        entry["error"] = None
+        entry["updated_at"] = _now()
+        await asyncio.to_thread(self.store.save, entry)
+
+    async def _pin_to_ipfs(self, entry: Dict[str, Any], image_bytes: bytes) -> Optional[str]:
+        pinata_api_key = os.getenv("PINATA_API_KEY")
+        pinata_secret_api_key = os.getenv("PINATA_SECRET_API_KEY")
+        if not (pinata_api_key and pinata_secret_api_key):
+            logger.warning("⚠️ [IPFS] PINATA_API_KEY ou PINATA_SECRET_API_KEY não configurados no .env!")
+            return None
+
+        response = await self.http_client_factory().post(
+            PINATA_ENDPOINT,
+            files={"file": (f"{entry['public_id']}.png", image_bytes, "image/png")},
+            headers={
+                "pinata_api_key": pinata_api_key,
+                "pinata_secret_api_key": pinata_secret_api_key,
+            },
+        )
+        if response.status_code != 200:
+            raise Exception(f"Pinata respondeu {response.status_code}: {response.text[:200]}")
+        ipfs_url = f"https://gateway.pinata.cloud/ipfs/{response.json()['IpfsHash']}"
+        logger.info(f"✅ [IPFS] Upload concluído: {ipfs_url}")
+        return ipfs_url
+
+    def _insert_document(self, entry: Dict[str, Any]):
+        db = self.get_db()
+        if db is None:
+            raise Exception("Database connection is not available.")
+        document = dict(entry["document"])
+        document["imageUrl"] = entry["ipfs_url"] or entry["cloudinary_url"]
+        if entry["pin_to_ipfs"]:
+            document["cloudinaryUrl"] = entry["cloudinary_url"]
+        document["createdAt"] = datetime.fromisoformat(entry["created_at"]).replace(tzinfo=None)
+        document["assetId"] = entry["id"]
+        # Idempotente: um retry após um insert bem-sucedido não duplica o documento
+        db[entry["collection"]].update_one(
+            {"assetId": entry["id"]}, {"$setOnInsert": document}, upsert=True
+        )
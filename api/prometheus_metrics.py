@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Métricas Prometheus compartilhadas por todas as APIs de api/
+instrument_app(app, nome) adiciona o middleware (latência e requisições em andamento
+por rota, custo estimado a partir dos cost_usd das respostas) e o endpoint /metrics.
+As etapas do pipeline (Mongo, Vision, prompt, DALL-E, download, Cloudinary, Pinata,
+insert) são medidas com `with stage("nome"):` / `async with stage("nome"):`, e os caches
+registrados com register_cache() aparecem com hits, misses e hit ratio.
+Com vários workers do uvicorn, configure PROMETHEUS_MULTIPROC_DIR (modo multiprocess
+do prometheus_client).
+"""
+import os
+import re
+import time
+from typing import Any, Callable, Dict
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Match
+
+import tracing
+
+# Chamadas a provedores de imagem levam dezenas de segundos: buckets até 2 min
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Latência das requisições HTTP por rota",
+    ("app", "method", "route", "status"), buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requisições HTTP em andamento por rota", ("app", "method", "route"),
+)
+STAGE_LATENCY = Histogram(
+    "pipeline_stage_duration_seconds", "Duração de cada etapa do pipeline de geração",
+    ("stage", "outcome"), buckets=LATENCY_BUCKETS,
+)
+STAGES_IN_FLIGHT = Gauge("pipeline_stages_in_flight", "Etapas do pipeline em andamento", ("stage",))
+PROVIDER_ERRORS = Counter(
+    "provider_errors_total", "Falhas nas chamadas aos provedores (status HTTP ou tipo da exceção)",
+    ("provider", "error"),
+)
+ESTIMATED_COST = Counter(
+    "estimated_cost_usd_total", "Custo estimado (soma dos cost_usd devolvidos pelas rotas)", ("app", "route"),
+)
+
+_COST_PATTERN = re.compile(rb'"cost_usd"\s*:\s*(-?[0-9]+(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?)')
+
+
+class stage:
+    """
+    Mede uma etapa do pipeline (histograma + gauge de em andamento); funciona com with e async with.
+    Dentro de uma requisição rastreada também abre um span (tracing) com o nome da etapa.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._span = tracing.span(name, stage=True)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        STAGES_IN_FLIGHT.labels(self.name).inc()
+        self._span.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._span.__exit__(exc_type, exc, tb)
+        STAGES_IN_FLIGHT.labels(self.name).dec()
+        outcome = "success" if exc_type is None else "error"
+        STAGE_LATENCY.labels(self.name, outcome).observe(time.perf_counter() - self._start)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+def record_provider_error(provider: str, error: Any):
+    PROVIDER_ERRORS.labels(provider, str(error)).inc()
+
+
+# --- Caches ---
+_caches: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def register_cache(name: str, stats: Callable[[], Dict[str, Any]]):
+    """stats() deve devolver um dict com "hits" e "misses" (ex.: VisionAnalysisCache.stats)"""
+    _caches[name] = stats
+
+
+class _CacheCollector:
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Hits por cache", labels=("cache",))
+        misses = CounterMetricFamily("cache_misses", "Misses por cache", labels=("cache",))
+        ratio = GaugeMetricFamily("cache_hit_ratio", "Hit ratio por cache desde o início do processo", labels=("cache",))
+        for name, stats in list(_caches.items()):
+            try:
+                values = stats()
+            except Exception:
+                continue
+            total = values.get("hits", 0) + values.get("misses", 0)
+            hits.add_metric((name,), values.get("hits", 0))
+            misses.add_metric((name,), values.get("misses", 0))
+            ratio.add_metric((name,), values.get("hits", 0) / total if total else 0.0)
+        yield hits
+        yield misses
+        yield ratio
+
+
+REGISTRY.register(_CacheCollector())
+
+
+# --- Middleware + endpoint ---
+def _route_template(app, scope) -> str:
+    """Caminho da rota (/jobs/{job_id}), não o path cru, para não explodir a cardinalidade"""
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope["path"])
+    return "unmatched"
+
+
+class PrometheusMiddleware:
+    """Middleware ASGI puro: não bufferiza o corpo (streams NDJSON/SSE continuam fluindo)"""
+
+    def __init__(self, app, fastapi_app, app_name: str):
+        self.app = app
+        self.fastapi_app = fastapi_app
+        self.app_name = app_name
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        route = _route_template(self.fastapi_app, scope)
+        method = scope["method"]
+        status = {"code": 500}
+        start = time.perf_counter()
+        in_flight = REQUESTS_IN_FLIGHT.labels(self.app_name, method, route)
+        in_flight.inc()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            elif message["type"] == "http.response.body":
+                body = message.get("body", b"")
+                if b'"cost_usd"' in body:
+                    for value in _COST_PATTERN.findall(body):
+                        ESTIMATED_COST.labels(self.app_name, route).inc(max(0.0, float(value)))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            REQUEST_LATENCY.labels(self.app_name, method, route, str(status["code"])).observe(
+                time.perf_counter() - start
+            )
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        # Soma as métricas de todos os workers (os caches em memória ficam de fora nesse modo)
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def instrument_app(app, app_name: str):
+    """Adiciona o middleware de métricas e o GET /metrics a uma aplicação FastAPI"""
+    app.add_middleware(PrometheusMiddleware, fastapi_app=app, app_name=app_name)
+    app.add_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
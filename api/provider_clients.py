@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Clientes assíncronos compartilhados para os provedores externos
+Um ProviderRegistry por processo (criado no startup da aplicação) mantém pools
+keep-alive separados para OpenAI, OpenRouter, Pinata e downloads, e o pool
+urllib3 do Cloudinary dimensionado para os uploads concorrentes. Todas as
+chamadas ao DALL-E 3 e todos os downloads passam por aqui, sem bloquear o
+event loop do uvicorn. Os retries ficam só no provider_gateway (o SDK roda com
+max_retries=0), que também aplica rate limit e circuit breaker.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+from openai import AsyncOpenAI
+from dotenv import load_dotenv
+
+from provider_gateway import provider_gateway
+from prometheus_metrics import stage
+import tracing
+from structured_logging import get_logger
+
+logger = get_logger("provider_clients")
+
+load_dotenv()
+
+# Timeouts padrão (segundos)
+DALLE_TIMEOUT = float(os.getenv("DALLE_TIMEOUT", "120"))
+DOWNLOAD_TIMEOUT = float(os.getenv("IMAGE_DOWNLOAD_TIMEOUT", "60"))
+OPENROUTER_TIMEOUT = float(os.getenv("OPENROUTER_TIMEOUT", "120"))
+PINATA_TIMEOUT = float(os.getenv("PINATA_TIMEOUT", "60"))
+CLOUDINARY_TIMEOUT = float(os.getenv("CLOUDINARY_TIMEOUT", "60"))
+CONNECT_TIMEOUT = float(os.getenv("PROVIDER_CONNECT_TIMEOUT", "10"))
+
+# Tamanho dos pools (globais, sobrescritos por provedor com <PROVEDOR>_MAX_CONNECTIONS etc.)
+MAX_CONNECTIONS = int(os.getenv("PROVIDER_MAX_CONNECTIONS", "50"))
+MAX_KEEPALIVE = int(os.getenv("PROVIDER_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("PROVIDER_KEEPALIVE_EXPIRY", "30"))
+CLOUDINARY_POOL_SIZE = int(os.getenv("CLOUDINARY_POOL_SIZE", "8"))
+
+DALLE_MODEL = "dall-e-3"
+OPENROUTER_API_BASE = os.getenv("OPENROUTER_API_BASE", "https://openrouter.ai/api/v1")
+
+# Provedor → timeout de leitura padrão
+HTTP_PROVIDERS = {
+    "openai": DALLE_TIMEOUT,
+    "openrouter": OPENROUTER_TIMEOUT,
+    "pinata": PINATA_TIMEOUT,
+    "downloads": DOWNLOAD_TIMEOUT,
+}
+
+
+def _provider_setting(provider: str, name: str, default):
+    value = os.getenv(f"{provider.upper()}_{name}")
+    return type(default)(value) if value else default
+
+
+class ProviderRegistry:
+    """Clientes com pool keep-alive por provedor, com escopo de aplicação"""
+
+    def __init__(self):
+        self._http: Dict[str, httpx.AsyncClient] = {}
+        self._requests: Dict[str, int] = {name: 0 for name in HTTP_PROVIDERS}
+        for name, read_timeout in HTTP_PROVIDERS.items():
+            self._http[name] = self._build_http_client(name, read_timeout)
+        self._openai: Optional[AsyncOpenAI] = None
+        self._openrouter: Optional[AsyncOpenAI] = None
+        self._cloudinary_pool = None
+        self.configure_cloudinary()
+
+    def _build_http_client(self, name: str, read_timeout: float) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=_provider_setting(name, "MAX_CONNECTIONS", MAX_CONNECTIONS),
+            max_keepalive_connections=_provider_setting(name, "MAX_KEEPALIVE", MAX_KEEPALIVE),
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        )
+        timeout = httpx.Timeout(_provider_setting(name, "TIMEOUT", read_timeout), connect=CONNECT_TIMEOUT)
+
+        async def count_request(request: httpx.Request):
+            self._requests[name] += 1
+
+        return httpx.AsyncClient(
+            limits=limits, timeout=timeout, follow_redirects=True,
+            event_hooks={
+                "request": [count_request, tracing.on_outbound_request],
+                "response": [tracing.on_outbound_response],
+            },
+        )
+
+    # --- Clientes ---
+    def http(self, provider: str = "downloads") -> httpx.AsyncClient:
+        return self._http[provider]
+
+    @property
+    def openai(self) -> AsyncOpenAI:
+        """AsyncOpenAI (DALL-E 3) sobre o pool 'openai'"""
+        if self._openai is None:
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                raise Exception("OPENAI_API_KEY não encontrada")
+            self._openai = AsyncOpenAI(
+                api_key=api_key, timeout=self._http["openai"].timeout, http_client=self._http["openai"],
+                max_retries=0,
+            )
+        return self._openai
+
+    @property
+    def openrouter(self) -> AsyncOpenAI:
+        """AsyncOpenAI apontando para o OpenRouter (Vision), com fallback para a chave OpenAI"""
+        if self._openrouter is None:
+            api_key = os.getenv("OPENROUTER_API_KEY", os.getenv("OPENAI_API_KEY"))
+            if not api_key:
+                raise Exception("OPENROUTER_API_KEY não encontrada")
+            self._openrouter = AsyncOpenAI(
+                api_key=api_key, base_url=OPENROUTER_API_BASE,
+                timeout=self._http["openrouter"].timeout, http_client=self._http["openrouter"],
+                max_retries=0,
+            )
+        return self._openrouter
+
+    def configure_cloudinary(self):
+        """Troca o pool urllib3 do uploader (1 conexão por host por padrão) por um dimensionado"""
+        try:
+            import cloudinary
+            import cloudinary.uploader
+            from cloudinary import utils as cloudinary_utils
+
+            self._cloudinary_pool = cloudinary_utils.get_http_connector(
+                cloudinary.config(), {**cloudinary.CERT_KWARGS, "maxsize": CLOUDINARY_POOL_SIZE, "block": False}
+            )
+            cloudinary.uploader._http = self._cloudinary_pool
+        except Exception as e:
+            logger.warning(f"⚠️ [PROVIDERS] Pool do Cloudinary não configurado: {e}")
+
+    # --- Métricas ---
+    def metrics(self) -> Dict[str, Any]:
+        providers = {}
+        for name, client in self._http.items():
+            pool = getattr(client._transport, "_pool", None)
+            connections = list(getattr(pool, "connections", []))
+            providers[name] = {
+                "requests": self._requests[name],
+                "connections": len(connections),
+                "idle_connections": sum(1 for c in connections if c.is_idle()),
+                "in_flight_requests": len(getattr(pool, "_requests", [])),
+                "max_connections": getattr(pool, "_max_connections", None),
+                "max_keepalive_connections": getattr(pool, "_max_keepalive_connections", None),
+                "timeout_seconds": client.timeout.read,
+            }
+        providers["cloudinary"] = self._cloudinary_metrics()
+        return providers
+
+    def _cloudinary_metrics(self) -> Dict[str, Any]:
+        metrics = {"pool_size": CLOUDINARY_POOL_SIZE, "timeout_seconds": CLOUDINARY_TIMEOUT,
+                   "connections": 0, "idle_connections": 0, "requests": 0}
+        pools = getattr(self._cloudinary_pool, "pools", None)
+        if pools is None:
+            return metrics
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            metrics["connections"] += pool.num_connections
+            metrics["requests"] += pool.num_requests
+            metrics["idle_connections"] += pool.pool.qsize() if pool.pool is not None else 0
+        return metrics
+
+    async def aclose(self):
+        for client in self._http.values():
+            await client.aclose()
+        if self._cloudinary_pool is not None:
+            self._cloudinary_pool.clear()
+
+
+# Registro único por processo (criado no startup ou sob demanda)
+_registry: Optional[ProviderRegistry] = None
+
+
+def init_registry() -> ProviderRegistry:
+    """Cria o registro de provedores (chamado no startup da aplicação)"""
+    global _registry
+    if _registry is None:
+        _registry = ProviderRegistry()
+        logger.info("✅ [PROVIDERS] Pools de conexão dos provedores iniciados.")
+    return _registry
+
+
+def get_registry() -> ProviderRegistry:
+    return _registry if _registry is not None else init_registry()
+
+
+def get_openai_client() -> AsyncOpenAI:
+    """Retorna o cliente AsyncOpenAI compartilhado (DALL-E 3)"""
+    return get_registry().openai
+
+
+def get_openrouter_client() -> AsyncOpenAI:
+    """Retorna o cliente AsyncOpenAI do OpenRouter (Vision)"""
+    return get_registry().openrouter
+
+
+def get_http_client(provider: str = "downloads") -> httpx.AsyncClient:
+    """Retorna o httpx.AsyncClient com pool do provedor (downloads, openrouter, pinata, openai)"""
+    return get_registry().http(provider)
+
+
+async def generate_dalle3_image(
+    prompt: str,
+    size: str = "1024x1024",
+    quality: str = "standard",
+    response_format: str = "url",
+) -> Dict[str, Any]:
+    """
+    Gera uma imagem com DALL-E 3 sem bloquear o event loop.
+    Retorna {"url": ..., "b64_json": ..., "revised_prompt": ...}.
+    """
+    client = get_openai_client()
+    # Geração não é idempotente (é cobrada): só 429 e falhas de conexão são repetidos
+    async with stage("dalle_call"):
+        response = await provider_gateway.call(
+            "openai",
+            lambda: client.images.generate(
+                model=DALLE_MODEL,
+                prompt=prompt,
+                size=size,
+                quality=quality,
+                n=1,
+                response_format=response_format,
+            ),
+            idempotent=False,
+            images=1,
+        )
+    image = response.data[0]
+    return {
+        "url": image.url,
+        "b64_json": image.b64_json,
+        "revised_prompt": getattr(image, "revised_prompt", None),
+    }
+
+
+async def provider_request(provider: str, method: str, url: str, *, idempotent: bool,
+                           images: int = 0, **kwargs) -> httpx.Response:
+    """Requisição HTTP crua a um provedor (ex.: OpenRouter) passando pelo gateway"""
+    client = get_http_client(provider)
+    return await provider_gateway.call(
+        provider, lambda: client.request(method, url, **kwargs), idempotent=idempotent, images=images
+    )
+
+
+async def download_image(url: str, timeout: Optional[float] = None) -> bytes:
+    """Baixa uma imagem gerada e retorna os bytes brutos"""
+    client = get_http_client()
+    async with stage("download"):
+        response = await provider_gateway.call(
+            "downloads", lambda: client.get(url, timeout=timeout or DOWNLOAD_TIMEOUT), idempotent=True
+        )
+    if response.status_code != 200:
+        raise Exception(f"Erro ao baixar imagem: {response.status_code}")
+    return response.content
+
+
+class ImageRateLimiter:
+    """Espaça as chamadas para respeitar um limite de imagens por minuto (0 = sem limite)"""
+
+    def __init__(self, images_per_minute: int = 0):
+        self.interval = 60.0 / images_per_minute if images_per_minute else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+async def close_clients():
+    """Fecha os pools dos provedores (usado no shutdown da API)"""
+    global _registry
+    if _registry is not None:
+        await _registry.aclose()
+        _registry = None
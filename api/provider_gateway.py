@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Gateway das chamadas aos provedores (OpenAI, OpenRouter, downloads)
+Toda chamada passa por três camadas:
+- token bucket por chave de API (requisições/min e imagens/min), que também respeita
+  o Retry-After recebido num 429 — o burst espera na fila em vez de martelar o provedor;
+- retries com backoff exponencial + jitter: 429 e falhas de conexão (requisição não enviada)
+  sempre; 5xx e timeouts de leitura só para operações idempotentes;
+- circuit breaker por provedor: depois de N falhas seguidas, responde 503 com Retry-After
+  na hora, até uma chamada de teste (half-open) passar.
+"""
+import asyncio
+import email.utils
+import hashlib
+import math
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+from fastapi import HTTPException
+from openai import APIConnectionError, APIStatusError, APITimeoutError
+
+from prometheus_metrics import record_provider_error
+from structured_logging import get_logger
+
+logger = get_logger("provider_gateway")
+
+MAX_RETRIES = int(os.getenv("PROVIDER_MAX_RETRIES", "3"))
+RETRY_BASE_DELAY = float(os.getenv("PROVIDER_RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("PROVIDER_RETRY_MAX_DELAY", "20"))
+MAX_WAIT_SECONDS = float(os.getenv("PROVIDER_MAX_WAIT_SECONDS", "30"))  # acima disso, 503 em vez de esperar
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+# Provedor → variáveis com a chave de API (o bucket é por chave)
+PROVIDER_KEY_ENV = {
+    "openai": ("OPENAI_API_KEY",),
+    "openrouter": ("OPENROUTER_API_KEY", "OPENAI_API_KEY"),
+}
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def _limit(provider: str, name: str) -> float:
+    """<PROVEDOR>_REQUESTS_PER_MINUTE / <PROVEDOR>_IMAGES_PER_MINUTE (0 = sem limite)"""
+    return float(os.getenv(f"{provider.upper()}_{name}", "0"))
+
+
+def _key_id(provider: str) -> str:
+    for env in PROVIDER_KEY_ENV.get(provider, ()):
+        api_key = os.getenv(env)
+        if api_key:
+            return f"{provider}:{hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:8]}"
+    return provider
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """Segundos de espera pedidos pelo provedor (retry-after-ms, Retry-After em segundos ou data HTTP)"""
+    if headers is None:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ProviderUnavailable(HTTPException):
+    """503 com Retry-After: circuito aberto, fila longa demais ou 429 persistente"""
+
+    def __init__(self, provider: str, reason: str, retry_after: float):
+        retry_after = max(1, math.ceil(retry_after))
+        super().__init__(
+            status_code=503,
+            detail=f"Provedor '{provider}' indisponível ({reason}). Tente novamente em {retry_after}s.",
+            headers={"Retry-After": str(retry_after)},
+        )
+        self.provider = provider
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Bucket por minuto com reserva: quem chega reserva o próximo token e espera a sua vez"""
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, cost: float, max_wait: float, provider: str) -> float:
+        """Reserva cost tokens e retorna quantos segundos esperar (503 se passar de max_wait)"""
+        now = time.monotonic()
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.rate:
+            self.tokens -= cost
+            if self.tokens < 0:
+                wait = max(wait, -self.tokens / self.rate)
+        if wait > max_wait:
+            if self.rate:
+                self.tokens += cost
+            raise ProviderUnavailable(provider, "limite de taxa", wait)
+        return wait
+
+    def block(self, seconds: float):
+        """Retry-After recebido: ninguém usa esta chave até lá"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill(time.monotonic())
+        return {
+            "per_minute": self.per_minute,
+            "tokens": round(self.tokens, 2) if self.rate else None,
+            "blocked_for_seconds": round(max(0.0, self.blocked_until - time.monotonic()), 2),
+        }
+
+
+class CircuitBreaker:
+    """closed → open (após N falhas seguidas) → half_open (1 chamada de teste) → closed"""
+
+    def __init__(self, provider: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+
+    def before_call(self):
+        if self.state == "open":
+            remaining = self.opened_at + self.reset_seconds - time.monotonic()
+            if remaining > 0:
+                raise ProviderUnavailable(self.provider, "circuito aberto", remaining)
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                raise ProviderUnavailable(self.provider, "circuito em teste", 1)
+            self._probe_in_flight = True
+
+    def record_success(self):
+        self._probe_in_flight = False
+        self.consecutive_failures = 0
+        if self.state != "closed":
+            logger.info(f"✅ [GATEWAY] Circuito de '{self.provider}' fechado.")
+        self.state = "closed"
+
+    def record_failure(self):
+        self._probe_in_flight = False
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                logger.warning(f"🔴 [GATEWAY] Circuito de '{self.provider}' aberto por {self.reset_seconds}s "
+                               f"({self.consecutive_failures} falhas seguidas).")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """Chamada terminou sem dizer nada sobre a saúde do provedor (ex.: 429)"""
+        self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        retry_in = max(0.0, self.opened_at + self.reset_seconds - time.monotonic()) if self.state == "open" else 0.0
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "times_opened": self.times_opened,
+            "retry_in_seconds": round(retry_in, 2),
+        }
+
+
+def _classify(outcome: Any) -> Dict[str, Any]:
+    """Status, Retry-After e se a requisição chegou ao provedor (status -1 = erro fora do provedor)"""
+    if isinstance(outcome, httpx.Response):
+        return {"status": outcome.status_code, "retry_after": parse_retry_after(outcome.headers), "sent": True}
+    if isinstance(outcome, APIStatusError):
+        return {"status": outcome.status_code, "retry_after": parse_retry_after(outcome.response.headers), "sent": True}
+    if isinstance(outcome, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return {"status": None, "retry_after": None, "sent": False}
+    if isinstance(outcome, (httpx.TransportError, APIConnectionError, APITimeoutError)):
+        # O SDK da OpenAI não distingue conexão de leitura: trata como enviada
+        return {"status": None, "retry_after": None, "sent": True}
+    return {"status": -1, "retry_after": None, "sent": True}
+
+
+class ProviderGateway:
+    """Rate limit + retries + circuit breaker para as chamadas aos provedores"""
+
+    def __init__(self, max_retries: int = MAX_RETRIES, max_wait: float = MAX_WAIT_SECONDS):
+        self.max_retries = max_retries
+        self.max_wait = max_wait
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def _bucket(self, key_id: str, provider: str, kind: str) -> TokenBucket:
+        name = f"{key_id}:{kind}"
+        if name not in self._buckets:
+            self._buckets[name] = TokenBucket(_limit(provider, f"{kind.upper()}_PER_MINUTE"))
+        return self._buckets[name]
+
+    def _breaker(self, provider: str) -> CircuitBreaker:
+        if provider not in self._breakers:
+            self._breakers[provider] = CircuitBreaker(provider)
+        return self._breakers[provider]
+
+    def circuit_state(self, provider: str) -> str:
+        """Estado atual do circuito (um circuito aberto cujo prazo venceu já aceita o teste)"""
+        breaker = self._breakers.get(provider)
+        if breaker is None:
+            return "closed"
+        if breaker.state == "open" and breaker.stats()["retry_in_seconds"] <= 0:
+            return "half_open"
+        return breaker.state
+
+    def _count(self, provider: str, name: str):
+        counters = self._counters.setdefault(
+            provider, {"calls": 0, "attempts": 0, "retries": 0, "rate_limited": 0, "failures": 0, "shed": 0}
+        )
+        counters[name] += 1
+
+    async def _acquire(self, provider: str, key_id: str, images: int):
+        wait = self._bucket(key_id, provider, "requests").reserve(1, self.max_wait, provider)
+        if images:
+            wait = max(wait, self._bucket(key_id, provider, "images").reserve(images, self.max_wait, provider))
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def call(self, provider: str, operation: Callable[[], Awaitable[Any]], *,
+                   idempotent: bool, images: int = 0) -> Any:
+        """
+        Executa operation() com rate limit, retries e circuit breaker.
+        Respostas httpx com status de erro são devolvidas ao chamador depois dos retries
+        (como antes); 429 persistente e circuito aberto viram ProviderUnavailable (503).
+        """
+        key_id = _key_id(provider)
+        breaker = self._breaker(provider)
+        self._count(provider, "calls")
+        attempt = 0
+        while True:
+            try:
+                breaker.before_call()
+            except ProviderUnavailable:
+                self._count(provider, "shed")
+                record_provider_error(provider, "circuit_open")
+                raise
+            try:
+                await self._acquire(provider, key_id, images)
+            except (ProviderUnavailable, asyncio.CancelledError) as e:
+                breaker.release()
+                if isinstance(e, ProviderUnavailable):
+                    self._count(provider, "shed")
+                raise
+
+            self._count(provider, "attempts")
+            error: Optional[BaseException] = None
+            try:
+                outcome = await operation()
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                error, outcome = e, e
+
+            if error is None and not isinstance(outcome, httpx.Response):
+                breaker.record_success()
+                return outcome
+            info = _classify(outcome)
+            status = info["status"]
+            if status == -1:
+                # Erro que não veio do provedor (ex.: parsing): não conta para o circuito
+                breaker.release()
+                raise error
+            if status is not None and status not in RETRYABLE_STATUS:
+                # Sucesso ou erro do cliente (4xx): o provedor está saudável
+                breaker.record_success()
+                if status >= 400:
+                    record_provider_error(provider, status)
+                if error is not None:
+                    raise error
+                return outcome
+            record_provider_error(provider, status or type(error).__name__)
+
+            if status == 429:
+                self._count(provider, "rate_limited")
+                breaker.release()
+                delay = info["retry_after"] if info["retry_after"] is not None else self._backoff(attempt)
+                self._bucket(key_id, provider, "requests").block(delay)
+            else:
+                self._count(provider, "failures")
+                breaker.record_failure()
+                delay = self._backoff(attempt)
+
+            retryable = status == 429 or not info["sent"] or idempotent
+            if not retryable or attempt >= self.max_retries or delay > self.max_wait:
+                if status == 429:
+                    self._count(provider, "shed")
+                    raise ProviderUnavailable(provider, "limite de taxa do provedor", delay)
+                if error is not None:
+                    raise error
+                return outcome
+
+            attempt += 1
+            self._count(provider, "retries")
+            logger.warning(f"🔁 [GATEWAY] {provider}: {status or type(error).__name__} — tentativa {attempt + 1} "
+                           f"em {delay:.1f}s")
+            # Depois de um 429, a espera acontece no bucket (compartilhada por toda a fila)
+            if status != 429:
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """Full jitter: uniforme entre 0 e base * 2^tentativa (limitado)"""
+        return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+    def stats(self) -> Dict[str, Any]:
+        providers = {}
+        for provider in sorted(set(self._counters) | set(self._breakers)):
+            providers[provider] = {
+                **self._counters.get(provider, {}),
+                "circuit": self._breaker(provider).stats(),
+                "buckets": {name: bucket.stats() for name, bucket in self._buckets.items()
+                            if name.split(":", 1)[0] == provider},
+            }
+        return {
+            "max_retries": self.max_retries,
+            "max_wait_seconds": self.max_wait,
+            "providers": providers,
+        }
+
+
+# Instância compartilhada pelo processo
+provider_gateway = ProviderGateway()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Roteamento entre OpenRouter e OpenAI direto, com hedge e failover
+Para cada tipo de chamada (vision, image) mantém uma janela das últimas latências e
+erros por provedor. A chamada vai para o provedor saudável mais rápido (p50); se não
+responder até o p95 dele, uma cópia (hedge) é disparada no outro provedor e a primeira
+resposta vence — a outra é cancelada. Erros do provedor (5xx, timeout, 503 do gateway)
+disparam o próximo provedor na hora. Erros do cliente (4xx) são devolvidos sem failover.
+Obs.: uma geração cancelada pode já ter sido cobrada pelo provedor.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from provider_gateway import provider_gateway, ProviderUnavailable
+from structured_logging import get_logger
+
+logger = get_logger("provider_router")
+
+ROUTER_WINDOW = int(os.getenv("ROUTER_WINDOW", "200"))
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "10"))
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.5"))
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "15"))  # sem amostras suficientes
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "1"))
+HEDGE_MAX_DELAY = float(os.getenv("HEDGE_MAX_DELAY", "60"))
+
+# "auto" = roteamento com hedge; outro valor mantém o provedor fixo de antes
+VISION_ROUTING_MODE = os.getenv("VISION_ROUTING_MODE", "auto")
+IMAGE_ROUTING_MODE = os.getenv("IMAGE_ROUTING_MODE", "manual")
+
+# Erros do cliente que se repetiriam em qualquer provedor (não fazem failover)
+_CLIENT_ERRORS = range(400, 500)
+_PROVIDER_SPECIFIC = {401, 403, 404, 408, 429}
+
+
+def _is_provider_fault(error: BaseException) -> bool:
+    status = getattr(error, "status_code", None)
+    return not (isinstance(status, int) and status in _CLIENT_ERRORS and status not in _PROVIDER_SPECIFIC)
+
+
+class LatencyWindow:
+    """Últimas N chamadas de um provedor: latência e se falhou"""
+
+    def __init__(self, size: int = ROUTER_WINDOW):
+        self.samples: deque = deque(maxlen=size)
+
+    def record(self, seconds: float, ok: bool):
+        self.samples.append((seconds, ok))
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        latencies = sorted(seconds for seconds, ok in self.samples if ok)
+        if len(latencies) < ROUTER_MIN_SAMPLES:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+    @property
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def stats(self) -> Dict[str, Any]:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            "samples": len(self.samples),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "error_rate": round(self.error_rate, 4),
+        }
+
+
+class ProviderRouter:
+    """Escolhe o provedor mais rápido e saudável e faz hedge/failover para o outro"""
+
+    def __init__(self):
+        self._windows: Dict[Tuple[str, str], LatencyWindow] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def _window(self, kind: str, provider: str) -> LatencyWindow:
+        key = (kind, provider)
+        if key not in self._windows:
+            self._windows[key] = LatencyWindow()
+        return self._windows[key]
+
+    def _count(self, kind: str, name: str):
+        counters = self._counters.setdefault(kind, {"calls": 0, "hedges": 0, "secondary_wins": 0, "failovers": 0})
+        counters[name] += 1
+
+    def healthy(self, kind: str, provider: str) -> bool:
+        window = self._window(kind, provider)
+        if len(window.samples) >= ROUTER_MIN_SAMPLES and window.error_rate > ROUTER_MAX_ERROR_RATE:
+            return False
+        return provider_gateway.circuit_state(provider) != "open"
+
+    def rank(self, kind: str, providers: List[str]) -> List[str]:
+        """Saudáveis primeiro, do menor p50 para o maior; sem amostras suficientes o provedor
+        vai na frente (otimista) até ter histórico"""
+        def sort_key(item):
+            position, provider = item
+            p50 = self._window(kind, provider).percentile(0.5)
+            return (not self.healthy(kind, provider), p50 if p50 is not None else 0.0, position)
+        return [provider for _, provider in sorted(enumerate(providers), key=sort_key)]
+
+    def hedge_delay(self, kind: str, provider: str) -> float:
+        delay = self._window(kind, provider).percentile(HEDGE_PERCENTILE)
+        if delay is None:
+            delay = HEDGE_DEFAULT_DELAY
+        return min(HEDGE_MAX_DELAY, max(HEDGE_MIN_DELAY, delay))
+
+    async def _timed(self, kind: str, provider: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        start = time.perf_counter()
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._window(kind, provider).record(time.perf_counter() - start, ok=not _is_provider_fault(e))
+            raise
+        self._window(kind, provider).record(time.perf_counter() - start, ok=True)
+        return result
+
+    async def run(self, kind: str, candidates: Dict[str, Callable[[], Awaitable[Any]]]) -> Tuple[str, Any]:
+        """Executa a chamada nos candidatos (provedor → factory); retorna (provedor vencedor, resultado)"""
+        if not candidates:
+            raise ProviderUnavailable(kind, "nenhum provedor configurado", HEDGE_DEFAULT_DELAY)
+        self._count(kind, "calls")
+        order = self.rank(kind, list(candidates))
+        primary, backups = order[0], order[1:]
+        running: Dict[asyncio.Task, str] = {}
+
+        def launch(provider: str):
+            running[asyncio.create_task(self._timed(kind, provider, candidates[provider]))] = provider
+
+        launch(primary)
+        loop = asyncio.get_running_loop()
+        hedge_at = loop.time() + self.hedge_delay(kind, primary)
+        last_error: Optional[BaseException] = None
+        try:
+            while running:
+                timeout = max(0.0, hedge_at - loop.time()) if backups else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    provider = backups.pop(0)
+                    logger.info(f"🪁 [ROUTER] {kind}: '{primary}' passou do p95, hedge em '{provider}'.")
+                    self._count(kind, "hedges")
+                    launch(provider)
+                    hedge_at = loop.time() + self.hedge_delay(kind, provider)
+                    continue
+                for task in done:
+                    finished = running.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        if finished != primary:
+                            self._count(kind, "secondary_wins")
+                        return finished, task.result()
+                    if not _is_provider_fault(error):
+                        raise error
+                    last_error = error
+                    if backups and not running:
+                        provider = backups.pop(0)
+                        logger.warning(f"🔀 [ROUTER] {kind}: falha em '{finished}' ({error}), failover para '{provider}'.")
+                        self._count(kind, "failovers")
+                        launch(provider)
+                        hedge_at = loop.time() + self.hedge_delay(kind, provider)
+            raise last_error
+        finally:
+            for task in running:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        kinds: Dict[str, Any] = {}
+        for (kind, provider), window in self._windows.items():
+            entry = kinds.setdefault(kind, {**self._counters.get(kind, {}), "providers": {}})
+            entry["providers"][provider] = {
+                **window.stats(),
+                "healthy": self.healthy(kind, provider),
+                "hedge_delay_ms": round(self.hedge_delay(kind, provider) * 1000, 1),
+            }
+        return {"vision_routing": VISION_ROUTING_MODE, "image_routing": IMAGE_ROUTING_MODE, "kinds": kinds}
+
+
+# Instância compartilhada pelo processo
+provider_router = ProviderRouter()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Catálogo em memória das listagens de referência (/stadiums, /badges, /teams)
+Cada listagem é montada uma vez e servida do cache com ETag; o navegador revalida
+com If-None-Match e recebe 304. O cache é invalidado pelos endpoints /api/admin/*,
+por change streams do MongoDB (quando há replica set) e, como fallback, por polling
+de um contador de versão (coleção reference_catalog_versions), da assinatura de cada
+coleção observada (contagem + maior _id + maior updatedAt, pega as edições feitas direto
+pelo studio) e do mtime das pastas locais. O corpo local ainda expira em CATALOG_CACHE_TTL.
+O JSON montado também vai para o namespace "reference_catalog" de cache_backend (chave =
+listagem + versão), assim com CACHE_BACKEND=sqlite/redis só um worker consulta o MongoDB.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import Request, Response
+
+from cache_backend import cache_namespace
+from structured_logging import get_logger
+
+logger = get_logger("reference_catalog")
+
+CATALOG_POLL_SECONDS = float(os.getenv("CATALOG_POLL_SECONDS", "30"))
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "600"))  # rede de segurança (local e compartilhado)
+VERSIONS_COLLECTION = "reference_catalog_versions"
+
+
+class CatalogEntry:
+    def __init__(self, loader: Callable[[], Awaitable[Any]], collection: Optional[str],
+                 source_version: Optional[Callable[[], Any]]):
+        self.loader = loader
+        self.collection = collection
+        self.source_version = source_version
+        self.lock = asyncio.Lock()
+        self.body: Optional[bytes] = None
+        self.etag: Optional[str] = None
+        self.version: Any = None
+        self.loaded_at = 0.0
+
+
+class ReferenceCatalog:
+    """Cache das listagens com invalidação por admin, change stream ou polling"""
+
+    def __init__(self, db=None, poll_seconds: float = CATALOG_POLL_SECONDS):
+        self.db = db  # banco async (AsyncMongoClient) ou None
+        self.poll_seconds = poll_seconds
+        self._entries: Dict[str, CatalogEntry] = {}
+        self._versions: Dict[str, int] = {}
+        self._tasks = []
+        self.mode = "polling"
+        self.shared = cache_namespace("reference_catalog", CATALOG_CACHE_TTL)
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.refreshes = 0
+
+    def register(self, name: str, loader: Callable[[], Awaitable[Any]], collection: Optional[str] = None,
+                 source_version: Optional[Callable[[], Any]] = None):
+        """collection = coleção Mongo observada; source_version = token de versão de uma fonte local"""
+        self._entries[name] = CatalogEntry(loader, collection, source_version)
+
+    # --- Leitura ---
+    async def get(self, name: str) -> CatalogEntry:
+        entry = self._entries[name]
+        if entry.body is not None and time.monotonic() - entry.loaded_at > CATALOG_CACHE_TTL:
+            entry.body = None
+        if entry.body is not None:
+            self.hits += 1
+            return entry
+        async with entry.lock:
+            if entry.body is None:
+                version = await self._source_version(entry)
+                body = await self.shared.aget_bytes(self._shared_key(name, version))
+                if body is not None:
+                    self.hits += 1
+                    self.shared_hits += 1
+                else:
+                    self.misses += 1
+                    data = await entry.loader()
+                    body = json.dumps(data, default=str, ensure_ascii=False).encode("utf-8")
+                    await self.shared.aset_bytes(self._shared_key(name, version), body)
+                    self.refreshes += 1
+                entry.body = body
+                entry.etag = f'"{hashlib.sha1(entry.body).hexdigest()}"'
+                entry.version = version
+                entry.loaded_at = time.monotonic()
+        return entry
+
+    async def _source_version(self, entry: CatalogEntry) -> Any:
+        if entry.source_version is not None:
+            return entry.source_version()
+        if entry.collection is None or self.db is None:
+            return None
+        try:
+            return await self._collection_signature(entry.collection)
+        except Exception as e:
+            logger.warning(f"⚠️ [CATALOG] Falha ao ler assinatura de '{entry.collection}': {e}")
+            return None
+
+    async def _collection_signature(self, collection: str) -> str:
+        """Contagem + maior _id + maior updatedAt: muda com insert, delete e update feitos por qualquer cliente"""
+        pipeline = [{"$group": {"_id": None, "count": {"$sum": 1}, "lastId": {"$max": "$_id"},
+                                "updatedAt": {"$max": "$updatedAt"}}}]
+        cursor = await self.db[collection].aggregate(pipeline)
+        docs = await cursor.to_list(1)
+        if not docs:
+            return "empty"
+        doc = docs[0]
+        raw = f"{doc['count']}:{doc.get('lastId')}:{doc.get('updatedAt')}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+    def _shared_key(self, name: str, source_version: Any) -> str:
+        return f"{name}:{self._versions.get(name, 0)}:{source_version}"
+
+    async def response(self, name: str, request: Request) -> Response:
+        """JSON da listagem com ETag; 304 quando If-None-Match confere"""
+        entry = await self.get(name)
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+        if request.headers.get("if-none-match") == entry.etag:
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    # --- Invalidação ---
+    async def invalidate(self, name: Optional[str] = None):
+        stale = []
+        for entry_name, entry in self._entries.items():
+            if name is None or entry_name == name:
+                stale.append(self._shared_key(entry_name, entry.version))
+                entry.body = None
+        # Também no cache compartilhado (o worker que recebeu o evento pode nunca ter montado a listagem)
+        for key in stale:
+            await self.shared.adelete(key)
+
+    async def bump(self, name: str):
+        """Invalida localmente e incrementa o contador de versão (visto pelos outros processos)"""
+        await self.invalidate(name)
+        if self.db is None:
+            return
+        try:
+            result = await self.db[VERSIONS_COLLECTION].find_one_and_update(
+                {"_id": name}, {"$inc": {"version": 1}}, upsert=True, return_document=True
+            )
+            self._versions[name] = result["version"]
+        except Exception as e:
+            logger.warning(f"⚠️ [CATALOG] Falha ao incrementar versão de '{name}': {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "cached": sorted(name for name, entry in self._entries.items() if entry.body is not None),
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "refreshes": self.refreshes,
+        }
+
+    # --- Refresh em background ---
+    async def start(self):
+        try:
+            await self._check_versions()
+        except Exception as e:
+            logger.warning(f"⚠️ [CATALOG] Falha ao ler versões iniciais: {e}")
+        self._tasks.append(asyncio.create_task(self._poll()))
+        if self.db is not None:
+            self._tasks.append(asyncio.create_task(self._watch()))
+        logger.info(f"✅ [CATALOG] Catálogo de referências iniciado ({len(self._entries)} listagens).")
+
+    def attach_db(self, db):
+        """Banco conectado depois do start(): passa a ler versões dele e abre o change stream"""
+        self.db = db
+        if self._tasks:
+            self._tasks.append(asyncio.create_task(self._watch()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _watch(self):
+        """Change stream nas coleções observadas (exige replica set; senão fica só o polling)"""
+        collections = {entry.collection: name for name, entry in self._entries.items() if entry.collection}
+        pipeline = [{"$match": {"ns.coll": {"$in": list(collections)}}}]
+        try:
+            async with await self.db.watch(pipeline) as stream:
+                self.mode = "change_stream"
+                logger.info("✅ [CATALOG] Change stream ativo para as coleções de referência.")
+                async for change in stream:
+                    await self.invalidate(collections.get(change.get("ns", {}).get("coll")))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.mode = "polling"
+            logger.info(f"ℹ️ [CATALOG] Change streams indisponíveis ({e}). Usando polling a cada {self.poll_seconds}s.")
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                await self._check_versions()
+            except Exception as e:
+                logger.warning(f"⚠️ [CATALOG] Falha no polling de versões: {e}")
+
+    async def _check_versions(self):
+        for name, entry in self._entries.items():
+            if entry.body is not None and entry.source_version is not None:
+                if entry.source_version() != entry.version:
+                    await self.invalidate(name)
+        if self.db is None:
+            return
+        for name, entry in self._entries.items():
+            if entry.body is not None and entry.collection and self.mode == "polling":
+                if await self._collection_signature(entry.collection) != entry.version:
+                    logger.info(f"🔄 [CATALOG] '{entry.collection}' mudou; invalidando '{name}'.")
+                    await self.invalidate(name)
+        async for doc in self.db[VERSIONS_COLLECTION].find({}):
+            name, version = doc["_id"], doc.get("version", 0)
+            if self._versions.get(name) != version:
+                if name in self._versions:
+                    await self.invalidate(name)
+                self._versions[name] = version
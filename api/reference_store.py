@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Acesso assíncrono às coleções de referência (times, estádios e emblemas)
+As buscas "case-insensitive" usam igualdade nos campos originais (teamName, stadiumId,
+badgeId) com collation de força 2 (ignora maiúsculas/minúsculas), servida por índices
+com a mesma collation — em vez de regex ancorada com $options "i", que faz scan da
+coleção inteira. Nada derivado é gravado nos documentos: o que o studio (Next.js)
+insere ou renomeia direto no Mongo já é encontrado na próxima busca.
+"""
+from typing import Any, Dict, List, Optional
+
+from pymongo import ASCENDING, AsyncMongoClient
+from pymongo.errors import OperationFailure
+
+from prometheus_metrics import stage
+from structured_logging import get_logger
+
+logger = get_logger("reference_store")
+
+# Coleção → campos pesquisáveis (o primeiro é o identificador)
+REFERENCE_COLLECTIONS = {
+    "team_references": ("teamName",),
+    "stadium_references": ("stadiumId", "teamName"),
+    "badge_references": ("badgeId", "teamName"),
+}
+
+# Igualdade sem diferenciar maiúsculas/minúsculas; consulta e índice precisam da mesma collation
+CASE_INSENSITIVE = {"locale": "en", "strength": 2}
+
+
+def normalize_key(value: Any) -> str:
+    return str(value).strip()
+
+
+class ReferenceRepository:
+    """Camada de dados async (PyMongo Async API) para as coleções de referência"""
+
+    def __init__(self, db):
+        self.db = db
+
+    @classmethod
+    def from_uri(cls, uri: str, db_name: str) -> "ReferenceRepository":
+        return cls(AsyncMongoClient(uri)[db_name])
+
+    async def ensure_indexes(self):
+        """Índices case-insensitive nos campos pesquisáveis; remove as chaves derivadas antigas (idempotente)"""
+        for collection, fields in REFERENCE_COLLECTIONS.items():
+            coll = self.db[collection]
+            for field in fields:
+                await coll.create_index([(field, ASCENDING)], name=f"{field}_ci", collation=CASE_INSENSITIVE)
+                # Versão anterior gravava <campo>Key no documento e indexava esse campo
+                legacy = f"{field}Key"
+                try:
+                    await coll.drop_index(f"{legacy}_1")
+                except OperationFailure:
+                    pass
+                await coll.update_many({legacy: {"$exists": True}}, {"$unset": {legacy: ""}})
+        logger.info("✅ [REFERENCES] Índices das coleções de referência verificados.")
+
+    # --- Leitura ---
+    async def find(self, collection: str, name: str) -> Optional[Dict[str, Any]]:
+        """Busca case-insensitive por qualquer um dos campos pesquisáveis da coleção"""
+        key = normalize_key(name)
+        fields = REFERENCE_COLLECTIONS[collection]
+        if len(fields) == 1:
+            query = {fields[0]: key}
+        else:
+            query = {"$or": [{field: key} for field in fields]}
+        async with stage("mongo_lookup"):
+            return await self.db[collection].find_one(query, collation=CASE_INSENSITIVE)
+
+    async def get(self, collection: str, reference_id: str) -> Optional[Dict[str, Any]]:
+        """Busca pelo identificador da coleção (stadiumId, badgeId, teamName)"""
+        async with stage("mongo_lookup"):
+            return await self.db[collection].find_one(self._id_query(collection, reference_id),
+                                                      collation=CASE_INSENSITIVE)
+
+    async def list(self, collection: str, projection: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+        async with stage("mongo_lookup"):
+            return await self.db[collection].find({}, projection).to_list(length=None)
+
+    # --- Escrita (admin) ---
+    async def insert(self, collection: str, document: Dict[str, Any]):
+        return await self.db[collection].insert_one(document)
+
+    async def update(self, collection: str, reference_id: str, update_data: Dict[str, Any]):
+        return await self.db[collection].update_one(
+            self._id_query(collection, reference_id), {"$set": update_data}, collation=CASE_INSENSITIVE,
+        )
+
+    async def delete(self, collection: str, reference_id: str):
+        return await self.db[collection].delete_one(self._id_query(collection, reference_id),
+                                                    collation=CASE_INSENSITIVE)
+
+    @staticmethod
+    def _id_query(collection: str, reference_id: str) -> Dict[str, str]:
+        return {REFERENCE_COLLECTIONS[collection][0]: normalize_key(reference_id)}
@@ -1,17 +1,16 @@
 """
 Arquivo de inicialização para API Principal
-Sistema de geração de Jerseys + Stadiums + Teams
+Processo único (server.py) com os subsistemas de API_SUBSYSTEMS (padrão: core + badges)
 """
 import os
 import uvicorn
-from main import app
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
-    print(f"🚀 Starting Main API (Jerseys + Stadiums) on port {port}")
+    print(f"🚀 Starting Main API (subsistemas: {os.environ.get('API_SUBSYSTEMS', 'core,badges')}) on port {port}")
     uvicorn.run(
-        "main:app",
+        "server:app",
         host="0.0.0.0",
         port=port,
         log_level="info"
-    ) 
\ No newline at end of file
+    )
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+"""
+Diretório único do estado de runtime da API
+Arquivos SQLite (jobs, outbox, cache), blobs, caches em disco, bases de camisa e traces
+ficam em API_DATA_DIR por padrão (api/data, ignorado pelo git), e não no diretório de
+trabalho do processo. Cada caminho ainda pode ser trocado pela própria variável de ambiente.
+"""
+import os
+from pathlib import Path
+
+API_DATA_DIR = Path(os.getenv("API_DATA_DIR") or Path(__file__).resolve().parent / "data")
+
+
+def data_path(name: str) -> Path:
+    """Caminho padrão de um arquivo/diretório de runtime dentro de API_DATA_DIR"""
+    return API_DATA_DIR / name
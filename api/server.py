@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Processo único da API: uma aplicação FastAPI montada a partir dos routers dos subsistemas
+API_SUBSYSTEMS escolhe o que sobe neste processo ("core,badges" por padrão, "all" para
+todos). Só os módulos dos subsistemas habilitados são importados, e dentro de cada um
+os geradores/clientes pesados são criados no primeiro uso (subsystems.Lazy). O `lifespan`
+de cada módulo (se houver) entra no lifespan da aplicação; /livez e /readyz vêm do build_app.
+O core (main.py) e o de badges (rotas /badges/...) ficam na raiz, como o frontend espera;
+as APIs que antes rodavam em processos e portas próprias ganham um prefixo.
+Uso: uvicorn server:app  (ou python server.py)
+"""
+import importlib
+import os
+from typing import Dict, Iterable, Optional, Tuple
+
+from fastapi import APIRouter
+
+from structured_logging import get_logger
+from subsystems import build_app, lazy_stats
+
+logger = get_logger("server")
+
+# nome → (módulo, atributo do APIRouter, prefixo no processo único)
+SUBSYSTEMS: Dict[str, Tuple[str, str, str]] = {
+    "core": ("main", "router", ""),
+    "badges": ("badge_api", "badge_router", ""),
+    "stadium_reference": ("stadium_reference_api", "router", "/stadium-reference"),
+    "vision_test": ("vision_test_api", "router", "/vision-test"),
+    "jersey_dalle3": ("jersey_api_dalle3", "router", "/jersey-dalle3"),
+    "stadium_vision": ("stadium_vision_dalle3", "router", "/stadium-vision"),
+    "stadium_complete": ("stadium_complete_api", "router", "/stadium-complete"),
+}
+
+API_SUBSYSTEMS = os.getenv("API_SUBSYSTEMS", "core,badges")
+
+
+def enabled_subsystems(config: str = API_SUBSYSTEMS) -> list:
+    names = [name.strip() for name in config.split(",") if name.strip()]
+    if "all" in names:
+        return list(SUBSYSTEMS)
+    unknown = sorted(set(names) - set(SUBSYSTEMS))
+    if unknown:
+        raise ValueError(f"Subsistemas desconhecidos em API_SUBSYSTEMS: {unknown}. Opções: {sorted(SUBSYSTEMS)}")
+    return names
+
+
+def create_app(names: Optional[Iterable[str]] = None):
+    """Monta a aplicação com os subsistemas pedidos (padrão: API_SUBSYSTEMS)"""
+    names = list(names) if names is not None else enabled_subsystems()
+    root = APIRouter()
+    lifespans = []
+    for name in names:
+        module_name, attribute, prefix = SUBSYSTEMS[name]
+        module = importlib.import_module(module_name)
+        root.include_router(getattr(module, attribute), prefix=prefix)
+        if hasattr(module, "lifespan"):
+            lifespans.append(module.lifespan)
+        logger.info(f"✅ [SERVER] Subsistema '{name}' montado em '{prefix or '/'}' ({module_name}).")
+
+    @root.get("/subsystems")
+    async def subsystems_status():
+        """Subsistemas montados neste processo e quais geradores já foram inicializados"""
+        return {
+            "enabled": {name: SUBSYSTEMS[name][2] or "/" for name in names},
+            "available": sorted(SUBSYSTEMS),
+            "lazy": lazy_stats(),
+        }
+
+    return build_app("CHZ Generation API", "2.0.0", [root], "server", lifespans=lifespans)
+
+
+app = create_app()
+
+if __name__ == "__main__":
+    import uvicorn
+    port = int(os.environ.get("PORT", 8000))
+    logger.info(f"🚀 Starting CHZ Generation API on port {port} (subsistemas: {API_SUBSYSTEMS})")
+    uvicorn.run(app, host="0.0.0.0", port=port)
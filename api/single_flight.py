@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Coalescência de chamadas idênticas em andamento (single-flight)
+Quando vários requests pedem a mesma coisa ao mesmo tempo (ex.: a mesma análise Vision
+da referência de um time recém-lançado), só o primeiro dispara a chamada ao provedor;
+os demais aguardam o mesmo future e recebem o mesmo resultado (ou a mesma exceção).
+A chave é montada a partir da entrada normalizada; nada fica guardado depois que a
+chamada termina — para isso existem os caches.
+"""
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict
+
+
+def flight_key(*parts: Any) -> str:
+    """Chave estável a partir das partes da entrada (strings normalizadas com strip + lower)"""
+    normalized = [part.strip().lower() if isinstance(part, str) else part for part in parts]
+    raw = json.dumps(normalized, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Um future compartilhado por chave enquanto a chamada está em andamento"""
+
+    def __init__(self):
+        self._in_flight: Dict[str, Dict[str, asyncio.Task]] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    async def do(self, namespace: str, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Executa factory() uma vez por (namespace, key) em andamento.
+        A chamada roda numa task própria: se o primeiro cliente desconectar,
+        os que estão esperando continuam recebendo o resultado.
+        """
+        flights = self._in_flight.setdefault(namespace, {})
+        counters = self._counters.setdefault(namespace, {"calls": 0, "executed": 0, "collapsed": 0})
+        counters["calls"] += 1
+
+        task = flights.get(key)
+        if task is None:
+            counters["executed"] += 1
+            task = asyncio.ensure_future(factory())
+            flights[key] = task
+            task.add_done_callback(lambda done: self._forget(namespace, key, done))
+        else:
+            counters["collapsed"] += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, namespace: str, key: str, task: asyncio.Task):
+        flights = self._in_flight.get(namespace, {})
+        if flights.get(key) is task:
+            del flights[key]
+
+    def stats(self) -> Dict[str, Any]:
+        namespaces = {}
+        for namespace, counters in self._counters.items():
+            calls = counters["calls"]
+            namespaces[namespace] = {
+                **counters,
+                "in_flight": len(self._in_flight.get(namespace, {})),
+                "collapse_ratio": round(counters["collapsed"] / calls, 4) if calls else 0.0,
+            }
+        return {
+            "collapsed": sum(counters["collapsed"] for counters in self._counters.values()),
+            "namespaces": namespaces,
+        }
+
+
+# Instância compartilhada pelo processo
+single_flight = SingleFlight()
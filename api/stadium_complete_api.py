@@ -9,44 +9,26 @@ import base64
 from typing import Optional, Dict, Any
 
 import uvicorn
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 import requests
 from openai import OpenAI
 
 # Carregar variáveis de ambiente
 from dotenv import load_dotenv
+from image_io import vision_data_uri  # normalização das imagens enviadas ao Vision
+from subsystems import Lazy, build_app  # router + inicialização preguiçosa
+from structured_logging import get_logger
+
+logger = get_logger("stadium_complete_api")
+
 load_dotenv()
 
 # Configurações
 OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 
-if not OPENROUTER_API_KEY:
-    raise ValueError("OPENROUTER_API_KEY não encontrada no .env")
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY não encontrada no .env")
-
-# FastAPI app
-app = FastAPI(title="Stadium Complete API", version="1.0.0")
-
-# CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        "http://localhost:3000", 
-        "http://127.0.0.1:3000",
-        "https://localhost:3000",
-        "https://*.vercel.app",
-        "https://*.netlify.app",
-        "https://*.railway.app", 
-        "https://*.render.com"
-    ],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+router = APIRouter()
 
 # Models
 class StadiumGenerationRequest(BaseModel):
@@ -69,19 +51,23 @@ class StadiumResponse(BaseModel):
 # Stadium Generator
 class CompleteStadiumGenerator:
     def __init__(self):
+        if not OPENROUTER_API_KEY:
+            raise ValueError("OPENROUTER_API_KEY não encontrada no .env")
+        if not OPENAI_API_KEY:
+            raise ValueError("OPENAI_API_KEY não encontrada no .env")
         self.openai_client = OpenAI(api_key=OPENAI_API_KEY)
         self.openrouter_url = "https://openrouter.ai/api/v1/chat/completions"
         self.openrouter_headers = {
             "Authorization": f"Bearer {OPENROUTER_API_KEY}",
             "Content-Type": "application/json"
         }
-        print("✅ Complete Stadium Generator initialized")
+        logger.info("✅ Complete Stadium Generator initialized")
     
     def analyze_stadium_image(self, image_base64: str) -> Dict[str, Any]:
         """Analisa imagem de estádio usando OpenRouter GPT-4o"""
         
         try:
-            print("🔍 Analyzing stadium image with OpenRouter...")
+            logger.info("🔍 Analyzing stadium image with OpenRouter...")
             
             prompt = """Analyze this stadium image and describe:
             1. Architecture style and features
@@ -101,7 +87,7 @@ class CompleteStadiumGenerator:
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_base64}"
+                                    "url": vision_data_uri(image_base64)
                                 }
                             }
                         ]
@@ -122,14 +108,14 @@ class CompleteStadiumGenerator:
             result = response.json()
             analysis_text = result['choices'][0]['message']['content']
             
-            print("✅ Stadium analysis completed")
+            logger.info("✅ Stadium analysis completed")
             return {
                 "description": analysis_text,
                 "generation_prompt": f"Stadium based on analysis: {analysis_text[:300]}..."
             }
             
         except Exception as e:
-            print(f"❌ Analysis error: {e}")
+            logger.error(f"❌ Analysis error: {e}")
             return {
                 "error": str(e),
                 "generation_prompt": "Modern stadium based on reference image"
@@ -178,7 +164,7 @@ class CompleteStadiumGenerator:
         """Gera estádio usando DALL-E 3"""
         
         try:
-            print(f"🎨 Generating stadium with DALL-E 3...")
+            logger.info(f"🎨 Generating stadium with DALL-E 3...")
             
             size = "1024x1024" if quality == "standard" else "1024x1792"
             dalle_quality = "standard" if quality == "standard" else "hd"
@@ -195,7 +181,7 @@ class CompleteStadiumGenerator:
             image_b64 = response.data[0].b64_json
             cost = 0.04 if quality == "standard" else 0.08
             
-            print("✅ Stadium generation successful!")
+            logger.info("✅ Stadium generation successful!")
             
             return {
                 "success": True,
@@ -204,7 +190,7 @@ class CompleteStadiumGenerator:
             }
             
         except Exception as e:
-            print(f"❌ Generation error: {e}")
+            logger.error(f"❌ Generation error: {e}")
             return {
                 "success": False,
                 "error": str(e)
@@ -250,15 +236,11 @@ class CompleteStadiumGenerator:
                 error=str(e)
             )
 
-# Inicializar
-try:
-    stadium_generator = CompleteStadiumGenerator()
-except Exception as e:
-    print(f"❌ Failed to initialize: {e}")
-    stadium_generator = None
+# Criado no primeiro uso (clientes e chaves só quando o subsistema é chamado)
+complete_stadium_generator = Lazy("stadium_complete.generator", CompleteStadiumGenerator)
 
 # Endpoints
-@app.get("/")
+@router.get("/")
 async def root():
     return {
         "status": "online",
@@ -266,10 +248,9 @@ async def root():
         "pipeline": "OpenRouter + DALL-E 3"
     }
 
-@app.post("/generate-stadium", response_model=StadiumResponse)
+@router.post("/generate-stadium", response_model=StadiumResponse)
 async def generate_stadium_endpoint(request: StadiumGenerationRequest):
-    if not stadium_generator:
-        raise HTTPException(status_code=500, detail="System not initialized")
+    stadium_generator = complete_stadium_generator.get()
     
     if not request.prompt and not request.reference_image_base64:
         raise HTTPException(status_code=400, detail="Either prompt or reference_image_base64 is required")
@@ -280,7 +261,7 @@ async def generate_stadium_endpoint(request: StadiumGenerationRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/health")
+@router.get("/health")
 async def health_check():
     return {
         "status": "ok",
@@ -288,6 +269,9 @@ async def health_check():
         "dalle3": "openai_direct"
     }
 
+# Aplicação standalone (legado); no processo único o router é montado pelo server.py
+app = build_app("Stadium Complete API", "1.0.0", [router], "stadium_complete_api")
+
 if __name__ == "__main__":
-    print("🚀 Starting Complete Stadium API (port 8003)")
+    logger.info("🚀 Starting Complete Stadium API (port 8003)")
     uvicorn.run(app, host="0.0.0.0", port=8003) 
\ No newline at end of file
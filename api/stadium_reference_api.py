@@ -10,8 +10,7 @@ from typing import Optional, Dict, Any, List
 from pathlib import Path
 
 import uvicorn
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 import requests
 from openai import OpenAI
@@ -27,28 +26,15 @@ load_dotenv()
 OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 
-# Caminhos
-STADIUM_REFERENCES_PATH = Path("stadium_references")
+# Imagens de referência locais (manifesto indexado + watcher)
+from stadium_reference_store import stadium_reference_store
+from image_io import vision_data_uri  # normalização das imagens enviadas ao Vision
+from subsystems import Lazy, build_app  # router + inicialização preguiçosa
+from structured_logging import get_logger
 
-# FastAPI app
-app = FastAPI(title="Stadium Reference API", version="1.0.0")
+logger = get_logger("stadium_reference_api")
 
-# CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        "http://localhost:3000",
-        "http://127.0.0.1:3000", 
-        "https://localhost:3000",
-        "https://*.vercel.app",
-        "https://*.netlify.app",
-        "https://*.railway.app",
-        "https://*.render.com"
-    ],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+router = APIRouter()
 
 # Models
 class StadiumReferenceRequest(BaseModel):
@@ -97,59 +83,25 @@ class StadiumReferenceGenerator:
             "Authorization": f"Bearer {OPENROUTER_API_KEY}",
             "Content-Type": "application/json"
         }
-        print("✅ Stadium Reference Generator initialized with Premium NFT Prompts")
+        stadium_reference_store.start_watcher()
+        logger.info("✅ Stadium Reference Generator initialized with Premium NFT Prompts")
     
     def get_available_stadiums(self) -> List[StadiumInfo]:
-        """Lista estádios disponíveis"""
-        stadiums = []
-        
-        if not STADIUM_REFERENCES_PATH.exists():
-            return stadiums
-        
-        for stadium_dir in STADIUM_REFERENCES_PATH.iterdir():
-            if stadium_dir.is_dir():
-                # Buscar imagens
-                image_files = []
-                for ext in ['*.jpg', '*.jpeg', '*.png', '*.webp']:
-                    image_files.extend(stadium_dir.glob(ext))
-                
-                stadium_name = stadium_dir.name.replace('_', ' ').title()
-                
-                stadiums.append(StadiumInfo(
-                    id=stadium_dir.name,
-                    name=stadium_name,
-                    available_references=[f.name for f in image_files]
-                ))
-        
-        return stadiums
+        """Lista estádios disponíveis (manifesto indexado, sem glob por chamada)"""
+        return [
+            StadiumInfo(id=stadium["id"], name=stadium["name"], available_references=stadium["available_references"])
+            for stadium in stadium_reference_store.stadiums()
+        ]
     
     def load_reference_image(self, stadium_id: str, reference_type: str) -> Optional[str]:
-        """Carrega imagem de referência"""
-        stadium_path = STADIUM_REFERENCES_PATH / stadium_id
-        
-        if not stadium_path.exists():
-            return None
-        
-        # Buscar primeira imagem disponível
-        for ext in ['jpg', 'jpeg', 'png', 'webp']:
-            files = list(stadium_path.glob(f"*.{ext}"))
-            if files:
-                image_file = files[0]  # Pegar primeira imagem
-                try:
-                    with open(image_file, 'rb') as f:
-                        image_data = f.read()
-                        return base64.b64encode(image_data).decode('utf-8')
-                except Exception as e:
-                    print(f"❌ Error loading {image_file}: {e}")
-                    continue
-        
-        return None
+        """Carrega a imagem de referência do tipo pedido, reduzida e pronta para Vision (base64 JPEG)"""
+        return stadium_reference_store.vision_base64(stadium_id, reference_type)
     
     def analyze_reference_image(self, image_base64: str, stadium_name: str) -> Dict[str, Any]:
         """Analisa imagem de referência com foco em características arquiteturais para NFT"""
         
         try:
-            print(f"🔍 Analyzing {stadium_name} for premium NFT generation...")
+            logger.info(f"🔍 Analyzing {stadium_name} for premium NFT generation...")
             
             prompt = f"""Analyze this {stadium_name} stadium image for premium NFT artwork generation. Focus on:
 
@@ -178,7 +130,7 @@ Provide a detailed architectural description that can be used to generate a prem
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_base64}"
+                                    "url": vision_data_uri(image_base64)
                                 }
                             }
                         ]
@@ -199,7 +151,7 @@ Provide a detailed architectural description that can be used to generate a prem
             result = response.json()
             analysis_text = result['choices'][0]['message']['content']
             
-            print(f"✅ Premium architectural analysis completed for {stadium_name}")
+            logger.info(f"✅ Premium architectural analysis completed for {stadium_name}")
             
             return {
                 "architectural_description": analysis_text,
@@ -208,7 +160,7 @@ Provide a detailed architectural description that can be used to generate a prem
             }
             
         except Exception as e:
-            print(f"❌ Analysis error: {e}")
+            logger.error(f"❌ Analysis error: {e}")
             return {
                 "error": str(e),
                 "architectural_description": f"Modern {stadium_name} stadium with distinctive architectural features",
@@ -220,7 +172,7 @@ Provide a detailed architectural description that can be used to generate a prem
         """Gera estádio usando DALL-E 3"""
         
         try:
-            print(f"🎨 Generating premium NFT stadium with DALL-E 3...")
+            logger.info(f"🎨 Generating premium NFT stadium with DALL-E 3...")
             
             size = "1024x1024" if quality == "standard" else "1024x1792"
             dalle_quality = "standard" if quality == "standard" else "hd"
@@ -237,7 +189,7 @@ Provide a detailed architectural description that can be used to generate a prem
             image_b64 = response.data[0].b64_json
             cost = 0.04 if quality == "standard" else 0.08
             
-            print("✅ Premium NFT stadium generation successful!")
+            logger.info("✅ Premium NFT stadium generation successful!")
             
             return {
                 "success": True,
@@ -264,7 +216,7 @@ Provide a detailed architectural description that can be used to generate a prem
             
             # PRIORIDADE 2: Se não há referência local, usar upload manual
             if not image_base64 and request.custom_reference_base64:
-                print(f"📤 Using custom uploaded reference for {request.stadium_id}")
+                logger.info(f"📤 Using custom uploaded reference for {request.stadium_id}")
                 image_base64 = request.custom_reference_base64
                 reference_source = "custom"
                 reference_used = f"custom_{request.stadium_id}"
@@ -273,7 +225,7 @@ Provide a detailed architectural description that can be used to generate a prem
             if not image_base64:
                 # FALLBACK: Usar apenas prompt customizado se fornecido
                 if request.custom_prompt:
-                    print(f"📝 Using custom prompt only for {request.stadium_id}")
+                    logger.info(f"📝 Using custom prompt only for {request.stadium_id}")
                     
                     # Usar prompt premium mesmo sem análise
                     enhanced_prompt = build_enhanced_stadium_prompt(
@@ -326,7 +278,7 @@ Provide a detailed architectural description that can be used to generate a prem
                 custom_additions=request.custom_prompt or ""
             )
             
-            print(f"🎯 Generated premium NFT prompt ({len(enhanced_prompt)} chars)")
+            logger.info(f"🎯 Generated premium NFT prompt ({len(enhanced_prompt)} chars)")
             
             # Gerar imagem
             generation_result = self.generate_stadium_dalle3(enhanced_prompt, request.quality)
@@ -356,15 +308,11 @@ Provide a detailed architectural description that can be used to generate a prem
                 error=str(e)
             )
 
-# Inicializar
-try:
-    generator = StadiumReferenceGenerator()
-except Exception as e:
-    print(f"❌ Failed to initialize: {e}")
-    generator = None
+# Criado no primeiro uso (clientes e chaves só quando o subsistema é chamado)
+stadium_reference_generator = Lazy("stadium_reference.generator", StadiumReferenceGenerator)
 
 # Endpoints
-@app.get("/")
+@router.get("/")
 async def root():
     return {
         "status": "online",
@@ -372,11 +320,10 @@ async def root():
         "features": ["Premium NFT Prompts", "Local References", "Custom Upload"]
     }
 
-@app.get("/stadiums", response_model=List[StadiumInfo])
+@router.get("/stadiums", response_model=List[StadiumInfo])
 async def list_stadiums():
     """Lista estádios disponíveis"""
-    if not generator:
-        raise HTTPException(status_code=500, detail="System not initialized")
+    generator = stadium_reference_generator.get()
     
     try:
         stadiums = generator.get_available_stadiums()
@@ -384,11 +331,10 @@ async def list_stadiums():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/generate-from-reference", response_model=StadiumResponse)
+@router.post("/generate-from-reference", response_model=StadiumResponse)
 async def generate_from_reference(request: StadiumReferenceRequest):
     """Gera estádio baseado em referência local com prompts premium NFT"""
-    if not generator:
-        raise HTTPException(status_code=500, detail="System not initialized")
+    generator = stadium_reference_generator.get()
     
     try:
         result = generator.generate_from_reference(request)
@@ -396,11 +342,10 @@ async def generate_from_reference(request: StadiumReferenceRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/generate-custom", response_model=StadiumResponse)
+@router.post("/generate-custom", response_model=StadiumResponse)
 async def generate_custom_stadium(request: CustomStadiumRequest):
     """Gera estádio com prompt e referência customizados usando prompts premium NFT"""
-    if not generator:
-        raise HTTPException(status_code=500, detail="System not initialized")
+    generator = stadium_reference_generator.get()
     
     try:
         total_cost = 0
@@ -428,7 +373,7 @@ async def generate_custom_stadium(request: CustomStadiumRequest):
             custom_additions=request.prompt
         )
         
-        print(f"🎯 Generated custom premium NFT prompt ({len(enhanced_prompt)} chars)")
+        logger.info(f"🎯 Generated custom premium NFT prompt ({len(enhanced_prompt)} chars)")
         
         # Gerar imagem
         generation_result = generator.generate_stadium_dalle3(enhanced_prompt, request.quality)
@@ -454,24 +399,30 @@ async def generate_custom_stadium(request: CustomStadiumRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/health")
+@router.get("/health")
 async def health_check():
+    generator = stadium_reference_generator.peek()  # o health check não inicializa o gerador
     return {
         "status": "ok",
         "stadiums_available": len(generator.get_available_stadiums()) if generator else 0,
         "features": ["Premium NFT Quality", "Architectural Analysis", "Enhanced Prompts"]
     }
 
+# Aplicação standalone (legado); no processo único o router é montado pelo server.py
+app = build_app("Stadium Reference API", "1.0.0", [router], "stadium_reference_api")
+
 if __name__ == "__main__":
-    print("🚀 Starting Stadium Reference API with Premium NFT Prompts (port 8004)")
+    logger.info("🚀 Starting Stadium Reference API with Premium NFT Prompts (port 8004)")
     
-    if generator:
-        stadiums = generator.get_available_stadiums()
-        print(f"🏟️ Available stadiums: {len(stadiums)}")
+    try:
+        stadiums = stadium_reference_generator.get().get_available_stadiums()
+        logger.info(f"🏟️ Available stadiums: {len(stadiums)}")
         for stadium in stadiums:
-            print(f"   • {stadium.name} ({stadium.id}) - {len(stadium.available_references)} images")
+            logger.info(f"   • {stadium.name} ({stadium.id}) - {len(stadium.available_references)} images")
+    except HTTPException:
+        pass  # falha já registrada; as rotas respondem 500 até a configuração ser corrigida
     
-    print("🎨 Premium NFT prompt system loaded")
-    print("✨ Ready to generate high-quality stadium NFT artwork")
+    logger.info("🎨 Premium NFT prompt system loaded")
+    logger.info("✨ Ready to generate high-quality stadium NFT artwork")
     
     uvicorn.run(app, host="0.0.0.0", port=8004) 
\ No newline at end of file
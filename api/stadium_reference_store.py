@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Índice local das imagens de referência de estádios
+Um manifesto (estádio → tipo de referência → arquivos) é montado uma vez a partir de
+stadium_references/ (metadata.json + nomes dos arquivos) e mantido atualizado por um
+watcher que observa os arquivos (nome, mtime, tamanho). As versões prontas para Vision (lado maior
+limitado, JPEG) são geradas sob demanda, gravadas em disco e servidas do LRU de cache_backend.
+"""
+import base64
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from cache_backend import cache_namespace
+from image_io import normalize_for_vision
+from runtime_paths import data_path
+from structured_logging import get_logger
+
+logger = get_logger("stadium_reference_store")
+
+STADIUM_REFERENCES_PATH = Path(os.getenv("STADIUM_REFERENCES_DIR", "stadium_references"))
+VISION_CACHE_DIR = Path(os.getenv("STADIUM_VISION_CACHE_DIR", data_path("stadium_references_cache")))
+VISION_MAX_EDGE = int(os.getenv("STADIUM_VISION_MAX_EDGE", "1024"))
+VISION_JPEG_QUALITY = int(os.getenv("STADIUM_VISION_JPEG_QUALITY", "85"))
+VISION_CACHE_ENTRIES = int(os.getenv("STADIUM_VISION_CACHE_ENTRIES", "32"))
+WATCH_INTERVAL_SECONDS = float(os.getenv("STADIUM_REFERENCES_WATCH_SECONDS", "5"))
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+# Palavra no nome do arquivo → tipo de referência (quando o metadata.json não informa)
+_TYPE_HINTS = (
+    ("atmosph", "atmosphere"),
+    ("atsmosph", "atmosphere"),
+    ("night", "night_lights"),
+    ("sunset", "sunset_packed"),
+    ("day", "day_crowd"),
+)
+
+
+def infer_reference_type(filename: str) -> str:
+    name = filename.lower()
+    for hint, reference_type in _TYPE_HINTS:
+        if hint in name:
+            return reference_type
+    return "general"
+
+
+class ReferenceImage:
+    def __init__(self, stadium_id: str, reference_type: str, path: Path):
+        self.stadium_id = stadium_id
+        self.reference_type = reference_type
+        self.path = path
+        stat = path.stat()
+        self.mtime = stat.st_mtime
+        self.size = stat.st_size
+
+    @property
+    def cache_key(self) -> str:
+        raw = f"{self.path.resolve()}:{self.mtime}:{self.size}:{VISION_MAX_EDGE}:{VISION_JPEG_QUALITY}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class StadiumReferenceStore:
+    """Manifesto indexado + encodings para Vision em LRU"""
+
+    def __init__(self, root: Path = STADIUM_REFERENCES_PATH, cache_dir: Path = VISION_CACHE_DIR,
+                 max_edge: int = VISION_MAX_EDGE, cache_entries: int = VISION_CACHE_ENTRIES,
+                 watch_interval: float = WATCH_INTERVAL_SECONDS):
+        self.root = root
+        self.cache_dir = cache_dir
+        self.max_edge = max_edge
+        self.cache_entries = cache_entries
+        self.watch_interval = watch_interval
+        self._index: Dict[str, Dict[str, List[ReferenceImage]]] = {}
+        self._signature: Tuple = ()
+        # Encodings no backend de cache (compartilhados entre workers com CACHE_BACKEND=sqlite/redis)
+        self._encodings = cache_namespace("stadium_encodings", max_entries=cache_entries)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        self.refresh()
+
+    # --- Manifesto ---
+    def _directory_signature(self) -> Tuple:
+        """Nome, mtime e tamanho de cada arquivo: muda quando algo é adicionado, removido ou sobrescrito"""
+        if not self.root.is_dir():
+            return ()
+        entries = []
+        for stadium_dir in sorted(self.root.iterdir()):
+            if stadium_dir.is_dir():
+                for path in sorted(stadium_dir.iterdir()):
+                    stat = path.stat()
+                    entries.append((stadium_dir.name, path.name, stat.st_mtime, stat.st_size))
+        return tuple(entries)
+
+    def refresh(self, force: bool = False) -> bool:
+        """Reconstrói o manifesto se as pastas mudaram; retorna True se reconstruiu"""
+        signature = self._directory_signature()
+        if not force and signature == self._signature:
+            return False
+        index: Dict[str, Dict[str, List[ReferenceImage]]] = {}
+        if self.root.is_dir():
+            for stadium_dir in sorted(self.root.iterdir()):
+                if stadium_dir.is_dir():
+                    index[stadium_dir.name] = self._index_stadium(stadium_dir)
+        with self._lock:
+            self._index = index
+            self._signature = signature
+            self.rebuilds += 1
+        return True
+
+    def _index_stadium(self, stadium_dir: Path) -> Dict[str, List[ReferenceImage]]:
+        declared_types = {}
+        metadata_path = stadium_dir / "metadata.json"
+        if metadata_path.exists():
+            try:
+                metadata = json.loads(metadata_path.read_text(encoding="utf-8"))
+                for item in metadata.get("reference_images", []):
+                    if item.get("filename") and item.get("type"):
+                        declared_types[item["filename"]] = item["type"]
+            except Exception as e:
+                logger.warning(f"⚠️ [STADIUM REFS] metadata.json inválido em {stadium_dir.name}: {e}")
+
+        by_type: Dict[str, List[ReferenceImage]] = {}
+        for path in sorted(stadium_dir.iterdir()):
+            if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS:
+                reference_type = declared_types.get(path.name) or infer_reference_type(path.name)
+                by_type.setdefault(reference_type, []).append(ReferenceImage(stadium_dir.name, reference_type, path))
+        return by_type
+
+    def stadiums(self) -> List[Dict[str, object]]:
+        with self._lock:
+            index = self._index
+        return [
+            {
+                "id": stadium_id,
+                "name": stadium_id.replace("_", " ").title(),
+                "available_references": sorted(image.path.name for images in by_type.values() for image in images),
+                "reference_types": sorted(by_type),
+            }
+            for stadium_id, by_type in index.items()
+        ]
+
+    def find(self, stadium_id: str, reference_type: Optional[str] = None) -> Optional[ReferenceImage]:
+        """Imagem do tipo pedido; sem esse tipo, a primeira imagem do estádio"""
+        with self._lock:
+            by_type = self._index.get(stadium_id)
+        if not by_type:
+            return None
+        if reference_type and by_type.get(reference_type):
+            return by_type[reference_type][0]
+        for images in by_type.values():
+            if images:
+                return images[0]
+        return None
+
+    # --- Encodings para Vision ---
+    def vision_base64(self, stadium_id: str, reference_type: Optional[str] = None) -> Optional[str]:
+        """JPEG reduzido em base64 (pronto para data:image/jpeg) da referência pedida"""
+        image = self.find(stadium_id, reference_type)
+        if image is None:
+            return None
+        key = image.cache_key
+        encoded = self._encodings.get_bytes(key)
+        with self._lock:
+            if encoded is not None:
+                self.hits += 1
+                return encoded.decode("ascii")
+            self.misses += 1
+
+        try:
+            encoded = base64.b64encode(self._load_or_build(image, key))
+        except Exception as e:
+            logger.error(f"❌ [STADIUM REFS] Erro ao carregar {image.path}: {e}")
+            return None
+        self._encodings.set_bytes(key, encoded)
+        return encoded.decode("ascii")
+
+    def _load_or_build(self, image: ReferenceImage, key: str) -> bytes:
+        cached_path = self.cache_dir / f"{key}.jpg"
+        if cached_path.exists():
+            return cached_path.read_bytes()
+        data = self._downscale(image.path)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = cached_path.with_suffix(".tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(cached_path)
+        return data
+
+    def _downscale(self, path: Path) -> bytes:
+        # Mesmo pipeline das demais chamadas Vision (draft decode, EXIF, thumbnail, JPEG)
+        return normalize_for_vision(path.read_bytes(), self.max_edge, VISION_JPEG_QUALITY)
+
+    # --- Watcher ---
+    def start_watcher(self):
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="stadium-reference-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=self.watch_interval + 1)
+            self._watcher = None
+
+    def _watch(self):
+        while not self._stop.wait(self.watch_interval):
+            try:
+                if self.refresh():
+                    logger.info(f"🔄 [STADIUM REFS] Manifesto reconstruído ({len(self._index)} estádios).")
+            except Exception as e:
+                logger.warning(f"⚠️ [STADIUM REFS] Falha ao atualizar o manifesto: {e}")
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "stadiums": len(self._index),
+                "references": sum(len(images) for by_type in self._index.values() for images in by_type.values()),
+                "encodings_backend": self._encodings.backend.name,
+                "max_entries": self.cache_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "rebuilds": self.rebuilds,
+            }
+
+
+# Instância compartilhada pelas APIs de estádio
+stadium_reference_store = StadiumReferenceStore()
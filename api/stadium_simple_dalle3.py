@@ -20,6 +20,7 @@ from openai import OpenAI
 
 # Carregar variáveis de ambiente
 from dotenv import load_dotenv
+from prometheus_metrics import instrument_app
 load_dotenv()
 
 # Configurações
@@ -48,6 +49,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Métricas Prometheus (latência por rota, em andamento, custo) + GET /metrics
+instrument_app(app, "stadium_simple_dalle3")
+
 # Models
 class StadiumGenerationRequest(BaseModel):
     reference_image_base64: Optional[str] = None
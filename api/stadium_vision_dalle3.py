@@ -11,11 +11,15 @@ import os
 from PIL import Image
 from io import BytesIO
 from pathlib import Path
-from fastapi import FastAPI, HTTPException, UploadFile, File
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi import APIRouter, HTTPException, UploadFile, File
 from pydantic import BaseModel
 from typing import Optional, List
 from dotenv import load_dotenv
+from image_io import vision_data_uri  # normalização das imagens enviadas ao Vision
+from subsystems import Lazy, build_app  # router + inicialização preguiçosa
+from structured_logging import get_logger, log_payload
+
+logger = get_logger("stadium_vision_dalle3")
 
 load_dotenv()
 
@@ -51,9 +55,9 @@ class StadiumVisionSystem:
         
         self.openrouter_base_url = "https://openrouter.ai/api/v1"
         
-        print("✅ Stadium Vision System initialized")
-        print(f"🔍 GPT-4 Vision: OpenRouter")
-        print(f"🎨 DALL-E 3: OpenAI Direct")
+        logger.info("✅ Stadium Vision System initialized")
+        logger.info(f"🔍 GPT-4 Vision: OpenRouter")
+        logger.info(f"🎨 DALL-E 3: OpenAI Direct")
     
     def analyze_stadium_with_vision(self, image_base64: str, analysis_type: str = "comprehensive") -> dict:
         """Analisa estádio usando GPT-4 Vision via OpenRouter"""
@@ -131,7 +135,7 @@ class StadiumVisionSystem:
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_base64}"
+                                "url": vision_data_uri(image_base64)
                             }
                         }
                     ]
@@ -142,7 +146,7 @@ class StadiumVisionSystem:
         }
         
         try:
-            print(f"🔍 Analyzing stadium with GPT-4 Vision ({analysis_type})...")
+            logger.info(f"🔍 Analyzing stadium with GPT-4 Vision ({analysis_type})...")
             
             response = requests.post(
                 f"{self.openrouter_base_url}/chat/completions",
@@ -158,21 +162,21 @@ class StadiumVisionSystem:
                 # Tenta parsear como JSON
                 try:
                     analysis_json = json.loads(analysis_text)
-                    print("✅ Stadium analysis completed")
+                    logger.info("✅ Stadium analysis completed")
                     return analysis_json
                 except json.JSONDecodeError:
                     # Se não for JSON válido, retorna como texto
-                    print("⚠️ Analysis returned as text, not JSON")
+                    logger.warning("⚠️ Analysis returned as text, not JSON")
                     return {"analysis_text": analysis_text}
                     
             else:
                 error_msg = f"OpenRouter API error: {response.status_code}"
-                print(f"❌ {error_msg}")
+                logger.error(f"❌ {error_msg}")
                 return {"error": error_msg}
                 
         except Exception as e:
             error_msg = f"Vision analysis error: {str(e)}"
-            print(f"❌ {error_msg}")
+            logger.error(f"❌ {error_msg}")
             return {"error": error_msg}
     
     def generate_stadium_with_dalle3(self, analysis: dict, generation_params: dict) -> str:
@@ -254,8 +258,8 @@ class StadiumVisionSystem:
                 custom_params=custom_params
             )
         
-        print(f"🎨 Generating stadium with DALL-E 3...")
-        print(f"📝 Prompt: {final_prompt[:100]}...")
+        logger.info(f"🎨 Generating stadium with DALL-E 3...")
+        log_payload(logger, "📝 Prompt", final_prompt)
         
         try:
             from openai import OpenAI
@@ -279,14 +283,14 @@ class StadiumVisionSystem:
                 image.save(buffered, format="PNG")
                 image_base64 = base64.b64encode(buffered.getvalue()).decode()
                 
-                print("✅ Stadium image generated successfully")
+                logger.info("✅ Stadium image generated successfully")
                 return image_base64
             else:
                 raise Exception(f"Failed to download image: {img_response.status_code}")
                 
         except Exception as e:
             error_msg = f"DALL-E 3 generation error: {str(e)}"
-            print(f"❌ {error_msg}")
+            logger.error(f"❌ {error_msg}")
             raise Exception(error_msg)
     
     def process_stadium_complete(self, request: StadiumGenerationRequest) -> dict:
@@ -295,7 +299,7 @@ class StadiumVisionSystem:
         total_cost = 0
         
         # Passo 1: Análise com GPT-4 Vision
-        print("🔄 Step 1: Analyzing reference image...")
+        logger.info("🔄 Step 1: Analyzing reference image...")
         analysis = self.analyze_stadium_with_vision(
             request.reference_image_base64, 
             "comprehensive"
@@ -312,7 +316,7 @@ class StadiumVisionSystem:
         total_cost += vision_cost
         
         # Passo 2: Geração com DALL-E 3
-        print("🔄 Step 2: Generating new stadium image...")
+        logger.info("🔄 Step 2: Generating new stadium image...")
         
         generation_params = {
             "generation_style": request.generation_style,
@@ -329,7 +333,7 @@ class StadiumVisionSystem:
             dalle_cost = 0.040 if request.quality == "standard" else 0.080
             total_cost += dalle_cost
             
-            print(f"✅ Complete pipeline finished - Total cost: ${total_cost:.3f}")
+            logger.info(f"✅ Complete pipeline finished - Total cost: ${total_cost:.3f}")
             
             return {
                 "success": True,
@@ -346,33 +350,12 @@ class StadiumVisionSystem:
                 "cost_usd": total_cost
             }
 
-# --- API FastAPI ---
-app = FastAPI(title="Stadium Vision + DALL-E 3 API", version="1.0.0")
-
-# CORS
-origins = [
-    "http://localhost",
-    "http://localhost:3000",
-    "https://jersey-generator-ai2-git-master-jeffnight15s-projects.vercel.app",
-    "https://jersey-generator-ai2.vercel.app"
-]
+router = APIRouter()
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"]
-)
+# Criado no primeiro uso (clientes e chaves só quando o subsistema é chamado)
+stadium_vision_system = Lazy("stadium_vision.system", StadiumVisionSystem)
 
-# Inicializa sistema
-try:
-    stadium_system = StadiumVisionSystem()
-except Exception as e:
-    print(f"❌ Failed to initialize: {e}")
-    stadium_system = None
-
-@app.get("/")
+@router.get("/")
 async def root():
     return {
         "status": "online", 
@@ -381,11 +364,10 @@ async def root():
         "pipeline": "GPT-4 Vision → DALL-E 3"
     }
 
-@app.post("/analyze-stadium", response_model=StadiumResponse)
+@router.post("/analyze-stadium", response_model=StadiumResponse)
 async def analyze_stadium_endpoint(request: StadiumAnalysisRequest):
     """Apenas analisa o estádio com GPT-4 Vision"""
-    if not stadium_system:
-        raise HTTPException(status_code=500, detail="System not initialized")
+    stadium_system = stadium_vision_system.get()
     
     try:
         analysis = stadium_system.analyze_stadium_with_vision(
@@ -402,11 +384,10 @@ async def analyze_stadium_endpoint(request: StadiumAnalysisRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/generate-stadium", response_model=StadiumResponse)
+@router.post("/generate-stadium", response_model=StadiumResponse)
 async def generate_stadium_endpoint(request: StadiumGenerationRequest):
     """Pipeline completo: Análise + Geração"""
-    if not stadium_system:
-        raise HTTPException(status_code=500, detail="System not initialized")
+    stadium_system = stadium_vision_system.get()
     
     try:
         result = stadium_system.process_stadium_complete(request)
@@ -422,14 +403,17 @@ async def generate_stadium_endpoint(request: StadiumGenerationRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/health")
+@router.get("/health")
 async def health_check():
     return {
         "status": "ok",
-        "gpt4_vision": "openrouter" if stadium_system else "not_initialized",
-        "dalle3": "openai_direct" if stadium_system else "not_initialized"
+        "gpt4_vision": "openrouter" if stadium_vision_system.initialized else "not_initialized",
+        "dalle3": "openai_direct" if stadium_vision_system.initialized else "not_initialized"
     }
 
+# Aplicação standalone (legado); no processo único o router é montado pelo server.py
+app = build_app("Stadium Vision + DALL-E 3 API", "1.0.0", [router], "stadium_vision_dalle3")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001) 
\ No newline at end of file
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Logging estruturado e não bloqueante para as APIs
+Os handlers só colocam o registro numa fila em memória (QueueHandler); uma thread de
+fundo (QueueListener) formata em JSON (uma linha por evento, com trace_id do tracing)
+e escreve no stdout. Assim o event loop nunca espera por escrita no terminal/pipe.
+Se a fila encher (stdout travado), os eventos excedentes são descartados e contados.
+Payloads verbosos (prompt final, análise completa, documentos do Mongo) vão por
+log_payload(): são amostrados (LOG_PAYLOAD_SAMPLE_RATE) e truncados.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+import tracing
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json | text
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.05"))
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "2000"))
+
+ROOT_LOGGER = "chz"
+
+# Atributos padrão de um LogRecord (o resto veio de extra= e vai para o JSON)
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "trace_id"}
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        event: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "trace_id", None):
+            event["trace_id"] = record.trace_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                event[key] = value
+        if record.exc_info:
+            event["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            event["exc"] = record.exc_text
+        return json.dumps(event, default=str, ensure_ascii=False)
+
+
+class _ContextFilter(logging.Filter):
+    """Roda na thread de quem loga: captura o trace_id (contextvar) antes de ir para a fila"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = tracing.current_trace_id()
+        return True
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """put_nowait: com a fila cheia descarta o evento em vez de bloquear o request"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve msg % args aqui (os args podem mudar depois), mas a serialização fica com a thread
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_text = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_setup_lock = threading.Lock()
+_handler: "_DroppingQueueHandler | None" = None
+_listener: "logging.handlers.QueueListener | None" = None
+
+
+def setup_logging(stream=None):
+    """Configura o logger raiz "chz" uma vez por processo (idempotente)"""
+    global _handler, _listener
+    with _setup_lock:
+        if _handler is not None:
+            return
+        log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        writer = logging.StreamHandler(stream or sys.stdout)
+        if LOG_FORMAT == "json":
+            writer.setFormatter(JSONFormatter())
+        else:
+            writer.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        _handler = _DroppingQueueHandler(log_queue)
+        _handler.addFilter(_ContextFilter())
+        _listener = logging.handlers.QueueListener(log_queue, writer, respect_handler_level=False)
+        _listener.start()
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(LOG_LEVEL)
+        root.addHandler(_handler)
+        root.propagate = False
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Escreve o que ainda está na fila e para a thread"""
+    global _handler, _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            logging.getLogger(ROOT_LOGGER).removeHandler(_handler)
+        _handler, _listener = None, None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger filho de "chz" (ex.: get_logger("main") → chz.main)"""
+    setup_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def log_payload(logger: logging.Logger, message: str, payload: Any, level: int = logging.DEBUG):
+    """Loga um payload grande (amostrado e truncado); fora da amostra não serializa nada"""
+    if not logger.isEnabledFor(level) or random.random() >= LOG_PAYLOAD_SAMPLE_RATE:
+        return
+    text = payload if isinstance(payload, str) else json.dumps(payload, default=str, ensure_ascii=False)
+    if len(text) > LOG_PAYLOAD_MAX_CHARS:
+        text = f"{text[:LOG_PAYLOAD_MAX_CHARS]}… (+{len(text) - LOG_PAYLOAD_MAX_CHARS} chars)"
+    logger.log(level, message, extra={"payload": text})
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "queued": _handler.queue.qsize() if _handler is not None else 0,
+        "dropped": _handler.dropped if _handler is not None else 0,
+        "level": LOG_LEVEL,
+        "payload_sample_rate": LOG_PAYLOAD_SAMPLE_RATE,
+    }
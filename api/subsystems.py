@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Peças comuns dos subsistemas da API (cada um é um módulo com um APIRouter)
+build_app() monta uma aplicação FastAPI a partir de routers com CORS, métricas e tracing,
+tanto no processo único (server.py) quanto nos modos standalone legados de cada módulo.
+Lazy adia a criação de geradores e clientes pesados para o primeiro uso, assim um
+subsistema habilitado mas não chamado não abre clientes, threads nem exige chaves.
+Startup/shutdown de cada subsistema vêm do lifespan do módulo (build_app compõe todos);
+/livez diz só que o processo responde e /readyz agrega os checks de register_readiness().
+"""
+import threading
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, Callable, Dict, Generic, Iterable, Optional, Tuple, TypeVar
+
+from fastapi import APIRouter, FastAPI, HTTPException
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+
+from blob_store import BlobBaseURLMiddleware
+from prometheus_metrics import instrument_app
+from structured_logging import get_logger
+from tracing import instrument_tracing
+
+logger = get_logger("subsystems")
+
+CORS_ORIGINS = [
+    "http://localhost",
+    "http://localhost:3000",
+    "http://127.0.0.1:3000",
+    "https://localhost:3000",
+    "https://jersey-generator-ai2-git-master-jeffnight15s-projects.vercel.app",
+    "https://jersey-generator-ai2.vercel.app",
+    "https://*.vercel.app",
+    "https://*.netlify.app",
+    "https://*.railway.app",
+    "https://*.render.com",
+]
+
+T = TypeVar("T")
+
+
+class Lazy(Generic[T]):
+    """Instância criada no primeiro get() (thread-safe); uma falha não fica em cache"""
+
+    def __init__(self, name: str, factory: Callable[[], T]):
+        self.name = name
+        self.factory = factory
+        self._instance: Optional[T] = None
+        self._lock = threading.Lock()
+        _lazy_objects[name] = self
+
+    @property
+    def initialized(self) -> bool:
+        return self._instance is not None
+
+    def peek(self) -> Optional[T]:
+        """A instância, se já existir (para health checks que não devem inicializar nada)"""
+        return self._instance
+
+    def get(self) -> T:
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    try:
+                        self._instance = self.factory()
+                    except Exception as e:
+                        logger.error(f"❌ [SUBSYSTEMS] Falha ao inicializar '{self.name}': {e}")
+                        raise HTTPException(status_code=500, detail=f"System not initialized: {e}")
+                    logger.info(f"✅ [SUBSYSTEMS] '{self.name}' inicializado no primeiro uso.")
+        return self._instance
+
+
+_lazy_objects: Dict[str, Lazy] = {}
+
+
+def lazy_stats() -> Dict[str, Any]:
+    return {name: {"initialized": item.initialized} for name, item in _lazy_objects.items()}
+
+
+# --- Readiness ---
+# nome → check() que retorna (pronto, detalhes)
+_readiness_checks: Dict[str, Callable[[], Tuple[bool, Dict[str, Any]]]] = {}
+
+
+def register_readiness(name: str, check: Callable[[], Tuple[bool, Dict[str, Any]]]):
+    _readiness_checks[name] = check
+
+
+def readiness() -> Tuple[bool, Dict[str, Any]]:
+    checks = {}
+    for name, check in _readiness_checks.items():
+        try:
+            ready, details = check()
+        except Exception as e:
+            ready, details = False, {"error": str(e)}
+        checks[name] = {"ready": ready, **details}
+    return all(check["ready"] for check in checks.values()), checks
+
+
+def _compose_lifespans(lifespans: Iterable[Callable]) -> Callable:
+    """Um lifespan que roda os on_event dos routers e os lifespans dos módulos (shutdown em ordem inversa)"""
+    lifespans = list(lifespans)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        started = time.perf_counter()
+        app.state.started = False
+        await app.router.startup()
+        async with AsyncExitStack() as stack:
+            for module_lifespan in lifespans:
+                await stack.enter_async_context(module_lifespan(app))
+            app.state.started = True
+            logger.info(f"✅ [LIFESPAN] Startup concluído em {(time.perf_counter() - started) * 1000:.0f} ms.")
+            try:
+                yield
+            finally:
+                app.state.started = False
+        await app.router.shutdown()
+
+    return lifespan
+
+
+def build_app(title: str, version: str, routers: Iterable[APIRouter], metrics_name: str,
+              lifespans: Iterable[Callable] = (), **kwargs) -> FastAPI:
+    """FastAPI com os routers, lifespans, /livez + /readyz, CORS (expondo os headers de tracing), /metrics e tracing"""
+    app = FastAPI(title=title, version=version, lifespan=_compose_lifespans(lifespans), **kwargs)
+    app.state.started = False
+    for router in routers:
+        app.include_router(router)
+
+    @app.get("/livez", include_in_schema=False)
+    async def livez():
+        """O processo está de pé e o event loop responde (não consulta dependências)"""
+        return {"status": "alive"}
+
+    @app.get("/readyz", include_in_schema=False)
+    async def readyz():
+        """200 só com o startup concluído e todos os checks prontos (Mongo etc.); senão 503"""
+        ready, checks = readiness()
+        ready = ready and app.state.started
+        return JSONResponse(
+            status_code=200 if ready else 503,
+            content={"status": "ready" if ready else "starting", "started": app.state.started, "checks": checks},
+        )
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=CORS_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        # Lidos pelo frontend para logar o trace e o tempo de cada etapa
+        expose_headers=["X-Trace-Id", "Server-Timing", "traceparent"],
+    )
+    # Métricas Prometheus (latência por rota, em andamento, custo) + GET /metrics
+    instrument_app(app, metrics_name)
+    # Span raiz por requisição + headers X-Trace-Id / Server-Timing (exporta em TRACE_FILE)
+    instrument_tracing(app)
+    # URLs de /blobs absolutas, com o host pelo qual o cliente chegou
+    app.add_middleware(BlobBaseURLMiddleware)
+    return app
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Tracing por spans (formato compatível com OpenTelemetry) sem dependências externas
+Cada requisição abre um span raiz (trace id recebido no header W3C `traceparent` ou
+gerado); as etapas do pipeline (prometheus_metrics.stage) e cada chamada HTTP de saída
+viram spans filhos, e o `traceparent` é repassado aos provedores. Quando o span raiz
+termina, o trace é exportado localmente (JSON lines em TRACE_FILE ou console), e a
+resposta leva `X-Trace-Id` + `Server-Timing` com o tempo somado de cada etapa.
+A exportação não bloqueia o request: o trace vai para uma fila e uma thread de fundo
+serializa e escreve (TRACE_FILE com rotação por tamanho). Só uma fração dos traces é
+exportada (TRACE_SAMPLE_RATE, decidida pelo trace id; traces com erro sempre saem) e
+os probes/métricas (TRACE_SKIP_PATHS) nem abrem span.
+Em respostas em streaming (SSE/NDJSON) os headers saem antes das etapas terminarem:
+o resumo fica parcial, mas o trace exportado é completo.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import secrets
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from starlette.routing import Match
+
+from runtime_paths import data_path
+
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "file")  # file | console | none
+TRACE_FILE = Path(os.getenv("TRACE_FILE", data_path("traces/spans.jsonl")))
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(50 * 1024 * 1024)))
+TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", "3"))
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_SKIP_PATHS = {path.strip() for path in os.getenv("TRACE_SKIP_PATHS", "/livez,/readyz,/metrics").split(",") if path.strip()}
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "chz-api")
+
+# Sem structured_logging aqui (ele importa este módulo); o logger "chz" é o mesmo
+logger = logging.getLogger("chz.tracing")
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class _Trace:
+    """Spans de um trace neste processo (exportados juntos quando o span local raiz termina)"""
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: List["Span"] = []
+
+
+class Span:
+    def __init__(self, trace: _Trace, name: str, parent_id: Optional[str], kind: str = "INTERNAL",
+                 attributes: Optional[Dict[str, Any]] = None, stage: bool = False):
+        self.trace = trace
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.stage = stage
+        self.status = "UNSET"
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        trace.spans.append(self)
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def end(self, error: Optional[BaseException] = None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.status = "ERROR"
+            self.attributes.setdefault("exception.type", type(error).__name__)
+            self.attributes.setdefault("exception.message", str(error)[:300])
+        elif self.status == "UNSET":
+            self.status = "OK"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Campos no formato do OTLP/JSON (nomes do OpenTelemetry)"""
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "kind": f"SPAN_KIND_{self.kind}",
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round(self.duration_ms, 2),
+            "attributes": self.attributes,
+            "status": {"code": f"STATUS_CODE_{self.status}"},
+            "resource": {"service.name": SERVICE_NAME},
+        }
+
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+_export_lock = threading.Lock()
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current.get()
+    return span.trace_id if span is not None else None
+
+
+def current_traceparent() -> Optional[str]:
+    span = _current.get()
+    return span.traceparent() if span is not None else None
+
+
+def parse_traceparent(value: Optional[str]):
+    """(trace_id, parent_span_id) de um header W3C traceparent válido, senão (None, None)"""
+    match = _TRACEPARENT.match((value or "").strip().lower())
+    if not match or match.group(1) == "0" * 32:
+        return None, None
+    return match.group(1), match.group(2)
+
+
+class _SpansFormatter(logging.Formatter):
+    """Roda na thread de escrita: um trace vira uma linha JSON por span"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return "".join(json.dumps(item.to_dict(), default=str, ensure_ascii=False) + "\n" for item in record.spans)
+
+
+_export_queue: queue.Queue = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+_listener: Optional[logging.handlers.QueueListener] = None
+_dropped = 0
+
+
+def _writer() -> logging.Handler:
+    if TRACE_EXPORTER == "console":
+        handler: logging.Handler = logging.StreamHandler(sys.stdout)
+    else:
+        TRACE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            TRACE_FILE, maxBytes=TRACE_FILE_MAX_BYTES, backupCount=TRACE_FILE_BACKUPS, encoding="utf-8", delay=True
+        )
+    handler.terminator = ""
+    handler.setFormatter(_SpansFormatter())
+    return handler
+
+
+def _start_exporter():
+    global _listener
+    with _export_lock:
+        if _listener is None:
+            _listener = logging.handlers.QueueListener(_export_queue, _writer())
+            _listener.start()
+            atexit.register(stop_exporter)
+
+
+def stop_exporter():
+    """Escreve os traces que ainda estão na fila e para a thread"""
+    global _listener
+    with _export_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def sampled(trace: _Trace) -> bool:
+    """Mesma decisão para o mesmo trace id em qualquer processo; traces com erro sempre entram"""
+    if TRACE_SAMPLE_RATE >= 1 or any(item.status == "ERROR" for item in trace.spans):
+        return True
+    return int(trace.trace_id[:16], 16) / 2 ** 64 < TRACE_SAMPLE_RATE
+
+
+def export(trace: _Trace):
+    global _dropped
+    if TRACE_EXPORTER == "none":
+        return
+    for item in trace.spans:
+        item.end()  # spans que ficaram abertos (ex.: request HTTP que falhou antes da resposta)
+    if not sampled(trace):
+        return
+    if _listener is None:
+        _start_exporter()
+    try:
+        _export_queue.put_nowait(logging.makeLogRecord({"spans": list(trace.spans)}))
+    except queue.Full:
+        _dropped += 1
+        if _dropped % 1000 == 1:
+            logger.warning(f"⚠️ [TRACING] Fila de exportação cheia; {_dropped} traces descartados até agora.")
+
+
+def exporter_stats() -> Dict[str, Any]:
+    return {
+        "exporter": TRACE_EXPORTER,
+        "sample_rate": TRACE_SAMPLE_RATE,
+        "queued": _export_queue.qsize(),
+        "dropped": _dropped,
+    }
+
+
+class span:
+    """
+    Abre um span filho do span atual (with / async with). Sem trace ativo não faz nada,
+    a menos que traceparent seja informado: aí retoma o trace (ex.: tarefa em background)
+    e exporta os spans ao final.
+    """
+
+    def __init__(self, name: str, kind: str = "INTERNAL", stage: bool = False,
+                 traceparent: Optional[str] = None, **attributes):
+        self.name = name
+        self.kind = kind
+        self.stage = stage
+        self.traceparent = traceparent
+        self.attributes = attributes
+        self.span: Optional[Span] = None
+        self._token = None
+        self._root = False
+
+    def __enter__(self) -> Optional[Span]:
+        parent = _current.get()
+        if parent is not None:
+            trace, parent_id = parent.trace, parent.span_id
+        else:
+            trace_id, parent_id = parse_traceparent(self.traceparent)
+            if trace_id is None:
+                return None
+            trace, self._root = _Trace(trace_id), True
+        self.span = Span(trace, self.name, parent_id, self.kind, self.attributes, self.stage)
+        self._token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.span is None:
+            return False
+        _current.reset(self._token)
+        self.span.end(exc)
+        if self._root:
+            export(self.span.trace)
+        return False
+
+    async def __aenter__(self) -> Optional[Span]:
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+def stage_summary(trace: _Trace) -> str:
+    """Valor do header Server-Timing: tempo somado por etapa (spans de stage) no trace"""
+    totals: Dict[str, float] = {}
+    for item in trace.spans:
+        if item.stage:
+            totals[item.name] = totals.get(item.name, 0.0) + item.duration_ms
+    return ", ".join(f"{name};dur={duration:.1f}" for name, duration in totals.items())
+
+
+# --- HTTP de saída (event hooks do httpx) ---
+async def on_outbound_request(request):
+    """Abre um span CLIENT para a chamada e repassa o traceparent ao provedor"""
+    parent = _current.get()
+    if parent is None:
+        return
+    outbound = Span(parent.trace, f"HTTP {request.method} {request.url.host}", parent.span_id, "CLIENT", {
+        "http.request.method": request.method,
+        "server.address": request.url.host,
+        "url.path": request.url.path,
+    })
+    request.headers["traceparent"] = outbound.traceparent()
+    request.extensions["trace_span"] = outbound
+
+
+async def on_outbound_response(response):
+    outbound = response.request.extensions.get("trace_span")
+    if outbound is not None:
+        outbound.set_attribute("http.response.status_code", response.status_code)
+        if response.status_code >= 500:
+            outbound.status = "ERROR"
+        outbound.end()
+
+
+# --- Middleware ---
+def _route_path(app, scope) -> str:
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope["path"])
+    return scope["path"]
+
+
+class TracingMiddleware:
+    """Span raiz por requisição + headers X-Trace-Id, traceparent e Server-Timing"""
+
+    def __init__(self, app, fastapi_app):
+        self.app = app
+        self.fastapi_app = fastapi_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in TRACE_SKIP_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        trace_id, parent_id = parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1"))
+        trace = _Trace(trace_id or secrets.token_hex(16))
+        route = _route_path(self.fastapi_app, scope)
+        root = Span(trace, f"{scope['method']} {route}", parent_id, "SERVER", {
+            "http.request.method": scope["method"],
+            "http.route": route,
+            "url.path": scope["path"],
+        })
+        token = _current.set(root)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set_attribute("http.response.status_code", message["status"])
+                if message["status"] >= 500:
+                    root.status = "ERROR"
+                timing = stage_summary(trace)
+                total = f"total;dur={root.duration_ms:.1f}"
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-trace-id", trace.trace_id.encode()),
+                    (b"traceparent", root.traceparent().encode()),
+                    (b"server-timing", (f"{timing}, {total}" if timing else total).encode()),
+                ]
+            await send(message)
+
+        error = None
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _current.reset(token)
+            root.end(error)
+            export(trace)
+
+
+def instrument_tracing(app):
+    """Adiciona o middleware de tracing a uma aplicação FastAPI"""
+    app.add_middleware(TracingMiddleware, fastapi_app=app)
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Cache de análises Vision para imagens de referência
+Chave = URL (ou hash do conteúdo, para base64/data URI) + prompt + modelo.
+Camada rápida (LRU + TTL) no backend de cache_backend (memória do worker, SQLite do host ou
+Redis, conforme CACHE_BACKEND) com persistência em MongoDB ou em disco.
+get/set são corrotinas: a persistência (pymongo síncrono ou arquivo JSON) roda em thread e
+a camada rápida usa as variantes async do namespace.
+No disco, o diretório é limitado como o LRU: a cada PRUNE_EVERY_WRITES gravações saem os
+arquivos expirados e, acima de VISION_CACHE_DISK_MAX_ENTRIES/_MAX_BYTES, os menos usados
+(mtime renovado a cada leitura).
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from cache_backend import CacheNamespace, cache_namespace
+from runtime_paths import data_path
+from structured_logging import get_logger
+
+logger = get_logger("vision_cache")
+
+VISION_CACHE_TTL = int(os.getenv("VISION_CACHE_TTL", str(7 * 24 * 3600)))
+VISION_CACHE_MAX_ENTRIES = int(os.getenv("VISION_CACHE_MAX_ENTRIES", "512"))
+VISION_CACHE_DIR = Path(os.getenv("VISION_CACHE_DIR", data_path("vision_cache")))
+VISION_CACHE_DISK_MAX_ENTRIES = int(os.getenv("VISION_CACHE_DISK_MAX_ENTRIES", "5000"))
+VISION_CACHE_DISK_MAX_BYTES = int(os.getenv("VISION_CACHE_DISK_MAX_BYTES", str(200 * 1024 * 1024)))
+PRUNE_EVERY_WRITES = 50
+
+
+def image_cache_key(image_ref: str) -> str:
+    """URLs http(s) são usadas como chave; base64/data URIs são endereçados pelo hash do conteúdo"""
+    if image_ref.startswith(("http://", "https://")):
+        return image_ref
+    return "sha256:" + hashlib.sha256(image_ref.encode("utf-8")).hexdigest()
+
+
+def analysis_cache_key(image_ref: str, prompt: str, model: str) -> str:
+    raw = f"{model}\n{prompt.strip()}\n{image_cache_key(image_ref)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class VisionAnalysisCache:
+    """Cache LRU + TTL de resultados do VisionAnalysisSystem"""
+
+    def __init__(self, collection=None, disk_path: Optional[Path] = None,
+                 max_entries: int = VISION_CACHE_MAX_ENTRIES, ttl_seconds: int = VISION_CACHE_TTL,
+                 shared: Optional[CacheNamespace] = None, disk_max_entries: int = VISION_CACHE_DISK_MAX_ENTRIES,
+                 disk_max_bytes: int = VISION_CACHE_DISK_MAX_BYTES):
+        self.collection = collection
+        self.disk_path = None if collection is not None else (disk_path or VISION_CACHE_DIR)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared if shared is not None else cache_namespace("vision_analysis", ttl_seconds, max_entries)
+        self.disk_max_entries = disk_max_entries
+        self.disk_max_bytes = disk_max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.persistent_hits = 0
+        self.disk_evictions = 0
+        self._disk_writes = 0
+
+        if self.collection is not None:
+            try:
+                self.collection.create_index("expiresAt", expireAfterSeconds=0)
+            except Exception as e:
+                logger.warning(f"⚠️ [VISION CACHE] Falha ao criar índice TTL: {e}")
+        elif self.disk_path is not None:
+            self.disk_path.mkdir(parents=True, exist_ok=True)
+
+    # --- API pública ---
+    def attach_collection(self, collection):
+        """Passa a persistir no MongoDB (conexão feita depois do startup); a camada rápida é mantida"""
+        try:
+            collection.create_index("expiresAt", expireAfterSeconds=0)
+        except Exception as e:
+            logger.warning(f"⚠️ [VISION CACHE] Falha ao criar índice TTL: {e}")
+        self.collection = collection
+        self.disk_path = None
+        logger.info("✅ [VISION CACHE] Persistência movida para o MongoDB.")
+
+    async def get(self, image_ref: str, prompt: str, model: str) -> Optional[Dict[str, Any]]:
+        key = analysis_cache_key(image_ref, prompt, model)
+        now = time.time()
+
+        entry = await self.shared.aget(key)
+        if entry is not None and entry["expires_at"] > now:
+            self.hits += 1
+            return entry["result"]
+
+        entry = await asyncio.to_thread(self._load_persistent, key)
+        if entry is not None and entry["expires_at"] > now:
+            await self._remember(key, entry)
+            self.hits += 1
+            self.persistent_hits += 1
+            return entry["result"]
+        self.misses += 1
+        return None
+
+    async def set(self, image_ref: str, prompt: str, model: str, result: Dict[str, Any]):
+        key = analysis_cache_key(image_ref, prompt, model)
+        entry = {
+            "result": result,
+            "image": image_cache_key(image_ref),
+            "model": model,
+            "expires_at": time.time() + self.ttl_seconds,
+        }
+        await self._remember(key, entry)
+        await asyncio.to_thread(self._store_persistent, key, entry)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "backend": "mongodb" if self.collection is not None else "disk",
+            "shared_backend": self.shared.backend.name,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "persistent_hits": self.persistent_hits,
+            "disk_evictions": self.disk_evictions,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    # --- Internos ---
+    async def _remember(self, key: str, entry: Dict[str, Any]):
+        ttl = entry["expires_at"] - time.time()
+        if ttl > 0:
+            await self.shared.aset(key, {"result": entry["result"], "expires_at": entry["expires_at"]}, ttl=ttl)
+
+    def _load_persistent(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            if self.collection is not None:
+                doc = self.collection.find_one({"_id": key})
+                if doc:
+                    expires_at = doc["expiresAt"].replace(tzinfo=timezone.utc).timestamp()
+                    return {"result": doc["result"], "expires_at": expires_at}
+            elif self.disk_path is not None:
+                path = self.disk_path / f"{key}.json"
+                if path.exists():
+                    entry = json.loads(path.read_text(encoding="utf-8"))
+                    if entry["expires_at"] <= time.time():
+                        path.unlink(missing_ok=True)
+                        return None
+                    os.utime(path)  # usado agora: último a sair no prune
+                    return entry
+        except Exception as e:
+            logger.warning(f"⚠️ [VISION CACHE] Falha ao ler cache persistente: {e}")
+        return None
+
+    def _store_persistent(self, key: str, entry: Dict[str, Any]):
+        try:
+            if self.collection is not None:
+                self.collection.replace_one(
+                    {"_id": key},
+                    {
+                        "_id": key,
+                        "result": entry["result"],
+                        "image": entry["image"],
+                        "model": entry["model"],
+                        "expiresAt": datetime.fromtimestamp(entry["expires_at"], tz=timezone.utc),
+                    },
+                    upsert=True,
+                )
+            elif self.disk_path is not None:
+                path = self.disk_path / f"{key}.json"
+                tmp_path = path.with_suffix(".tmp")
+                tmp_path.write_text(json.dumps(entry), encoding="utf-8")
+                tmp_path.replace(path)
+                # A primeira gravação após o boot também varre (o diretório sobrevive a restarts)
+                self._disk_writes += 1
+                if self._disk_writes % PRUNE_EVERY_WRITES == 1:
+                    self.prune_disk()
+        except Exception as e:
+            logger.warning(f"⚠️ [VISION CACHE] Falha ao gravar cache persistente: {e}")
+
+    def prune_disk(self) -> int:
+        """Remove do disco os expirados e, acima dos limites, os menos usados (mtime mais antigo)"""
+        if self.disk_path is None:
+            return 0
+        files = []
+        for path in self.disk_path.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        # mtime >= gravação: mtime anterior a agora - TTL garante entrada expirada
+        cutoff = time.time() - self.ttl_seconds
+        total_bytes = sum(size for _, size, _ in files)
+        removed = 0
+        for index, (mtime, size, path) in enumerate(files):
+            within_limits = len(files) - index <= self.disk_max_entries and total_bytes <= self.disk_max_bytes
+            if mtime >= cutoff and within_limits:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total_bytes -= size
+            removed += 1
+        if removed:
+            self.disk_evictions += removed
+            logger.info(f"🧹 [VISION CACHE] {removed} análises removidas do disco.")
+        return removed
@@ -113,13 +113,35 @@ STYLE_THEMES = {
 # ============================================================================
 
 def compose_vision_enhanced_prompt(sport: str, view: str, player_name: str, player_number: str, 
-                                 analysis_text: str, style: str = "classic") -> str:
+                                 analysis_text: str, style: str = "classic",
+                                 blank_back_instruction: Optional[str] = None) -> str:
     """
     Gera um prompt DALL-E 3 robusto. Esta é a versão padrão e consistente
     usada em toda a aplicação para garantir a mesma qualidade de renderização.
+    blank_back_instruction substitui nome/número pelas costas em branco (base do modo local de composição)
     """
     style_description = STYLE_THEMES.get(style, "professional sports")
 
+    if blank_back_instruction:
+        return f"""
+Create a photorealistic image of a {sport} jersey, **viewed ONLY from the back**.
+
+**1. VISUAL DESIGN INSTRUCTIONS:**
+The jersey's design must be faithfully based on the following description of its visual elements:
+---
+{analysis_text}
+---
+
+**2. BLANK BACK (MANDATORY):**
+{blank_back_instruction}
+
+**3. RENDERING REQUIREMENTS (NON-NEGOTIABLE):**
+- Background: Plain, neutral white studio background.
+- Display: The jersey must be shown flat, centered, and completely isolated.
+- Prohibited Elements: Absolutely NO human models, NO mannequins, NO body parts (arms, torso), NO brand logos (Nike, Adidas), and NO team emblems.
+- Quality: Render in 4K, hyper-realistic quality, with professional studio lighting and attention to fabric texture.
+""".strip()
+
     prompt_final = f"""
 Create a photorealistic image of a {sport} jersey, **viewed ONLY from the back**. The final image must clearly show the player's name and number on the back.
 
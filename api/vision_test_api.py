@@ -4,8 +4,7 @@ Vision Test API - Sistema separado para testes de GPT-4 Vision
 Baseado na estrutura OpenRouter + FastAPI fornecida pelo usuário
 """
 
-from fastapi import FastAPI, HTTPException, UploadFile, File
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi import APIRouter, HTTPException, UploadFile, File
 from pydantic import BaseModel
 import base64
 import requests
@@ -13,6 +12,11 @@ import os
 import json
 from typing import Optional, Dict, Any
 from dotenv import load_dotenv
+from image_io import vision_data_uri
+from subsystems import Lazy, build_app  # router + inicialização preguiçosa
+from structured_logging import get_logger, log_payload
+
+logger = get_logger("vision_test_api")
 
 load_dotenv()
 
@@ -21,9 +25,6 @@ OPENROUTER_KEY = os.getenv("OPENROUTER_API_KEY")
 OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
 MODEL_NAME = "openai/gpt-4o-mini"  # Modelo vision do OpenRouter
 
-if not OPENROUTER_KEY:
-    raise Exception("OPENROUTER_API_KEY é obrigatório")
-
 # --- Modelos de Dados ---
 class VisionAnalysisRequest(BaseModel):
     image_base64: str
@@ -65,6 +66,8 @@ class StadiumResponse(BaseModel):
 # --- Sistema Principal ---
 class VisionTestSystem:
     def __init__(self):
+        if not OPENROUTER_KEY:
+            raise Exception("OPENROUTER_API_KEY é obrigatório")
         self.openrouter_url = OPENROUTER_URL
         self.openrouter_key = OPENROUTER_KEY
         self.headers = {
@@ -121,19 +124,16 @@ Focus on interior architecture, seating arrangements, lighting, atmosphere, and
             "internal": """A breathtaking photorealistic interior view of a sports stadium. Base the design entirely on the uploaded reference image, preserving the seating layout, architectural features, field surface, and interior color scheme. Maintain the crowd density, lighting type, and atmospheric mood from the reference. The interior should reflect the "{style}" theme with enhanced professional quality. Show the stadium interior from an optimal viewing angle that captures the scale and atmosphere. Include detailed seating sections, field/pitch surface, architectural elements like screens or overhangs, and appropriate lighting (natural/artificial/mixed). Render in ultra-high definition 4K with professional sports photography quality, capturing the energy and atmosphere of a world-class sports venue. Parameters: perspective={perspective}, atmosphere={atmosphere}, time={time_of_day}, weather={weather}."""
         }
         
-        print("✅ Vision Test System initialized")
-        print(f"🔍 Model: {MODEL_NAME}")
-        print(f"📡 API: OpenRouter")
-        print("🏟️ Stadium Vision System: Ready")
+        logger.info("✅ Vision Test System initialized")
+        logger.info(f"🔍 Model: {MODEL_NAME}")
+        logger.info(f"📡 API: OpenRouter")
+        logger.info("🏟️ Stadium Vision System: Ready")
     
     def analyze_image_vision(self, image_base64: str, prompt: str, model: str = MODEL_NAME) -> Dict[str, Any]:
         """Analisa imagem usando OpenRouter Vision"""
         
-        # Ensure base64 has proper format
-        if not image_base64.startswith('data:'):
-            image_data = f"data:image/jpeg;base64,{image_base64}"
-        else:
-            image_data = image_base64
+        # Normaliza (draft decode, lado maior limitado, EXIF, JPEG) e monta o data URI
+        image_data = vision_data_uri(image_base64)
         
         payload = {
             "model": model,
@@ -151,8 +151,8 @@ Focus on interior architecture, seating arrangements, lighting, atmosphere, and
         }
         
         try:
-            print(f"🔍 Analyzing image with {model}...")
-            print(f"📝 Prompt: {prompt[:100]}...")
+            logger.info(f"🔍 Analyzing image with {model}...")
+            log_payload(logger, "📝 Prompt", prompt)
             
             response = requests.post(
                 self.openrouter_url,
@@ -168,7 +168,7 @@ Focus on interior architecture, seating arrangements, lighting, atmosphere, and
                 # Estimativa de custo (varia por modelo)
                 cost_estimate = 0.01  # ~$0.01 por imagem para gpt-4o-mini
                 
-                print("✅ Vision analysis completed")
+                logger.info("✅ Vision analysis completed")
                 
                 return {
                     "success": True,
@@ -179,7 +179,7 @@ Focus on interior architecture, seating arrangements, lighting, atmosphere, and
                 }
             else:
                 error_msg = f"OpenRouter API error: {response.status_code} - {response.text}"
-                print(f"❌ {error_msg}")
+                logger.error(f"❌ {error_msg}")
                 return {
                     "success": False,
                     "error": error_msg
@@ -187,7 +187,7 @@ Focus on interior architecture, seating arrangements, lighting, atmosphere, and
                 
         except Exception as e:
             error_msg = f"Vision analysis error: {str(e)}"
-            print(f"❌ {error_msg}")
+            logger.error(f"❌ {error_msg}")
             return {
                 "success": False,
                 "error": error_msg
@@ -209,8 +209,8 @@ Focus on interior architecture, seating arrangements, lighting, atmosphere, and
             # Get stadium-specific analysis prompt
             analysis_prompt = self.stadium_analysis_prompts.get(stadium_type, self.stadium_analysis_prompts["external"])
             
-            print(f"🏟️ [STADIUM ANALYSIS] Analyzing {stadium_type} stadium with {model}...")
-            print(f"📝 Using stadium-specific prompt for {stadium_type} view")
+            logger.info(f"🏟️ [STADIUM ANALYSIS] Analyzing {stadium_type} stadium with {model}...")
+            logger.info(f"📝 Using stadium-specific prompt for {stadium_type} view")
             
             # Use the existing vision analysis method
             result = self.analyze_image_vision(image_base64, analysis_prompt, model)
@@ -231,17 +231,17 @@ Focus on interior architecture, seating arrangements, lighting, atmosphere, and
                     
                     analysis_json = json.loads(analysis_text)
                     result["analysis_json"] = analysis_json
-                    print("✅ [STADIUM ANALYSIS] JSON parsing successful")
+                    logger.info("✅ [STADIUM ANALYSIS] JSON parsing successful")
                     
                 except json.JSONDecodeError as e:
-                    print(f"⚠️ [STADIUM ANALYSIS] JSON parsing failed, using raw text: {e}")
+                    logger.warning(f"⚠️ [STADIUM ANALYSIS] JSON parsing failed, using raw text: {e}")
                     result["analysis_json"] = {"raw_analysis": result["analysis"]}
             
             return result
             
         except Exception as e:
             error_msg = f"Stadium analysis error: {str(e)}"
-            print(f"❌ [STADIUM ANALYSIS] {error_msg}")
+            logger.error(f"❌ [STADIUM ANALYSIS] {error_msg}")
             return {
                 "success": False,
                 "error": error_msg
@@ -270,9 +270,9 @@ Focus on interior architecture, seating arrangements, lighting, atmosphere, and
                 analysis_summary = f"Based on analysis: {json.dumps(analysis_result['analysis_json'], indent=2)}"
                 final_prompt = f"{analysis_summary}\n\n{final_prompt}"
             
-            print(f"🎨 [STADIUM GENERATION] Generating {stadium_type} stadium with {model}...")
-            print(f"🎯 Style: {generation_style}, Perspective: {perspective}")
-            print(f"🌅 Atmosphere: {atmosphere}, Time: {time_of_day}, Weather: {weather}")
+            logger.info(f"🎨 [STADIUM GENERATION] Generating {stadium_type} stadium with {model}...")
+            logger.info(f"🎯 Style: {generation_style}, Perspective: {perspective}")
+            logger.info(f"🌅 Atmosphere: {atmosphere}, Time: {time_of_day}, Weather: {weather}")
             
             # Generate using DALL-E 3 via OpenRouter
             dalle_response = self.generate_with_dalle3(final_prompt)
@@ -301,7 +301,7 @@ Focus on interior architecture, seating arrangements, lighting, atmosphere, and
                 
         except Exception as e:
             error_msg = f"Stadium generation error: {str(e)}"
-            print(f"❌ [STADIUM GENERATION] {error_msg}")
+            logger.error(f"❌ [STADIUM GENERATION] {error_msg}")
             return {
                 "success": False,
                 "error": error_msg
@@ -322,8 +322,8 @@ Focus on interior architecture, seating arrangements, lighting, atmosphere, and
             # Use OpenRouter's image generation endpoint
             image_url = "https://openrouter.ai/api/v1/images/generations"
             
-            print(f"🎨 Generating image with DALL-E 3...")
-            print(f"📝 Prompt length: {len(prompt)} characters")
+            logger.info(f"🎨 Generating image with DALL-E 3...")
+            logger.info(f"📝 Prompt length: {len(prompt)} characters")
             
             response = requests.post(
                 image_url,
@@ -336,7 +336,7 @@ Focus on interior architecture, seating arrangements, lighting, atmosphere, and
                 data = response.json()
                 image_base64 = data['data'][0]['b64_json']
                 
-                print("✅ DALL-E 3 generation completed")
+                logger.info("✅ DALL-E 3 generation completed")
                 
                 return {
                     "success": True,
@@ -344,7 +344,7 @@ Focus on interior architecture, seating arrangements, lighting, atmosphere, and
                 }
             else:
                 error_msg = f"DALL-E 3 API error: {response.status_code} - {response.text}"
-                print(f"❌ {error_msg}")
+                logger.error(f"❌ {error_msg}")
                 return {
                     "success": False,
                     "error": error_msg
@@ -352,50 +352,20 @@ Focus on interior architecture, seating arrangements, lighting, atmosphere, and
                 
         except Exception as e:
             error_msg = f"DALL-E 3 generation error: {str(e)}"
-            print(f"❌ {error_msg}")
+            logger.error(f"❌ {error_msg}")
             return {
                 "success": False,
                 "error": error_msg
             }
 
-# --- FastAPI App ---
-app = FastAPI(
-    title="Vision Test API",
-    description="Sistema separado para testes de GPT-4 Vision via OpenRouter",
-    version="1.0.0"
-)
+router = APIRouter()
 
-# CORS
-origins = [
-    "http://localhost",
-    "http://localhost:3000",
-    "https://localhost:3000", 
-    "https://jersey-generator-ai2-git-master-jeffnight15s-projects.vercel.app",
-    "https://jersey-generator-ai2.vercel.app",
-    "https://*.vercel.app",
-    "https://*.netlify.app", 
-    "https://*.railway.app",
-    "https://*.render.com"
-]
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"]
-)
-
-# Inicializa sistema
-try:
-    vision_system = VisionTestSystem()
-except Exception as e:
-    print(f"❌ Failed to initialize: {e}")
-    vision_system = None
+# Criado no primeiro uso (clientes e chaves só quando o subsistema é chamado)
+vision_test_system = Lazy("vision_test.system", VisionTestSystem)
 
 # --- Endpoints ---
 
-@app.get("/")
+@router.get("/")
 async def root():
     return {
         "status": "online",
@@ -418,14 +388,13 @@ async def root():
         ]
     }
 
-@app.post("/analyze-image-upload", response_model=VisionResponse)
+@router.post("/analyze-image-upload", response_model=VisionResponse)
 async def analyze_image_upload(
     file: UploadFile = File(...),
     prompt: str = "Analyze this image in detail"
 ):
     """Endpoint para upload de arquivo direto"""
-    if not vision_system:
-        raise HTTPException(status_code=500, detail="System not initialized")
+    vision_system = vision_test_system.get()
     
     try:
         # Ler arquivo
@@ -452,11 +421,10 @@ async def analyze_image_upload(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/analyze-image-base64", response_model=VisionResponse)
+@router.post("/analyze-image-base64", response_model=VisionResponse)
 async def analyze_image_base64(request: VisionAnalysisRequest):
     """Endpoint para análise via base64 (igual estrutura atual)"""
-    if not vision_system:
-        raise HTTPException(status_code=500, detail="System not initialized")
+    vision_system = vision_test_system.get()
     
     try:
         result = vision_system.analyze_image_vision(
@@ -476,7 +444,7 @@ async def analyze_image_base64(request: VisionAnalysisRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/available-models")
+@router.get("/available-models")
 async def get_available_models():
     """Lista modelos vision disponíveis"""
     return {
@@ -491,25 +459,24 @@ async def get_available_models():
         "recommended": "openai/gpt-4o-mini"
     }
 
-@app.get("/health")
+@router.get("/health")
 async def health_check():
     return {
         "status": "ok",
-        "vision_system": "initialized" if vision_system else "not_initialized",
+        "vision_system": "initialized" if vision_test_system.initialized else "not_initialized",
         "openrouter_key": "configured" if OPENROUTER_KEY else "missing",
         "model": MODEL_NAME
     }
 
 # ===== STADIUM-SPECIFIC ENDPOINTS =====
 
-@app.post("/analyze-stadium", response_model=Dict[str, Any])
+@router.post("/analyze-stadium", response_model=Dict[str, Any])
 async def analyze_stadium(request: StadiumAnalysisRequest):
     """Endpoint para análise específica de stadium"""
-    if not vision_system:
-        raise HTTPException(status_code=500, detail="System not initialized")
+    vision_system = vision_test_system.get()
     
     try:
-        print(f"🏟️ [ANALYZE STADIUM] Received request for {request.stadium_type} stadium analysis")
+        logger.info(f"🏟️ [ANALYZE STADIUM] Received request for {request.stadium_type} stadium analysis")
         
         result = vision_system.analyze_stadium_image(
             request.image_base64,
@@ -518,7 +485,7 @@ async def analyze_stadium(request: StadiumAnalysisRequest):
         )
         
         if result["success"]:
-            print(f"✅ [ANALYZE STADIUM] Analysis completed successfully")
+            logger.info(f"✅ [ANALYZE STADIUM] Analysis completed successfully")
             return {
                 "success": True,
                 "analysis": result.get("analysis"),
@@ -528,22 +495,21 @@ async def analyze_stadium(request: StadiumAnalysisRequest):
                 "timestamp": "2024-01-21"
             }
         else:
-            print(f"❌ [ANALYZE STADIUM] Analysis failed: {result.get('error')}")
+            logger.error(f"❌ [ANALYZE STADIUM] Analysis failed: {result.get('error')}")
             raise HTTPException(status_code=500, detail=result.get("error"))
         
     except Exception as e:
-        print(f"❌ [ANALYZE STADIUM] Endpoint error: {str(e)}")
+        logger.error(f"❌ [ANALYZE STADIUM] Endpoint error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/generate-stadium-with-vision", response_model=StadiumResponse)
+@router.post("/generate-stadium-with-vision", response_model=StadiumResponse)
 async def generate_stadium_with_vision(request: StadiumGenerationRequest):
     """Endpoint para geração de stadium usando Vision + DALL-E 3"""
-    if not vision_system:
-        raise HTTPException(status_code=500, detail="System not initialized")
+    vision_system = vision_test_system.get()
     
     try:
-        print(f"🎨 [GENERATE STADIUM] Starting vision-based generation")
-        print(f"🏟️ Type: {request.stadium_type}, Style: {request.generation_style}")
+        logger.info(f"🎨 [GENERATE STADIUM] Starting vision-based generation")
+        logger.info(f"🏟️ Type: {request.stadium_type}, Style: {request.generation_style}")
         
         result = vision_system.generate_stadium_with_vision(
             request.analysis_result,
@@ -558,7 +524,7 @@ async def generate_stadium_with_vision(request: StadiumGenerationRequest):
         )
         
         if result["success"]:
-            print(f"✅ [GENERATE STADIUM] Generation completed successfully")
+            logger.info(f"✅ [GENERATE STADIUM] Generation completed successfully")
             return StadiumResponse(
                 success=True,
                 generated_image_base64=result["generated_image_base64"],
@@ -567,19 +533,23 @@ async def generate_stadium_with_vision(request: StadiumGenerationRequest):
                 model_used=result["model_used"]
             )
         else:
-            print(f"❌ [GENERATE STADIUM] Generation failed: {result.get('error')}")
+            logger.error(f"❌ [GENERATE STADIUM] Generation failed: {result.get('error')}")
             return StadiumResponse(
                 success=False,
                 error=result.get("error")
             )
         
     except Exception as e:
-        print(f"❌ [GENERATE STADIUM] Endpoint error: {str(e)}")
+        logger.error(f"❌ [GENERATE STADIUM] Endpoint error: {str(e)}")
         return StadiumResponse(
             success=False,
             error=str(e)
         )
 
+# Aplicação standalone (legado); no processo único o router é montado pelo server.py
+app = build_app("Vision Test API", "1.0.0", [router], "vision_test_api",
+                description="Sistema separado para testes de GPT-4 Vision via OpenRouter")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8002)  # Porta diferente da API principal 
\ No newline at end of file